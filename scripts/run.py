@@ -8,24 +8,43 @@ Oxford, UK
 """
 import os
 import sys
+import argparse
 import configparser
 import csv
+import itertools
+import json
+import shutil
+import time
 
 import fiona
-from shapely.geometry import shape, LineString, mapping
+import shapely
+from shapely.geometry import LineString, box, shape
+from shapely.ops import unary_union
 import numpy as np
-from rtree import index
 
 from collections import OrderedDict
-
-from np4d.np4d import estimate_link_budget
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from np4d.np4d import (SpectralEfficiencyLUT, build_path_loss_table,
+    best_server, link_capacity)
+from np4d.parallel import (estimate_link_budgets_parallel,
+    estimate_carrier_link_budgets_parallel, rows)
+from np4d.cache import ResultCache, StageStore, make_key, file_digest
+from np4d.spatial import SiteIndex, ShapefileIndex, segment_lines
+from np4d.data import Sites, Segments, Flows, to_columns, fits_int32
+from np4d.time_axis import TimeAxis
+from np4d.raster import RasterGrid, RasterStore
+from np4d.checkpoint import Checkpoint
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__), 'script_config.ini'))
 BASE_PATH = CONFIG['file_locations']['base_path']
 
+#layers of the coverage and capacity raster
+RASTER_LAYERS = ('received_power', 'interference', 'sinr', 'capacity_mbps')
+
 
-def get_sites(path):
+def get_sites(path, default_frequency=None):
     """
     Load cell site locations.
 
@@ -33,73 +52,323 @@ def get_sites(path):
     ----------
     path : string
         path for cell site data.
+    default_frequency : float
+        Frequency band (MHz) given to cells with a missing or invalid
+        Freqband. Without it such a cell raises a ValueError naming its
+        site.
 
     Returns
     -------
-    sites : list of dicts
-        Contains the site_id, and then an x and y coordinate.
+    sites : Sites
+        Contains the site_id, pcd_sector, x and y coordinates, antenna
+        height, EIRP (dBm), frequency band (MHz) and antenna type.
 
     """
-    sites = []
+    site_ids = []
+    pcd_sectors = []
+    coordinates = []
+    ant_heights = []
+    eirps = []
+    frequencies = []
+    ant_types = []
 
     with open(path, 'r') as source:
         reader = csv.DictReader(source)
         for item in reader:
-            sites.append({
-                'type': 'Feature',
-                'geometry':{
-                    'type': 'Point',
-                    'coordinates': (float(item['X']), float(item['Y'])),
-                },
-                'properties':{
-                    'site_id': item['Sitengr'],
-                    'pcd_sector': item['pcd_sector'],
-                    'Cell Site': 'Cell Site',
-                    'b': 'b',
-                },
-            })
+            site_ids.append(item['Sitengr'])
+            pcd_sectors.append(item['pcd_sector'])
+            coordinates.append((float(item['X']), float(item['Y'])))
+            ant_heights.append(float(item['Antennaht'] or 'nan'))
+            #Maxpwrdbm is a transmitter power, Powerdbw (the fallback)
+            #is already an effective radiated power
+            if item['Maxpwrdbm']:
+                eirps.append(float(item['Maxpwrdbm']) + 16 - 1)
+            else:
+                eirps.append(float(item['Powerdbw'] or 'nan') + 30)
+            frequencies.append(float(item['Freqband'].strip() or 'nan'))
+            ant_types.append(item['Anttype'])
+
+    #a NaN band would pass every range check of the path loss models
+    frequencies = np.array(frequencies, dtype=float)
+    invalid = np.flatnonzero(~np.isfinite(frequencies))
+    if len(invalid) > 0:
+        if default_frequency is None:
+            raise ValueError('Site {} has no valid frequency band '
+                '(Freqband)'.format(site_ids[invalid[0]]))
+        print('{} cells have no valid frequency band (Freqband), e.g. site '
+            '{}: using {:g} MHz'.format(len(invalid), site_ids[invalid[0]],
+            default_frequency))
+        frequencies[invalid] = default_frequency
+
+    return Sites(site_ids, pcd_sectors, coordinates, ant_heights, eirps,
+        frequencies, ant_types)
+
+
+def get_carriers(sites, carrier_bandwidths):
+    """
+    Group the cells of each site into its set of carriers.
 
-    return sites
+    Each row of the site data is a cell on one band (e.g. GSM 900 or
+    UMTS 2100). Cells sharing a site id form one site, which aggregates
+    every carrier it holds.
 
+    Parameters
+    ----------
+    sites : Sites
+        Cells, with the frequency band of each.
+    carrier_bandwidths : dict
+        Bandwidth (MHz) of each aggregated band (MHz). Cells on other
+        bands are dropped.
+
+    Returns
+    -------
+    carrier_sites : Sites
+        One row per site, located at its first cell.
+    bands : array
+        (b,) array of the aggregated bands, in ascending order.
+    bandwidths : array
+        (b,) array of the bandwidth of each band.
+    carriers : dict of arrays
+        (sites, b) arrays of the ant_height and eirp of each carrier,
+        with a NaN eirp where a site does not carry a band. Several
+        cells on one band take the highest antenna and power.
 
-def load_road_flows(path):
     """
-    Load hourly road flow data.
+    bands = np.array(sorted(carrier_bandwidths), dtype=float)
+    bandwidths = np.array([carrier_bandwidths[band] for band in bands.tolist()],
+        dtype=float)
+
+    cells = np.flatnonzero(np.isin(sites.frequency, bands))
+    _, first, site_of_cell = np.unique(sites.site_id[cells],
+        return_index=True, return_inverse=True)
+    band_of_cell = np.searchsorted(bands, sites.frequency[cells])
+
+    carriers = {}
+    for name, values, default in (('ant_height', sites.ant_height, 30),
+        ('eirp', sites.eirp, 40 + 16 - 1)):
+        column = np.full((len(first), len(bands)), -np.inf)
+        np.maximum.at(column, (site_of_cell, band_of_cell),
+            np.nan_to_num(values[cells], nan=default))
+        carriers[name] = np.where(np.isinf(column), np.nan, column)
+
+    first = cells[first]
+    carrier_sites = Sites(sites.site_id[first], sites.pcd_sector[first],
+        sites.coordinates[first], np.nanmax(carriers['ant_height'], axis=1),
+        np.nanmax(carriers['eirp'], axis=1), ant_type=sites.ant_type[first])
+
+    return carrier_sites, bands, bandwidths, carriers
+
+
+def iter_road_flows(path, edge_ids=None, time_axis=None, chunk_size=100000):
+    """
+    Stream road flow data as blocks of typed arrays.
+
+    The file is parsed in blocks of chunk_size rows, and rows for roads
+    outside edge_ids (or for times outside the time axis) are dropped as
+    each block is read.
 
     Parameters
     ----------
     path : string
         path for road flow data.
+    edge_ids : array, optional
+        Road ids present in the road layer. All roads are kept if None.
+    time_axis : TimeAxis
+        Time axis mapping the hour column (named hours, times of day or
+        timestamps) to time slice indices. Defaults to the named hours.
+    chunk_size : int
+        Number of rows parsed at a time.
+
+    Yields
+    ------
+    block : tuple
+        The int32 edge_id, time slice index (the smallest unsigned type
+        holding the axis, uint8 for hours) and int32 number of vehicles
+        of each kept row, the number of rows read, and the number of
+        rows whose time falls outside the time axis.
+
+    """
+    if time_axis is None:
+        time_axis = TimeAxis.profile(60)
+
+    if edge_ids is not None:
+        edge_ids = np.unique(np.asarray(list(edge_ids), dtype=np.int64))
+
+    with open(path, 'r', newline='') as source:
+        reader = csv.reader(source)
+        header = next(reader)
+        columns = [header.index(name) for name in ('edgeID', 'hour', 'vehicles')]
+
+        while True:
+            block = list(itertools.islice(reader, chunk_size))
+            if not block:
+                break
+
+            edge_column, time_column, vehicle_column = (
+                [row[column] for row in block] for column in columns)
+
+            edge_id = np.array(edge_column, dtype=np.int64)
+            time = time_axis.index(time_column)
+            vehicles = np.array(vehicle_column, dtype=np.int64)
+
+            keep = time != time_axis.missing
+            off_axis = len(block) - int(np.count_nonzero(keep))
+            if edge_ids is not None:
+                keep &= np.isin(edge_id, edge_ids)
+
+            #flow records (and the tile partitions) hold int32 values
+            for name, values in (('edgeID', edge_id), ('vehicles', vehicles)):
+                if not fits_int32(values[keep]):
+                    raise ValueError('Flow {} values outside the int32 '
+                        'range in {}'.format(name, path))
+
+            yield (edge_id[keep].astype(np.int32), time[keep],
+                vehicles[keep].astype(np.int32), len(block), off_axis)
+
+
+def load_road_flows(path, edge_ids=None, time_axis=None, chunk_size=100000):
+    """
+    Stream road flow data into typed arrays.
+
+    Rows are filtered block by block (see `iter_road_flows`), so peak
+    memory does not grow with the size of the file.
+
+    Parameters
+    ----------
+    path : string
+        path for road flow data.
+    edge_ids : array, optional
+        Road ids present in the road layer. All roads are kept if None.
+    time_axis : TimeAxis
+        Time axis mapping the hour column to time slice indices.
+        Defaults to the named hours.
+    chunk_size : int
+        Number of rows parsed at a time.
 
     Returns
     -------
-    flows : list of dicts
-        Contains the road_id, hour and number of vehicles.
-    unique_link_ids : list of dicts
-        Contains a set of unique road_ids.
+    flows : dict of arrays
+        Contains the int32 edge_id, time slice index and int32 number of
+        vehicles of each kept row.
+    n_rows : int
+        Number of rows read.
+    off_axis : int
+        Number of rows dropped as their time falls outside the axis.
 
     """
-    unique_link_ids = set()
+    if time_axis is None:
+        time_axis = TimeAxis.profile(60)
+
+    chunks = []
+    n_rows = 0
+    off_axis = 0
+
+    for edge_id, slices, vehicles, block_rows, block_off_axis in iter_road_flows(
+        path, edge_ids, time_axis, chunk_size):
+        chunks.append((edge_id, slices, vehicles))
+        n_rows += block_rows
+        off_axis += block_off_axis
+
+    flows = {
+        'edge_id': np.concatenate([c[0] for c in chunks] or
+            [np.empty(0, np.int32)]),
+        'time': np.concatenate([c[1] for c in chunks] or
+            [np.empty(0, time_axis.dtype)]),
+        'vehicles': np.concatenate([c[2] for c in chunks] or
+            [np.empty(0, np.int32)]),
+    }
 
-    flows = []
+    return flows, n_rows, off_axis
 
-    with open(path, 'r') as source:
-        reader = csv.DictReader(source)
-        for item in reader:
-            unique_link_ids.add(int(item['edgeID']))
-            flows.append({
-                # 'year': intem['year']
-                'road_id': int(item['edgeID']),
-                'hour': item['hour'],
-                'vehicles': int(item['vehicles']),
-            })
 
-    return flows, unique_link_ids
+def report_time_axis(n_rows, off_axis, time_axis):
+    """
+    Report the flow rows dropped because their time falls outside the
+    time axis, which otherwise only show up as missing results.
+
+    """
+    if off_axis == 0:
+        return
+
+    print('{} of {} flow rows fall outside the time axis ({}) and were '
+        'dropped'.format(off_axis, n_rows, time_axis))
+
+    if off_axis == n_rows:
+        print('No flow rows fall on the time axis: check time_resolution, '
+            'time_start and time_end against the hour column of the flows')
 
 
-def load_roads(path, unique_link_ids):
+def load_study_area(study_area):
     """
-    Load road shapes.
+    Load the study area roads are limited to.
+
+    Parameters
+    ----------
+    study_area : string
+        Either a bounding box as 'minx,miny,maxx,maxy', or the path of a
+        shapefile. The union of a polygon layer is used, and the
+        bounding box of any other layer (such as central_oxford.shp).
+
+    Returns
+    -------
+    area : shapely geometry
+        The study area, prepared for repeated intersection tests.
+
+    """
+    if not study_area:
+        return None
+
+    if not os.path.exists(study_area):
+        minx, miny, maxx, maxy = [float(value) for value in study_area.split(',')]
+        area = box(minx, miny, maxx, maxy)
+    else:
+        with fiona.open(study_area) as source:
+            geometries = [shape(item['geometry']) for item in source]
+        area = unary_union(geometries)
+        if area.geom_type not in ('Polygon', 'MultiPolygon'):
+            area = box(*area.bounds)
+
+    shapely.prepare(area)
+
+    return area
+
+
+def load_road_edge_ids(path, area=None):
+    """
+    Load the road ids present in the road layer, without geometries.
+
+    Parameters
+    ----------
+    path : string
+        path for road shape data.
+    area : shapely geometry
+        Optional study area. Roads whose bounding box misses the
+        bounding box of the area are left out.
+
+    Returns
+    -------
+    edge_ids : array
+        Unique road ids.
+
+    """
+    index = ShapefileIndex(path, 'EdgeID')
+
+    fids = index.query(area.bounds if area is not None else None)
+
+    return np.unique(index.ids[fids])
+
+
+def load_roads(path, unique_link_ids, segment_length=250, area=None,
+    bounds=None):
+    """
+    Load road shapes, cutting each road into segments.
+
+    A persistent index of the road layer (see
+    `np4d.spatial.ShapefileIndex`) selects the roads in unique_link_ids
+    within the bounding box of the study area, so only those features
+    are decoded. The vertices of all roads are gathered into coordinate
+    arrays, so every road is segmented in one vectorized pass (see
+    `np4d.spatial.segment_lines`).
 
     Parameters
     ----------
@@ -107,92 +376,1423 @@ def load_roads(path, unique_link_ids):
         path for road flow data.
     unique_link_ids : list of dicts
         Contains a set of unique road_ids.
+    segment_length : float
+        Length of road segments (m). Shorter roads are kept whole.
+    area : shapely geometry
+        Optional study area. Only roads intersecting it are loaded.
+    bounds : tuple
+        Optional (minx, miny, maxx, maxy) tile. Only roads whose bounding
+        box meets the tile are loaded, and only the segments whose
+        midpoint lies in it (including its west and south edges) are
+        kept, so every segment belongs to exactly one tile.
 
     Returns
     -------
-    roads : dict of dicts
-        Contains the road_id as the key, and then the value is a dict
-        containing the road_id and shapely geom.
+    roads : Segments
+        Contains the road_id, segment index (0 for a road kept whole),
+        midpoint, length and vertices of each segment.
 
     """
-    roads = {}
-
-    seen_ids = []
+    index = ShapefileIndex(path, 'EdgeID')
+    if bounds is None and area is not None:
+        bounds = area.bounds
+        tile = None
+    else:
+        tile = bounds
+    fids = index.query(bounds, unique_link_ids)
+
+    edge_ids = []
+    coordinates = []
+    line_index = []
 
     with fiona.open(path) as source:
-        for item in source:
-            link = int(item['properties']['EdgeID'])
-            if link in unique_link_ids:
-                seen_ids.append(link)
-                geom = LineString(item['geometry']['coordinates'])
-                length = geom.length
-
-                if length >= 250:
-                    iterations = round(length / 250)
-                    number = 1
-                    for i in range(1, iterations + 1):
-
-                        link_id = str(str(link) + '_' + str(i))
-
-                        if number < iterations:
-                            i = i * 250
-                            x = geom.interpolate(i - 250)
-                            y = geom.interpolate(i)
-                            line = LineString([x, y])
-                        else:
-                            i = i * 250
-                            x = geom.interpolate(i - 250)
-                            y = geom.interpolate(length)
-                            line = LineString([x, y])
-
-                        roads[link_id] = {
-                            'road_id': link_id,
-                            'geom': line
-                        }
-                        number += 1
-                else:
-
-                    roads[link] = {
-                        'road_id': link,
-                        'geom': geom
-                    }
+        for fid in fids.tolist():
+            item = source[fid]
+            vertices = np.asarray(item['geometry']['coordinates'],
+                dtype=float)[:, :2]
+            if area is not None and not area.intersects(LineString(vertices)):
+                continue
+            coordinates.append(vertices)
+            line_index.append(np.full(len(vertices), len(edge_ids)))
+            edge_ids.append(int(index.ids[fid]))
+
+    if not edge_ids:
+        return Segments([], [], [], [], np.empty((0, 2)), np.zeros(1, int))
+
+    segments = segment_lines(np.concatenate(coordinates),
+        np.concatenate(line_index), segment_length)
+
+    roads = Segments(
+        np.asarray(edge_ids, dtype=np.int64)[segments['line']],
+        segments['segment'],
+        segments['midpoints'],
+        segments['length'],
+        segments['vertices'],
+        segments['vertex_offsets'],
+    )
+
+    if tile is not None:
+        minx, miny, maxx, maxy = tile
+        x, y = roads.midpoints.T
+        roads = roads.select((x >= minx) & (x < maxx) & (y >= miny) & (y < maxy))
 
     return roads
 
 
-def find_closest_site(road, sites):
+def road_tiles(path, tile_size, area=None):
+    """
+    Split the road network into square tiles of the British National
+    Grid (EPSG:27700).
+
+    Tiles are aligned to multiples of tile_size from the grid origin, so
+    a tile keeps its name (tile_<x>_<y>, counted in tiles east and north
+    of the origin) whatever the study area. Each road is assigned to
+    every tile its bounding box meets, as its segments may fall in any
+    of them.
+
+    Parameters
+    ----------
+    path : string
+        path for road shape data.
+    tile_size : float
+        Width and height of each tile (m).
+    area : shapely geometry
+        Optional study area. Roads whose bounding box misses the
+        bounding box of the area are left out.
+
+    Returns
+    -------
+    tiles : array
+        (t, 2) array of the x and y number of each tile met by a road.
+    edge_ids : array
+        (p,) array of the road of each road and tile pair.
+    tile_numbers : array
+        (p,) array of the tile (row of tiles) of each pair.
+
+    """
+    index = ShapefileIndex(path, 'EdgeID')
+    fids = index.query(area.bounds if area is not None else None)
+
+    first = np.floor(index.bounds[fids, :2] / tile_size).astype(np.int64)
+    last = np.floor(index.bounds[fids, 2:] / tile_size).astype(np.int64)
+    span = last - first + 1
+    counts = span[:, 0] * span[:, 1]
+
+    road = np.repeat(np.arange(len(fids)), counts)
+    offset = offsets_within(counts)
+    tile_x = first[road, 0] + offset % span[road, 0]
+    tile_y = first[road, 1] + offset // span[road, 0]
+
+    tiles, tile_numbers = np.unique(np.column_stack([tile_x, tile_y]),
+        axis=0, return_inverse=True)
+
+    return (tiles.reshape(-1, 2), index.ids[fids][road].astype(np.int64),
+        tile_numbers.reshape(-1))
+
+
+def offsets_within(counts):
+    """
+    Position of every item within its run, for runs of the given
+    lengths (e.g. [2, 3] gives [0, 1, 0, 1, 2]).
+
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+        counts)
+
+
+def flow_record_dtype(time_axis):
+    """
+    Record type of the road flows of a tile, as stored on disk.
+
+    """
+    return np.dtype([('edge_id', np.int32), ('time', time_axis.dtype),
+        ('vehicles', np.int32)])
+
+
+def partition_road_flows(path, edge_ids, tile_numbers, tile_paths, time_axis,
+    chunk_size=100000):
+    """
+    Split road flow data by tile in one streaming pass.
+
+    The records of a road are appended to the file of every tile the
+    road meets (see `road_tiles`), one block at a time, so memory is
+    bounded by the block size. The folder and file of a tile are only
+    created once the tile receives a record.
+
+    Parameters
+    ----------
+    path : string
+        path for road flow data.
+    edge_ids : array
+        (p,) array of the road of each road and tile pair.
+    tile_numbers : array
+        (p,) array of the tile of each pair.
+    tile_paths : list of strings
+        Flow file of each tile, which is replaced if the tile receives
+        any records.
+    time_axis : TimeAxis
+        Time axis of the flows.
+    chunk_size : int
+        Number of rows parsed at a time.
+
+    Returns
+    -------
+    n_rows : int
+        Number of rows read.
+    written : array
+        Indices of the tiles that received records.
+    off_axis : int
+        Number of rows dropped as their time falls outside the axis.
+
+    """
+    dtype = flow_record_dtype(time_axis)
+
+    order = np.argsort(edge_ids, kind='stable')
+    sorted_edge_ids = np.asarray(edge_ids)[order]
+    sorted_tiles = np.asarray(tile_numbers)[order]
+
+    written = np.zeros(len(tile_paths), dtype=bool)
+    n_rows = 0
+    off_axis = 0
+
+    for edge_id, slices, vehicles, block_rows, block_off_axis in iter_road_flows(
+        path, sorted_edge_ids, time_axis, chunk_size):
+        n_rows += block_rows
+        off_axis += block_off_axis
+
+        left = np.searchsorted(sorted_edge_ids, edge_id, side='left')
+        counts = np.searchsorted(sorted_edge_ids, edge_id, side='right') - left
+        record = np.repeat(np.arange(len(edge_id)), counts)
+        tile = sorted_tiles[np.repeat(left, counts) + offsets_within(counts)]
+
+        records = np.empty(len(record), dtype=dtype)
+        records['edge_id'] = edge_id[record]
+        records['time'] = slices[record]
+        records['vehicles'] = vehicles[record]
+
+        by_tile = np.argsort(tile, kind='stable')
+        tile = tile[by_tile]
+        starts = np.flatnonzero(np.diff(tile, prepend=-1))
+        for start, end in zip(starts, np.append(starts[1:], len(tile))):
+            tile_path = tile_paths[tile[start]]
+            if not written[tile[start]]:
+                #replace the flows of an earlier partition
+                os.makedirs(os.path.dirname(tile_path), exist_ok=True)
+                mode = 'wb'
+                written[tile[start]] = True
+            else:
+                mode = 'ab'
+            with open(tile_path, mode) as sink:
+                records[by_tile[start:end]].tofile(sink)
+
+    return n_rows, np.flatnonzero(written), off_axis
+
+
+def load_tile_flows(path, time_axis):
+    """
+    Load the road flows of one tile, as written by
+    `partition_road_flows`.
+
+    Returns
+    -------
+    flows : dict of arrays
+        Contains the edge_id, time slice index and number of vehicles of
+        each record (see `load_road_flows`).
+
+    """
+    records = np.fromfile(path, dtype=flow_record_dtype(time_axis))
+
+    return {name: records[name] for name in records.dtype.names}
+
+
+def site_column(values, site_ids):
+    """
+    Look up a site column for an array of site indices, where an index
+    equal to the number of sites (a missing neighbour in a
+    `SiteIndex.k_nearest` query) gives NaN.
+
+    Parameters
+    ----------
+    values : array
+        (n,) or (n, 2) site column.
+    site_ids : array
+        Site indices of any shape.
+
+    Returns
+    -------
+    values : array
+        The column value of each index.
+
+    """
+    values = np.asarray(values, dtype=float)
+    padding = np.full((1,) + values.shape[1:], np.nan)
+
+    return np.concatenate([values, padding])[site_ids]
+
+
+def assign_sites(args, model, settlement_type, points, sites, site_index,
+    carriers=None):
+    """
+    Find the serving site, and any interfering sites, of each point.
+
+    The serving site is the nearest site, or the strongest of the
+    nearest best_server_sites sites using each site's own parameters.
+    Interferers are the other sites among the nearest
+    interference_sites + 1 within interference_distance, on the serving
+    band where sites have their own bands.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options (best_server_sites, interference_sites and
+        interference_distance).
+    model : string
+        Propagation model.
+    settlement_type : string
+        General environment (urban/suburban/rural).
+    points : array
+        (n, 2) array of x and y coordinates.
+    sites : Sites
+        Sites, as indexed by site_index.
+    site_index : SiteIndex
+        Spatial index of the sites.
+    carriers : dict of arrays
+        Optional (sites, bands) ant_height and eirp of each carrier of
+        each site, for carrier aggregation (see `get_carriers`).
+
+    Returns
+    -------
+    site_ids : array
+        (n,) array of the serving site of each point.
+    site_parameters : dict of arrays
+        Parameters of each serving site, or None for the default site.
+    interferers : array
+        (n, m, 2) array of interfering site coordinates, NaN for none,
+        or None without interference.
+    interferer_parameters : dict of arrays
+        Parameters of each interfering site, or None.
+
+    """
+    #antennas below the 10 m minimum of the 3GPP model (or unknown) are
+    #raised, so they stay above the user equipment
+    site_heights = np.clip(np.nan_to_num(sites.ant_height, nan=30), 10, None)
+
+    if carriers is not None:
+        _, site_ids = site_index.nearest(points)
+        carrier_heights = np.clip(np.nan_to_num(carriers['ant_height'], nan=30),
+            10, None)
+        site_parameters = {
+            'ant_height': carrier_heights[site_ids],
+            'eirp': carriers['eirp'][site_ids],
+        }
+    elif args.best_server_sites > 0:
+        #the strongest of the k nearest sites, using each site's own
+        #frequency, antenna height and power
+        _, candidate_ids = site_index.k_nearest(points,
+            args.best_server_sites)
+        best, _ = best_server(model, points,
+            site_column(sites.coordinates, candidate_ids), {
+                'frequency': site_column(sites.frequency, candidate_ids),
+                'ant_height': site_column(site_heights, candidate_ids),
+                'eirp': site_column(sites.eirp, candidate_ids),
+            }, settlement_type)
+        site_ids = candidate_ids[np.arange(len(candidate_ids)), best]
+        site_parameters = {
+            'frequency': sites.frequency[site_ids],
+            'ant_height': site_heights[site_ids],
+            'eirp': sites.eirp[site_ids],
+        }
+    else:
+        _, site_ids = site_index.nearest(points)
+        site_parameters = None
+
+    interferers = None
+    interferer_parameters = None
+    if args.interference_sites > 0:
+        #every other site among the k nearest within the cutoff distance
+        #is a co-channel interferer, found without an all-pairs matrix
+        _, neighbour_ids = site_index.k_nearest(points,
+            args.interference_sites + 1,
+            distance_upper_bound=args.interference_distance or np.inf)
+        other = neighbour_ids != site_ids[:, np.newaxis]
+        if carriers is not None:
+            #interferers are matched to each band of the serving site when
+            #the link budgets are estimated
+            interferer_parameters = {
+                'ant_height': site_column(carrier_heights, neighbour_ids),
+                'eirp': site_column(carriers['eirp'], neighbour_ids),
+            }
+        elif site_parameters is not None:
+            #only sites in the serving band interfere
+            other &= (site_column(sites.frequency, neighbour_ids) ==
+                site_parameters['frequency'][:, np.newaxis])
+            interferer_parameters = {
+                'ant_height': site_column(site_heights, neighbour_ids),
+                'eirp': site_column(sites.eirp, neighbour_ids),
+            }
+        neighbour_ids = np.where(other, neighbour_ids, len(site_index))
+        interferers = site_column(sites.coordinates, neighbour_ids)
+
+    return site_ids, site_parameters, interferers, interferer_parameters
+
+
+def changed_rows(previous, current, length):
+    """
+    Find the road segments whose link budget inputs differ from those
+    stored by a previous run.
+
+    Parameters
+    ----------
+    previous : dict of arrays
+        Stored inputs, keyed by name.
+    current : dict of arrays
+        Current inputs, with one row per segment.
+    length : int
+        Number of segments.
+
+    Returns
+    -------
+    changed : array
+        Indices of the changed segments. Every segment is changed if
+        the inputs no longer have the same shape.
+
+    """
+    changed = np.zeros(length, dtype=bool)
+
+    for name, value in current.items():
+        value = np.asarray(value, dtype=float)
+        if name not in previous or previous[name].shape != value.shape:
+            return np.arange(length)
+        stored = np.asarray(previous[name], dtype=float)
+        same = (stored == value) | (np.isnan(stored) & np.isnan(value))
+        changed |= ~same.reshape(length, -1).all(axis=1)
+
+    return np.flatnonzero(changed)
+
+
+def estimate_rows(args, selection, link_budget_arguments,
+    link_budget_options, link_site_options,
+    estimator=estimate_link_budgets_parallel):
+    """
+    Estimate the link budgets of a subset of the road segments, keeping
+    each segment's link id as its stream id, so the results equal those
+    of a run over every segment.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options (workers and chunk_size).
+    selection : array
+        Indices of the segments to estimate.
+    link_budget_arguments : tuple
+        Positional arguments of the estimator, over every segment.
+    link_budget_options : dict
+        Realisations and path loss table.
+    link_site_options : dict
+        Link_ids, interferers, site_parameters and interferer_parameters
+        of every segment.
+    estimator : function
+        estimate_link_budgets_parallel, or
+        estimate_carrier_link_budgets_parallel.
+
+    Returns
+    -------
+    link_budgets : dict of arrays
+        Link budgets of the selected segments.
+
+    """
+    model, centroids, closest_sites = link_budget_arguments[:3]
+    interferers = link_site_options['interferers']
+
+    return estimator(model, centroids[selection], closest_sites[selection],
+        *link_budget_arguments[3:], workers=args.workers,
+        chunk_size=args.chunk_size,
+        link_ids=link_site_options['link_ids'][selection],
+        interferers=None if interferers is None else interferers[selection],
+        site_parameters=rows(link_site_options['site_parameters'], selection),
+        interferer_parameters=rows(
+            link_site_options['interferer_parameters'], selection),
+        **link_budget_options)
+
+
+def checkpoint_link_budgets(args, checkpoint, link_budget_key,
+    link_budget_arguments, link_budget_options, link_site_options,
+    link_inputs, estimator=estimate_link_budgets_parallel):
+    """
+    Estimate the link budgets of every road segment in batches of
+    checkpoint_size segments, recording each batch in the checkpoint as
+    it completes.
+
+    Each batch is keyed by the stage and the inputs of its own segments,
+    so a restarted run reloads the batches whose inputs are unchanged
+    and recomputes the rest.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options (checkpoint_size, workers and chunk_size).
+    checkpoint : Checkpoint
+        Checkpoint of the run.
+    link_budget_key : string
+        Key of the link budget stage.
+    link_budget_arguments : tuple
+        Positional arguments of the estimator.
+    link_budget_options : dict
+        Realisations and path loss table.
+    link_site_options : dict
+        Link_ids, interferers, site_parameters and interferer_parameters.
+    link_inputs : dict of arrays
+        Per segment inputs, hashed into the key of each batch.
+    estimator : function
+        estimate_link_budgets_parallel, or
+        estimate_carrier_link_budgets_parallel.
+
+    Returns
+    -------
+    link_budgets : dict of arrays
+        Link budgets of every segment.
+
+    """
+    length = len(link_budget_arguments[2])
+
+    batches = []
+    computed = 0
+    for start in range(0, length, args.checkpoint_size):
+        batch = np.arange(start, min(start + args.checkpoint_size, length))
+        unit = '{}/batch_{}'.format(link_budget_key, start)
+        key = make_key('link_budget_batch', link_budget_key, batch,
+            rows(link_inputs, batch))
+
+        link_budgets = checkpoint.load_arrays(unit, key)
+        if link_budgets is None:
+            link_budgets = estimate_rows(args, batch, link_budget_arguments,
+                link_budget_options, link_site_options, estimator)
+            checkpoint.save_arrays(unit, key, link_budgets,
+                segments=len(batch))
+            computed += 1
+        batches.append(link_budgets)
+
+    print('Estimated {} of {} link budget batches'.format(computed,
+        len(batches)))
+
+    return {
+        name: np.concatenate([batch[name] for batch in batches])
+        for name in batches[0]
+    }
+
+
+def link_budget_stage(args, store, link_budget_key, link_budget_arguments,
+    link_budget_options, link_site_options, link_inputs,
+    estimator=estimate_link_budgets_parallel, checkpoint=None):
+    """
+    Estimate the link budgets of every road segment, reusing a stored
+    run of the same inputs where possible.
+
+    With a stage store, only the segments whose serving or interfering
+    sites have changed since the stored run are recomputed. Otherwise
+    the link budgets are estimated in full, in checkpointed batches if
+    a checkpoint is given, or through the on-disk result cache if a
+    cache_path is given. Only seeded (deterministic) link budgets are
+    reused.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options (workers, chunk_size and the result cache).
+    store : StageStore
+        Stage store, or None.
+    link_budget_key : string
+        Key of the stored link budgets.
+    link_budget_arguments : tuple
+        Positional arguments of the estimator.
+    link_budget_options : dict
+        Realisations and path loss table.
+    link_site_options : dict
+        Link_ids, interferers, site_parameters and interferer_parameters.
+    link_inputs : dict of arrays
+        Per segment inputs, including the link_ids, compared against the
+        stored run.
+    estimator : function
+        estimate_link_budgets_parallel, or
+        estimate_carrier_link_budgets_parallel for carrier aggregation.
+    checkpoint : Checkpoint
+        Optional checkpoint of the run (see `checkpoint_link_budgets`).
+
+    Returns
+    -------
+    link_budgets : dict of arrays
+        Link budgets of every segment.
+
+    """
+    (model, centroids, closest_sites, frequency, bandwidth, settlement_type,
+        seed_value, iterations, lut) = link_budget_arguments
+
+    previous = None
+    if store and seed_value is not None:
+        previous = store.load('link_budgets', link_budget_key)
+
+    if previous is not None and 'link_ids' in previous and len(
+        previous['link_ids']):
+        #match the stored segments to the current ones by id, so roads
+        #added or removed do not shift the other segments
+        stored_ids = np.asarray(previous['link_ids'])
+        order = np.argsort(stored_ids, kind='stable')
+        position = np.searchsorted(stored_ids, link_inputs['link_ids'],
+            sorter=order)
+        previous = rows(previous, order[np.minimum(position, len(order) - 1)])
+
+    if previous is not None:
+        #recompute only the new segments and those whose serving or
+        #interfering sites have changed
+        changed = changed_rows(previous, link_inputs, len(closest_sites))
+        print('Recomputing link budgets of {} of {} segments'.format(
+            len(changed), len(closest_sites)))
+        link_budgets = {key: np.array(value) for key, value in previous.items()
+            if key not in link_inputs}
+        if len(changed) > 0:
+            update = estimate_rows(args, changed, link_budget_arguments,
+                link_budget_options, link_site_options, estimator)
+            for key, value in update.items():
+                link_budgets[key][changed] = value
+    else:
+        changed = None
+        if checkpoint is not None and seed_value is not None:
+            link_budgets = checkpoint_link_budgets(args, checkpoint,
+                link_budget_key, link_budget_arguments, link_budget_options,
+                link_site_options, link_inputs, estimator)
+        elif args.cache_path and seed_value is not None:
+            #each batch is evaluated once per run, so only the on-disk
+            #store can hit; only seeded (deterministic) results are cached
+            cache = ResultCache(1, args.cache_path)
+            key = make_key(estimator.__name__,
+                *link_budget_arguments, link_budget_options, link_site_options)
+            link_budgets = cache.memoize(key, estimator,
+                *link_budget_arguments, workers=args.workers,
+                chunk_size=args.chunk_size, **link_site_options,
+                **link_budget_options)
+            print('Link budget cache {}'.format(cache.info()))
+            cache.close()
+        else:
+            link_budgets = estimator(*link_budget_arguments,
+                workers=args.workers, chunk_size=args.chunk_size,
+                **link_site_options, **link_budget_options)
+
+    if store and seed_value is not None and (changed is None or len(changed)):
+        store.save('link_budgets', link_budget_key,
+            dict(link_budgets, **link_inputs))
+
+    return link_budgets
+
+
+def estimate_cells(args, model, points, cell_ids, sites, site_index,
+    link_budget_arguments, path_loss_table=None):
     """
-    Finds the closest cell site.
+    Estimate the link budget of raster cells from their best server.
 
     Parameters
     ----------
-    road : dict
-        Contains the road_id and shapely geom.
-    sites : list of dicts
-        Contains the site_id, and then an x and y coordinate.
+    args : argparse.Namespace
+        Run options.
+    model : string
+        Propagation model.
+    points : array
+        (n, 2) array of cell centres.
+    cell_ids : array
+        (n,) array of the flat index of each cell, used as its random
+        stream id, so a cell gives the same result in any tile.
+    sites : Sites
+        Sites, as indexed by site_index.
+    site_index : SiteIndex
+        Spatial index of the sites.
+    link_budget_arguments : tuple
+        The frequency, bandwidth, settlement_type, seed_value,
+        iterations and spectral efficiency lookup table.
+    path_loss_table : PathLossTable
+        Optional median path loss table.
 
     Returns
     -------
-    nearest_site : object
-        The closest cellular site as a shapely object.
+    link_budgets : dict of arrays
+        As returned by `estimate_link_budgets`.
 
     """
-    site_geoms = []
+    settlement_type = link_budget_arguments[2]
 
-    road_geom = road['geom']
-    road_centroid = road_geom.interpolate(road_geom.length / 2)
+    site_ids, site_parameters, interferers, interferer_parameters = (
+        assign_sites(args, model, settlement_type, points, sites, site_index))
 
-    for site in sites:
-        site_geoms.append(shape(site['geometry']))
+    return estimate_link_budgets_parallel(model, points,
+        site_index.coordinates[site_ids], *link_budget_arguments,
+        workers=args.workers, chunk_size=args.chunk_size,
+        path_loss_table=path_loss_table, link_ids=cell_ids,
+        interferers=interferers, site_parameters=site_parameters,
+        interferer_parameters=interferer_parameters)
+
+
+def estimate_raster(raster, area, args, model, sites, site_index,
+    link_budget_arguments, path_loss_table=None):
+    """
+    Estimate the coverage and capacity raster, one tile at a time.
 
-    idx = index.Index(
-        (i, site.bounds, site)
-        for i, site in enumerate(site_geoms)
-        )
+    Each tile is evaluated as one vectorized batch and written before
+    the next is started, so memory is bounded by the tile size, and
+    tiles already written by an interrupted run are skipped.
+
+    Parameters
+    ----------
+    raster : RasterStore
+        Raster to fill.
+    area : shapely geometry
+        Optional study area. Cells whose centre is outside it are left
+        empty (NaN).
+
+    The other parameters are as for `estimate_cells`.
+
+    Returns
+    -------
+    computed : int
+        Number of tiles computed.
+
+    """
+    computed = 0
+
+    for tile_row, tile_col, row_slice, col_slice in raster.grid.tiles(
+        raster.tile_size):
+
+        if raster.has_tile(tile_row, tile_col):
+            continue
+
+        centres = raster.grid.centres(row_slice, col_slice)
+        if area is None:
+            inside = np.ones(len(centres), dtype=bool)
+        else:
+            inside = shapely.contains_xy(area, centres[:, 0], centres[:, 1])
+
+        layers = {name: np.full(len(centres), np.nan) for name in raster.layers}
+        if np.any(inside):
+            link_budgets = estimate_cells(args, model, centres[inside],
+                raster.grid.cell_ids(row_slice, col_slice)[inside], sites,
+                site_index, link_budget_arguments, path_loss_table)
+            for name in raster.layers:
+                layers[name][inside] = link_budgets[name]
+
+        shape = (row_slice.stop - row_slice.start,
+            col_slice.stop - col_slice.start)
+        raster.write_tile(tile_row, tile_col,
+            {name: value.reshape(shape) for name, value in layers.items()})
+        computed += 1
+
+    return computed
+
+
+def sample_raster(raster, points, args, model, sites, site_index,
+    link_budget_arguments, path_loss_table=None):
+    """
+    Sample the raster at each point, in place of a link budget per
+    point.
 
-    nearest_site = list(idx.nearest(road_centroid.bounds, 1, objects='raw'))[0]
+    Points in cells the raster left empty (outside the study area) are
+    evaluated at their cell centre, as the raster would have been.
+
+    Returns
+    -------
+    link_budgets : dict of arrays
+        (n,) array of each raster layer.
+
+    """
+    link_budgets = raster.sample(points)
+
+    missing = np.flatnonzero(np.isnan(link_budgets['received_power']))
+    if len(missing) > 0:
+        row, col = raster.grid.locate(points[missing])
+        update = estimate_cells(args, model, raster.grid.cell_centres(row, col),
+            row * raster.grid.width + col, sites, site_index,
+            link_budget_arguments, path_loss_table)
+        for name in raster.layers:
+            link_budgets[name][missing] = np.asarray(update[name],
+                dtype=np.float32)
+
+    return link_budgets
+
+
+def run_area(args, settings, area, sites, flows, store, directory_results,
+    directory_shapes, bounds=None, checkpoint=None):
+    """
+    Evaluate the roads of an area, from cutting the roads into segments
+    to writing the results of every scenario.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options.
+    settings : dict
+        Constants of the run: the propagation model,
+        spectral_efficiency_lut, time_axis, road_path, road_key,
+        sites_key, study_area_key, crs, settlement_type, seed_value and
+        iterations.
+    area : shapely geometry
+        Optional study area (see `load_study_area`).
+    sites : Sites
+        Sites serving the area.
+    flows : dict of arrays
+        Road flow records (see `load_road_flows`).
+    store : StageStore
+        Optional store of the output of each stage.
+    directory_results : string
+        Folder the results are written to.
+    directory_shapes : string
+        Folder the road segment shapefile is written to.
+    bounds : tuple
+        Optional (minx, miny, maxx, maxy) tile. Only segments whose
+        midpoint lies in the tile are evaluated (see `load_roads`).
+    checkpoint : Checkpoint
+        Optional checkpoint of the link budgets, in batches of segments.
+
+    Returns
+    -------
+    summary : dict
+        Number of segments evaluated and result rows written, and the
+        paths of the files written.
+
+    """
+    model = settings['model']
+    spectral_efficiency_lut = settings['spectral_efficiency_lut']
+    time_axis = settings['time_axis']
+    road_path = settings['road_path']
+    road_key = settings['road_key']
+    sites_key = settings['sites_key']
+    study_area_key = settings['study_area_key']
+    crs = settings['crs']
+    settlement_type = settings['settlement_type']
+    seed_value = settings['seed_value']
+    iterations = settings['iterations']
+
+    if len(flows['edge_id']) == 0:
+        print('No road flow records to evaluate on the time axis ({})'.format(
+            time_axis))
+        return {'segments': 0, 'results': 0, 'files': []}
+
+    #segments depend on which roads carry flows, but not on the counts,
+    #so a flow update only changes the demand
+    unique_link_ids = np.unique(flows['edge_id'])
+    segments_key = make_key('segments', road_key, unique_link_ids,
+        args.segment_length, bounds)
+    columns = store.load('segments', segments_key) if store else None
+    if columns is None:
+        print('Importing road data')
+        roads = load_roads(road_path, set(unique_link_ids.tolist()),
+            args.segment_length, area, bounds)
+        if store:
+            store.save('segments', segments_key, to_columns(roads))
+    else:
+        roads = Segments(**columns)
+
+    if len(roads) == 0:
+        print('No road segments to evaluate')
+        return {'segments': 0, 'results': 0, 'files': []}
+
+    #spread the road flows onto a time by segment matrix
+    segment_flows = Flows.from_records(flows['edge_id'], flows['time'],
+        flows['vehicles'], roads.road_id, time_axis)
+
+    scenarios = swept_scenarios(args)
+    frequencies = list(OrderedDict.fromkeys(args.frequency))
+    bandwidths = list(OrderedDict.fromkeys(args.bandwidth))
+    print('Running {} scenarios'.format(len(scenarios)))
+
+    print('Estimating road segment capacity')
+    if args.carrier_bandwidths:
+        #each site aggregates every carrier it holds, so segments are
+        #served by the nearest site whatever its bands
+        serving_sites, bands, carrier_bandwidths, carriers = get_carriers(
+            sites, args.carrier_bandwidths)
+        print('Aggregating {} bands across {} sites'.format(len(bands),
+            len(serving_sites)))
+    else:
+        serving_sites = sites
+        carriers = None
+    site_index = SiteIndex(serving_sites)
+
+    #the midpoint of each road segment is its centroid
+    centroids = roads.midpoints
+
+    #find the most likely cell to serve each segment, which does not
+    #change with the hour or the scenario
+    site_ids, site_parameters, interferers, interferer_parameters = (
+        assign_sites(args, model, settlement_type, centroids, serving_sites,
+            site_index, carriers))
+    closest_sites = site_index.coordinates[site_ids]
+
+    grid = None
+    if args.raster_resolution > 0:
+        #the raster covers the study area and every segment midpoint
+        extent = np.concatenate([centroids.min(axis=0), centroids.max(axis=0)])
+        if area is not None:
+            region = np.asarray(area.bounds)
+            if bounds is not None:
+                region = np.concatenate([np.maximum(region[:2], bounds[:2]),
+                    np.minimum(region[2:], bounds[2:])])
+            extent = np.concatenate([np.minimum(extent[:2], region[:2]),
+                np.maximum(extent[2:], region[2:])])
+        grid = RasterGrid.from_bounds(extent, args.raster_resolution)
+        raster_path = args.raster_path or os.path.join(directory_results,
+            'raster')
+
+    #the per segment inputs of the link budgets
+    link_inputs = {'closest_sites': closest_sites}
+    if interferers is not None:
+        link_inputs['interferers'] = interferers
+    for prefix, parameters in (('site_', site_parameters),
+        ('interferer_', interferer_parameters)):
+        for name, value in (parameters or {}).items():
+            link_inputs[prefix + name] = value
+
+    #each segment keeps the same stream id whichever roads it is evaluated
+    #with, so tiled, incremental and full runs give the same draws
+    link_ids = roads.link_ids()
+    link_inputs['link_ids'] = link_ids
+
+    link_site_options = {
+        'link_ids': link_ids,
+        'interferers': interferers,
+        'site_parameters': site_parameters,
+        'interferer_parameters': interferer_parameters,
+    }
+
+    #capacity (Mbps) and further capacity columns (statistics or bands) of
+    #every segment, keyed by frequency and bandwidth, the only parameters
+    #the radio depends on
+    capacity_results = {}
+    for frequency in frequencies:
+
+        if args.carrier_bandwidths:
+            #path loss is evaluated once per band, over every segment whose
+            #serving site carries it
+            link_budget_arguments = (model, centroids, closest_sites, bands,
+                carrier_bandwidths, settlement_type, seed_value, iterations,
+                spectral_efficiency_lut)
+            link_budget_key = make_key('carrier_link_budgets', road_key,
+                args.segment_length, *link_budget_arguments[3:], args.interference_sites,
+                args.interference_distance)
+            link_budgets = link_budget_stage(args, store, link_budget_key,
+                link_budget_arguments, {}, link_site_options, link_inputs,
+                estimate_carrier_link_budgets_parallel, checkpoint)
+
+            #the aggregated capacity is the sum over carriers, which is
+            #also reported band by band
+            band_capacities = OrderedDict(
+                ('capacity_{:g}'.format(band),
+                    np.round(link_budgets['capacity_mbps'][:, column]).astype(int))
+                for column, band in enumerate(bands.tolist()))
+            for bandwidth in bandwidths:
+                capacity_results[frequency, bandwidth] = (
+                    np.sum(link_budgets['capacity_mbps'], axis=1),
+                    band_capacities)
+            continue
+
+        path_loss_table = None
+        if args.path_loss_bin_width > 0 and site_parameters is not None:
+            print('Median path loss table is not used with per-site parameters')
+        elif args.path_loss_bin_width > 0:
+            if grid is not None:
+                #any raster cell may be served by any site
+                corners = np.reshape(grid.bounds, (2, 2))
+                max_distance = np.hypot(*np.ptp(np.concatenate(
+                    [corners, site_index.coordinates]), axis=0))
+            else:
+                max_distance = np.sqrt(np.sum((centroids - closest_sites)**2,
+                    axis=1)).max(initial=0)
+            path_loss_table = build_path_loss_table(model, frequency,
+                settlement_type, max_distance, args.path_loss_bin_width)
+            print('Median path loss table built, maximum error {} dB'.format(
+                path_loss_table.max_error))
+
+        link_budget_options = {
+            'realisations': args.realisations,
+            'path_loss_table': path_loss_table,
+        }
+
+        #received power does not depend on the bandwidth, so single
+        #estimates run the radio once per frequency, while Monte Carlo
+        #summaries need a run per bandwidth
+        if args.realisations > 1:
+            radio_bandwidths = bandwidths
+        elif grid is not None:
+            #segments sample the raster in place of their own link budgets
+            radio_bandwidths = []
+            raster_arguments = (frequency, bandwidths[0], settlement_type,
+                seed_value, iterations, spectral_efficiency_lut)
+            raster = RasterStore.create(os.path.join(raster_path,
+                'frequency={:g}'.format(frequency)), grid, args.raster_tile_size,
+                RASTER_LAYERS, make_key('raster', sites_key, study_area_key,
+                    *raster_arguments, path_loss_table, args.interference_sites,
+                    args.interference_distance, args.best_server_sites), crs)
+            computed = estimate_raster(raster, area, args, model, sites,
+                site_index, raster_arguments, path_loss_table)
+            print('Raster of {} by {} cells, {} of {} tiles computed'.format(
+                grid.width, grid.height, computed,
+                len(grid.tiles(raster.tile_size))))
+            link_budgets = sample_raster(raster, centroids, args, model, sites,
+                site_index, raster_arguments, path_loss_table)
+        else:
+            radio_bandwidths = bandwidths[:1]
+
+        for bandwidth in radio_bandwidths:
+            #estimate the capacity of all road segments, split across workers
+            link_budget_arguments = (model, centroids, closest_sites,
+                frequency, bandwidth, settlement_type, seed_value, iterations,
+                spectral_efficiency_lut)
+            link_budget_key = make_key('link_budgets', road_key,
+                args.segment_length, *link_budget_arguments[3:],
+                link_budget_options,
+                args.interference_sites, args.interference_distance,
+                args.best_server_sites)
+            link_budgets = link_budget_stage(args, store, link_budget_key,
+                link_budget_arguments, link_budget_options,
+                link_site_options, link_inputs,
+                checkpoint=checkpoint)
+
+            if args.realisations > 1:
+                #report the mean capacity, plus the tail of the distribution
+                capacity_results[frequency, bandwidth] = (
+                    link_budgets['capacity_mean'], {
+                        name: np.round(link_budgets[name]).astype(int)
+                        for name in ['capacity_p5', 'capacity_p50',
+                            'capacity_p95']
+                    })
+
+        if args.realisations == 1:
+            #capacity of every bandwidth at once, as a (bandwidths, segments)
+            #array
+            capacity = link_capacity(link_budgets['received_power'],
+                np.asarray(bandwidths, dtype=float)[:, np.newaxis],
+                spectral_efficiency_lut,
+                None if interferers is None else link_budgets['interference'])
+            for bandwidth, capacity_mbps in zip(bandwidths,
+                capacity['capacity_mbps']):
+                capacity_results[frequency, bandwidth] = (capacity_mbps, {})
+
+    #record results for every observed segment and time, segment by segment
+    segment_index, time_index = np.nonzero(segment_flows.observed.T)
+
+    names = np.asarray(roads.names(), dtype=object)
+    times = np.asarray(segment_flows.times, dtype=object)
+    vehicles = segment_flows.vehicles[time_index, segment_index]
+
+    #demand only depends on the target capacity over the overbooking
+    #factor, so it is found for every pair at once, as a (pairs, results)
+    #array
+    demand_pairs = list(OrderedDict.fromkeys(
+        (scenario['target_capacity'], scenario['obf'])
+        for scenario in scenarios))
+    target_capacities, obfs = np.asarray(demand_pairs, dtype=float).T
+    demand_km2 = estimate_demand(vehicles[np.newaxis, :],
+        target_capacities[:, np.newaxis], obfs[:, np.newaxis])
+
+    #columns shared by every scenario
+    shared_columns = OrderedDict([
+        ('road_id', roads.road_id[segment_index].tolist()),
+        ('road_id_segment', names[segment_index].tolist()),
+        ('hour', times[time_index].tolist()),
+        ('vehicle_density', vehicles.tolist()),
+    ])
+
+    files = []
+
+    print('Writing results to .csv')
+    for scenario in scenarios:
+
+        capacity_mbps, capacity_columns = capacity_results[
+            scenario['frequency'], scenario['bandwidth']]
+
+        #radio capacity does not change with the hour, so it is computed
+        #once per segment and broadcast against the demand of every time
+        capacities = np.round(capacity_mbps).astype(int)[segment_index]
+        demand = demand_km2[demand_pairs.index(
+            (scenario['target_capacity'], scenario['obf']))]
+        capacity_margin_km2 = capacities - demand
+
+        result_columns = OrderedDict(shared_columns)
+        result_columns['demand'] = demand.tolist()
+        result_columns['capacity'] = capacities.tolist()
+        result_columns['capacity_margin'] = capacity_margin_km2.tolist()
+
+        for name, values in capacity_columns.items():
+            result_columns[name] = values[segment_index].tolist()
+
+        path = os.path.join(directory_results,
+            scenario_results_path(scenarios, scenario))
+        csv_column_writer(result_columns, os.path.dirname(path),
+            os.path.basename(path))
+        files.append(path)
+
+    if len(scenarios) > 1:
+        files.append(write_scenario_index(scenarios, directory_results))
+
+    print('Writing roads to .shp')
+    write_shapefile(roads.to_geojson(), directory_shapes, 'chopped_roads.shp',
+        crs)
+    files.extend(shapefile_paths(directory_shapes, 'chopped_roads.shp'))
+
+    return {'segments': len(roads), 'results': len(time_index), 'files': files}
+
+
+def run_tile(args, settings, area, sites, tile, directory_tiles):
+    """
+    Evaluate the segments of one tile, served by the sites within the
+    halo distance of the tile, writing the results to the tile folder.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options.
+    settings : dict
+        Constants of the run (see `run_area`).
+    area : shapely geometry
+        Optional study area.
+    sites : Sites
+        Every site.
+    tile : tuple
+        The x and y number of the tile.
+    directory_tiles : string
+        Folder holding a folder for each tile.
+
+    Returns
+    -------
+    summary : dict
+        The tile name, bounds and number of sites, segments and result
+        rows, the time taken (seconds) and the files written, relative
+        to directory_tiles.
+
+    """
+    tile_x, tile_y = [int(number) for number in tile]
+    name = 'tile_{}_{}'.format(tile_x, tile_y)
+    directory_tile = os.path.join(directory_tiles, name)
+    size = args.tile_size
+    bounds = (tile_x * size, tile_y * size, (tile_x + 1) * size,
+        (tile_y + 1) * size)
+    start = time.time()
+
+    if area is not None:
+        shapely.prepare(area)
+
+    #the sites within the halo are the only candidate servers and
+    #interferers of the tile
+    halo = args.tile_halo
+    x, y = sites.coordinates.T
+    near = np.flatnonzero((x >= bounds[0] - halo) & (x <= bounds[2] + halo) &
+        (y >= bounds[1] - halo) & (y <= bounds[3] + halo))
+
+    if len(near) == 0:
+        print('No sites within {} m of {}'.format(halo, name))
+        summary = {'segments': 0, 'results': 0, 'files': []}
+    else:
+        tile_args = argparse.Namespace(**dict(vars(args), workers=1,
+            raster_path=args.raster_path and os.path.join(args.raster_path,
+                name)))
+        store = None
+        if args.stage_cache_path:
+            store = StageStore(os.path.join(args.stage_cache_path, name))
+        summary = run_area(tile_args, settings, area,
+            Sites(**rows(to_columns(sites), near)),
+            load_tile_flows(os.path.join(directory_tile, 'flows.bin'),
+                settings['time_axis']),
+            store, directory_tile, directory_tile, bounds)
+
+    return OrderedDict([
+        ('tile', name),
+        ('bounds', bounds),
+        ('sites', len(near)),
+        ('segments', summary['segments']),
+        ('results', summary['results']),
+        ('seconds', round(time.time() - start, 3)),
+        ('files', [os.path.relpath(path, directory_tiles)
+            for path in summary['files']]),
+    ])
+
+
+def run_tiles(args, settings, area, sites, flows_path, directory_tiles,
+    directory_results, directory_shapes):
+    """
+    Evaluate the study area tile by tile, out of core.
+
+    The road flows are split by tile in one streaming pass, then each
+    tile loads its own segments, flows and nearby sites, writes its
+    results and frees them, so peak memory depends on the tile size
+    rather than the size of the study area. Tiles are the unit of work
+    across worker processes, and each is recorded in a checkpoint of
+    directory_tiles as it completes, so tiles completed by an earlier
+    run of the same inputs, with their files intact, are skipped. The
+    results of every tile are then merged (see `merge_tiles`).
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options.
+    settings : dict
+        Constants of the run (see `run_area`).
+    area : shapely geometry
+        Optional study area.
+    sites : Sites
+        Every site.
+    flows_path : string
+        path for road flow data.
+    directory_tiles : string
+        Folder holding a folder for each tile.
+    directory_results : string
+        Folder the merged results are written to.
+    directory_shapes : string
+        Folder the merged road segment shapefile is written to.
+
+    Returns
+    -------
+    summaries : list of dicts
+        Summary of each tile evaluated by this run.
+
+    """
+    time_axis = settings['time_axis']
+
+    tiles, edge_ids, tile_numbers = road_tiles(settings['road_path'],
+        args.tile_size, area)
+    names = ['tile_{}_{}'.format(x, y) for x, y in tiles.tolist()]
+
+    partition_key = make_key('flow_partition', file_digest(flows_path),
+        settings['road_key'], time_axis.minutes, str(time_axis.start),
+        time_axis.labels, args.tile_size)
+
+    #the partition records its key and the tiles holding road flows, as
+    #only those tiles have a folder
+    partition_path = os.path.join(directory_tiles, 'partition.json')
+    partition = {}
+    if os.path.exists(partition_path):
+        with open(partition_path, 'r') as source:
+            partition = json.load(source)
+
+    if partition.get('key') != partition_key:
+        print('Partitioning road flow data over {} tiles met by roads'.format(
+            len(tiles)))
+        start = time.time()
+        flow_rows, written, off_axis = partition_road_flows(flows_path,
+            edge_ids, tile_numbers,
+            [os.path.join(directory_tiles, name, 'flows.bin') for name in names],
+            time_axis, args.flow_chunk_size)
+        print('Read {} flow rows ({:.0f} rows/s)'.format(flow_rows,
+            flow_rows / max(time.time() - start, 1e-9)))
+        report_time_axis(flow_rows, off_axis, time_axis)
+        partition = {
+            'key': partition_key,
+            'tiles': [names[number] for number in written.tolist()],
+        }
+        os.makedirs(directory_tiles, exist_ok=True)
+        with open(partition_path, 'w') as sink:
+            json.dump(partition, sink, indent=1)
+
+    #the worker count and checkpoint options do not change the results,
+    #so a run can resume with more or fewer workers
+    run_key = make_key('tiles', partition_key, settings['sites_key'],
+        settings['study_area_key'],
+        {key: value for key, value in vars(args).items()
+            if key not in ('workers', 'checkpoint_path', 'checkpoint_size')})
+    checkpoint = Checkpoint(directory_tiles)
+
+    #tiles whose roads carry no flows have nothing to evaluate
+    holding_flows = set(partition['tiles'])
+    active = [
+        (tile, name) for tile, name in zip(tiles.tolist(), names)
+        if name in holding_flows
+    ]
+
+    pending = [tile for tile, name in active
+        if not checkpoint.done(name, run_key)]
+
+    print('Evaluating {} of {} tiles with road flows'.format(len(pending),
+        len(active)))
+
+    #workers return the summary of each tile, and only this process
+    #records them in the checkpoint
+    summaries = []
+    if args.workers <= 1:
+        for tile in pending:
+            summary = run_tile(args, settings, area, sites, tile,
+                directory_tiles)
+            checkpoint.complete(summary['tile'], run_key, **summary)
+            summaries.append(summary)
+            print('Completed {} of {} tiles'.format(len(summaries),
+                len(pending)))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [
+                executor.submit(run_tile, args, settings, area, sites, tile,
+                    directory_tiles)
+                for tile in pending
+            ]
+            for future in as_completed(futures):
+                summary = future.result()
+                checkpoint.complete(summary['tile'], run_key, **summary)
+                summaries.append(summary)
+                print('Completed {} of {} tiles'.format(len(summaries),
+                    len(pending)))
+
+    merge_tiles(args, checkpoint, [name for tile, name in active],
+        directory_results, directory_shapes)
+
+    return summaries
+
+
+def merge_tiles(args, checkpoint, names, directory_results,
+    directory_shapes):
+    """
+    Assemble the results and road segments of every tile into the
+    layout of a run over the whole study area, tile by tile.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Run options (the swept scenario parameters).
+    checkpoint : Checkpoint
+        Checkpoint of the tiles, listing the files of each.
+    names : list of strings
+        Names of the tiles to merge, in order.
+    directory_results : string
+        Folder the results are written to.
+    directory_shapes : string
+        Folder the road segment shapefile is written to.
+
+    """
+    files = set()
+    for name in names:
+        files.update(checkpoint.files(name))
+
+    def tile_files(filename):
+        return [os.path.join(checkpoint.path, name, filename)
+            for name in names if os.path.join(name, filename) in files]
+
+    scenarios = swept_scenarios(args)
+
+    print('Merging the results of {} tiles'.format(len(names)))
+    for scenario in scenarios:
+        path = scenario_results_path(scenarios, scenario)
+        paths = tile_files(path)
+        if paths:
+            merge_csv(paths, os.path.dirname(os.path.join(directory_results,
+                path)), os.path.basename(path))
+
+    if len(scenarios) > 1:
+        write_scenario_index(scenarios, directory_results)
+
+    paths = tile_files('chopped_roads.shp')
+    if paths:
+        merge_shapefiles(paths, directory_shapes, 'chopped_roads.shp')
+
+
+def scenario_values(text):
+    """
+    Parse a comma separated list of scenario parameter values.
+
+    """
+    values = [float(value) for value in text.split(',') if value.strip()]
+
+    if not values:
+        raise argparse.ArgumentTypeError('Expected at least one value')
+
+    return values
+
+
+def carrier_values(text):
+    """
+    Parse a comma separated list of band:bandwidth pairs (MHz), e.g.
+    900:5,2100:10. An empty list gives None.
+
+    """
+    carriers = OrderedDict()
 
-    return nearest_site
+    for pair in text.split(','):
+        if not pair.strip():
+            continue
+        try:
+            band, bandwidth = pair.split(':')
+            carriers[float(band)] = float(bandwidth)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                'Expected band:bandwidth, not {}'.format(pair.strip()))
+
+    return carriers or None
+
+
+def scenario_grid(parameters):
+    """
+    Build every combination of the scenario parameter values.
+
+    Parameters
+    ----------
+    parameters : OrderedDict
+        List of values of each parameter, keyed by name.
+
+    Returns
+    -------
+    scenarios : list of OrderedDicts
+        Every scenario, varying the last parameter fastest.
+
+    """
+    return [OrderedDict(zip(parameters, values))
+        for values in itertools.product(*parameters.values())]
+
+
+def scenario_path(scenario):
+    """
+    Relative directory of the results of a scenario, partitioned by
+    parameter (e.g. frequency=800/bandwidth=10/target_capacity=2/obf=50).
+
+    """
+    return os.path.join(*['{}={:g}'.format(name, value)
+        for name, value in scenario.items()])
+
+
+def swept_scenarios(args):
+    """
+    Every combination of the swept frequency, bandwidth, target capacity
+    and overbooking factor (see `scenario_grid`).
+
+    """
+    return scenario_grid(OrderedDict([
+        ('frequency', args.frequency),
+        ('bandwidth', args.bandwidth),
+        ('target_capacity', args.target_capacity),
+        ('obf', args.obf),
+    ]))
+
+
+def scenario_results_path(scenarios, scenario):
+    """
+    Path of the results of a scenario, relative to the results folder.
+    A single scenario is written to results.csv, and each of a sweep to
+    scenarios/<scenario_path>/results.csv.
+
+    """
+    if len(scenarios) == 1:
+        return 'results.csv'
+
+    return os.path.join('scenarios', scenario_path(scenario), 'results.csv')
+
+
+def write_scenario_index(scenarios, directory_results):
+    """
+    Write scenarios/scenarios.csv, listing the parameters and results
+    path of every scenario of a sweep, and return its path.
+
+    """
+    directory_scenarios = os.path.join(directory_results, 'scenarios')
+
+    csv_writer([
+        OrderedDict(
+            [(name, '{:g}'.format(value)) for name, value in scenario.items()],
+            path=os.path.join(scenario_path(scenario), 'results.csv'))
+        for scenario in scenarios
+    ], directory_scenarios, 'scenarios.csv')
+
+    return os.path.join(directory_scenarios, 'scenarios.csv')
 
 
 def estimate_demand(vehicle_density, target_capacity, obf):
@@ -201,17 +1801,24 @@ def estimate_demand(vehicle_density, target_capacity, obf):
 
     Parameters
     ----------
-    vehicle_density : float
-        The number of vehicles per 1 kilometer stretch of road.
+    vehicle_density : float or array
+        The number of vehicles per 1 kilometer stretch of road, for
+        example as a (times, segments) array.
     target_capacity : int
         Target capacity per vehicle in Mbps.
     obf : int
         Overbooking factor.
 
+    Returns
+    -------
+    demand : int or array
+        Demand in Mbps, rounded to the nearest integer, with the shape
+        of vehicle_density.
+
     """
-    demand = vehicle_density * target_capacity / obf
+    demand = np.asarray(vehicle_density) * target_capacity / obf
 
-    return round(demand)
+    return np.round(demand).astype(int)
 
 
 def csv_writer(data, directory, filename):
@@ -242,33 +1849,27 @@ def csv_writer(data, directory, filename):
         writer.writerows(data)
 
 
-def convert_shapes_to_geojson(data):
+def csv_column_writer(columns, directory, filename):
     """
-    Converts shapes to geojson.
+    Write columns of data to a CSV file path.
 
     Parameters
     ----------
-    data : dict of dicts
-
-    Returns
-    -------
-    links : list of dicts
-        Contains geojson format data.
+    columns : OrderedDict of lists
+        Values of each column, keyed by field name.
+    directory : string
+        Path to export folder
+    filename : string
+        Desired filename.
 
     """
-    links = []
-
-    for key, value in data.items():
-
-        links.append({
-            'type': 'Feature',
-            'geometry': mapping(value['geom']),
-            'properties': {
-                'road_id_segment': key
-            }
-        })
+    if not os.path.exists(directory):
+        os.makedirs(directory)
 
-    return links
+    with open(os.path.join(directory, filename), 'w') as csv_file:
+        writer = csv.writer(csv_file, lineterminator = '\n')
+        writer.writerow(list(columns))
+        writer.writerows(zip(*columns.values()))
 
 
 def write_shapefile(data, directory, filename, crs):
@@ -314,8 +1915,200 @@ def write_shapefile(data, directory, filename, crs):
             sink.write(datum)
 
 
+def shapefile_paths(directory, filename):
+    """
+    Paths of the files making up a shapefile.
+
+    """
+    stem = os.path.join(directory, os.path.splitext(filename)[0])
+
+    return [stem + extension
+        for extension in ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+        if os.path.exists(stem + extension)]
+
+
+def merge_csv(paths, directory, filename):
+    """
+    Concatenate CSV files sharing a header, streaming each file in
+    turn. The output is written under a temporary name and then
+    renamed, so it is either complete or left as before.
+
+    Parameters
+    ----------
+    paths : list of strings
+        CSV files to concatenate, in order.
+    directory : string
+        Path to export folder
+    filename : string
+        Desired filename.
+
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    path = os.path.join(directory, filename)
+    temporary = path + '.tmp'
+
+    with open(temporary, 'w') as sink:
+        for number, source_path in enumerate(paths):
+            with open(source_path, 'r') as source:
+                header = source.readline()
+                if number == 0:
+                    sink.write(header)
+                shutil.copyfileobj(source, sink)
+
+    os.replace(temporary, path)
+
+
+def merge_shapefiles(paths, directory, filename):
+    """
+    Concatenate shapefiles sharing a schema and crs, streaming the
+    features of each in turn.
+
+    Parameters
+    ----------
+    paths : list of strings
+        Shapefiles to concatenate, in order.
+    directory : string
+        Path to export folder.
+    filename : string
+        Desired filename.
+
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    with fiona.open(paths[0], 'r') as source:
+        meta = source.meta
+
+    with fiona.open(os.path.join(directory, filename), 'w', **meta) as sink:
+        for path in paths:
+            with fiona.open(path, 'r') as source:
+                sink.writerecords(source)
+
+
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(description='Run np4d for central Oxford')
+    parser.add_argument('--workers', type=int,
+        default=CONFIG.getint('run', 'workers', fallback=1),
+        help='number of worker processes (1 runs serially)')
+    parser.add_argument('--chunk-size', type=int,
+        default=CONFIG.getint('run', 'chunk_size', fallback=10000),
+        help='maximum number of road segments sent to a worker at a time')
+    parser.add_argument('--realisations', type=int,
+        default=CONFIG.getint('run', 'realisations', fallback=1),
+        help='number of Monte Carlo shadow fading realisations per segment')
+    parser.add_argument('--path-loss-bin-width', type=float,
+        default=CONFIG.getfloat('run', 'path_loss_bin_width', fallback=0),
+        help='distance bin (m) of a median path loss table for single '
+            'estimates (0 disables, and must be 0 with --realisations)')
+    parser.add_argument('--cache-path',
+        default=CONFIG.get('run', 'cache_path', fallback='') or None,
+        help='optional on-disk store of seeded link budget batches, reused '
+            'by later runs with the same inputs')
+    parser.add_argument('--segment-length', type=float,
+        default=CONFIG.getfloat('run', 'segment_length', fallback=250),
+        help='length (m) road links are cut into')
+    parser.add_argument('--flow-chunk-size', type=int,
+        default=CONFIG.getint('run', 'flow_chunk_size', fallback=100000),
+        help='number of road flow rows parsed at a time')
+    parser.add_argument('--stage-cache-path',
+        default=CONFIG.get('run', 'stage_cache_path', fallback='') or None,
+        help='directory storing the output of each stage between runs')
+    parser.add_argument('--interference-sites', type=int,
+        default=CONFIG.getint('run', 'interference_sites', fallback=0),
+        help='number of nearest co-channel sites summed as interference '
+            '(0 uses a constant -60 dBm)')
+    parser.add_argument('--interference-distance', type=float,
+        default=CONFIG.getfloat('run', 'interference_distance', fallback=0),
+        help='distance (m) beyond which sites do not interfere (0 for none)')
+    parser.add_argument('--best-server-sites', type=int,
+        default=CONFIG.getint('run', 'best_server_sites', fallback=0),
+        help='number of nearest sites compared to find the strongest server '
+            'using per-site parameters (0 uses the nearest site). The '
+            'frequency then comes from each site, so cannot be swept')
+    #the time options default to None, so the [run] settings they override
+    #are read in one place (TimeAxis.from_config)
+    parser.add_argument('--time-resolution', type=int,
+        help='length (minutes) of each time slice of the flows')
+    parser.add_argument('--time-start',
+        help='start of a flow time series (empty gives a daily profile)')
+    parser.add_argument('--time-end',
+        help='end of a flow time series')
+    parser.add_argument('--study-area',
+        default=CONFIG.get('run', 'study_area', fallback='') or None,
+        help='shapefile or minx,miny,maxx,maxy bounding box roads are limited to')
+    parser.add_argument('--frequency', type=scenario_values,
+        default=CONFIG.get('scenarios', 'frequency', fallback='800'),
+        help='comma separated carrier frequencies (MHz) to sweep')
+    parser.add_argument('--bandwidth', type=scenario_values,
+        default=CONFIG.get('scenarios', 'bandwidth', fallback='10'),
+        help='comma separated channel bandwidths (MHz) to sweep')
+    parser.add_argument('--target-capacity', type=scenario_values,
+        default=CONFIG.get('scenarios', 'target_capacity', fallback='2'),
+        help='comma separated target capacities (Mbps) per vehicle to sweep')
+    parser.add_argument('--obf', type=scenario_values,
+        default=CONFIG.get('scenarios', 'obf', fallback='50'),
+        help='comma separated overbooking factors to sweep')
+    parser.add_argument('--carrier-bandwidths', type=carrier_values,
+        default=CONFIG.get('run', 'carrier_bandwidths', fallback=''),
+        help='comma separated band:bandwidth (MHz) pairs of the carriers '
+            'aggregated by each site, e.g. 900:5,2100:10 (empty disables). '
+            'Replaces --frequency and --bandwidth, which then take a '
+            'single value')
+    parser.add_argument('--raster-resolution', type=float,
+        default=CONFIG.getfloat('run', 'raster_resolution', fallback=0),
+        help='cell size (m) of a coverage and capacity raster sampled by '
+            'road segments (0 evaluates every segment)')
+    parser.add_argument('--raster-tile-size', type=int,
+        default=CONFIG.getint('run', 'raster_tile_size', fallback=256),
+        help='number of rows and columns of raster cells evaluated at a time')
+    parser.add_argument('--raster-path',
+        default=CONFIG.get('run', 'raster_path', fallback='') or None,
+        help='directory of the raster tiles (defaults to results/raster)')
+    parser.add_argument('--tile-size', type=float,
+        default=CONFIG.getfloat('run', 'tile_size', fallback=0),
+        help='width (m) of the square British National Grid tiles the study '
+            'area is evaluated in (0 evaluates it at once)')
+    parser.add_argument('--tile-halo', type=float,
+        default=CONFIG.getfloat('run', 'tile_halo', fallback=10000),
+        help='distance (m) around a tile within which sites are loaded')
+    parser.add_argument('--tile-path',
+        default=CONFIG.get('run', 'tile_path', fallback='') or None,
+        help='directory of the tile flows and results (defaults to results/tiles)')
+    parser.add_argument('--checkpoint-path',
+        default=CONFIG.get('run', 'checkpoint_path', fallback='') or None,
+        help='directory of the checkpointed link budget batches (none disables)')
+    parser.add_argument('--checkpoint-size', type=int,
+        default=CONFIG.getint('run', 'checkpoint_size', fallback=100000),
+        help='number of road segments in each checkpointed batch')
+    args = parser.parse_args()
+
+    if args.carrier_bandwidths and (args.realisations > 1 or
+        args.best_server_sites > 0):
+        parser.error('Carrier aggregation uses single estimates from the '
+            'nearest site')
+    if args.carrier_bandwidths and (len(args.frequency) > 1 or
+        len(args.bandwidth) > 1):
+        #the carriers of each site set its bands and bandwidths, so a
+        #sweep would only relabel the same results
+        parser.error('Carrier aggregation takes its bands and bandwidths '
+            'from --carrier-bandwidths, so --frequency and --bandwidth '
+            'cannot be swept')
+    if args.best_server_sites > 0 and len(args.frequency) > 1:
+        #each site transmits in its own band, so every swept frequency
+        #would only relabel the same results
+        parser.error('Best server selection uses the frequency band of each '
+            'site, so --frequency cannot be swept')
+    if args.realisations > 1 and args.path_loss_bin_width > 0:
+        #the table holds the median path loss, without shadow fading
+        parser.error('Monte Carlo realisations draw their own shadow fading, '
+            'so cannot use a median path loss table (--path-loss-bin-width)')
+    if args.raster_resolution > 0 and (args.realisations > 1 or
+        args.carrier_bandwidths):
+        parser.error('The raster holds single estimates of a single carrier')
+
     ##propagation model can either be:
     ##'etsi_tr_138_901' or
     ##'extended_hata'
@@ -340,104 +2133,93 @@ if __name__ == '__main__':
         ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
     ]
 
+    #compile the lookup table once for every sinr lookup
+    spectral_efficiency_lut = SpectralEfficiencyLUT(modulation_and_coding_lut)
+
     crs = 'epsg:27700'
     directory = os.path.join(BASE_PATH, 'processed')
     directory_results = os.path.join(BASE_PATH, '..', 'results')
 
-    print('Importing sites data')
-    path = os.path.join('data','oxford_cells.csv')
-    sites = get_sites(path)
-
-    print('Importing road flow data')
-    path = os.path.join('data','link_use_central_oxford.csv')
-    flows, unique_link_ids = load_road_flows(path)
-
-    print('Importing road data')
-    path = os.path.join('data','shapes','fullNetworkWithEdgeIDs.shp')
-    roads = load_roads(path, unique_link_ids)
-
-    frequency = 800
-    bandwidth = 10
-    settlement_type = 'urban'
-    seed_value = 42
-    iterations = 1
-    target_capacity = 2
-    obf = 50
-
-    results = []
-
-    for key, road in roads.items():
-        road_id = str(key).split('_')[0]
-
-        for interval_key, interval_name in [
-            ('MIDNIGHT', '00'),
-            ('ONEAM', '01'),
-            ('TWOAM', '02'),
-            ('THREEAM', '03'),
-            ('FOURAM', '04'),
-            ('FIVEAM', '05'),
-            ('SIXAM', '06'),
-            ('SEVENAM', '07'),
-            ('EIGHTAM', '08'),
-            ('NINEAM', '09'),
-            ('TENAM', '10'),
-            ('ELEVENAM', '11'),
-            ('NOON', '12'),
-            ('ONEPM', '13'),
-            ('TWOPM', '14'),
-            ('THREEPM', '15'),
-            ('FOURPM', '16'),
-            ('FIVEPM', '17'),
-            ('SIXPM', '18'),
-            ('SEVENPM', '19'),
-            ('EIGHTPM', '20'),
-            ('NINEPM', '21'),
-            ('TENPM', '22'),
-            ('ELEVENPM', '23')
-            ]:
-
-            for flow in flows:
-                if int(road_id) == flow['road_id'] and interval_key == flow['hour']:
-
-                    hour = interval_key
-                    vehicle_density = flow['vehicles']
-
-                    #find the most likely cell to serve that segment
-                    site = find_closest_site(road, sites)
-
-                    #get the demand on this road segment
-                    demand_km2 = estimate_demand(vehicle_density, target_capacity, obf)
-
-                    #find centroid of road segment
-                    road_geom = road['geom'].interpolate(road['geom'].length / 2)
-
-                    #estimate the capacity of road segment
-                    capacity_km2 = estimate_link_budget(model, road_geom, site,
-                        frequency, bandwidth, settlement_type, seed_value, iterations,
-                        modulation_and_coding_lut)
-
-                    #find the capacity margin of road segment
-                    capacity_margin_km2 = capacity_km2 - demand_km2
-
-                    #record results
-                    results.append({
-                        'road_id': road_id,
-                        'road_id_segment': key,
-                        'hour': hour,
-                        'vehicle_density': vehicle_density,
-                        'demand': demand_km2,
-                        'capacity': capacity_km2,
-                        'capacity_margin': capacity_margin_km2,
-                    })
-
-    print('Writing processed sites to .csv')
-    csv_writer(results, directory_results, 'results.csv')
+    sites_path = os.path.join('data','oxford_cells.csv')
+    flows_path = os.path.join('data','link_use_central_oxford.csv')
+    road_path = os.path.join('data','shapes','fullNetworkWithEdgeIDs.shp')
+
+    time_axis = TimeAxis.from_config(CONFIG['run'], args.time_resolution,
+        args.time_start, args.time_end)
+
+    #the axis the results are labelled with, read back by the
+    #visualisations
+    if not os.path.exists(directory_results):
+        os.makedirs(directory_results)
+    time_axis.save(os.path.join(directory_results, 'time_axis.json'))
+
+    area = load_study_area(args.study_area)
+    if args.study_area and os.path.exists(args.study_area):
+        study_area_key = file_digest(args.study_area)
+    else:
+        study_area_key = args.study_area
+
+    store = StageStore(args.stage_cache_path) if args.stage_cache_path else None
+
+    road_key = make_key('roads', [
+        file_digest(os.path.splitext(road_path)[0] + extension)
+        for extension in ('.shp', '.shx', '.dbf', '.prj')
+        if os.path.exists(os.path.splitext(road_path)[0] + extension)
+    ], study_area_key)
+
+    #cells without a frequency band fall back to the first swept frequency
+    sites_key = make_key('sites', Sites.__slots__, file_digest(sites_path),
+        args.frequency[0])
+    columns = store.load('sites', sites_key) if store else None
+    if columns is None:
+        print('Importing sites data')
+        sites = get_sites(sites_path, args.frequency[0])
+        if store:
+            store.save('sites', sites_key, to_columns(sites))
+    else:
+        sites = Sites(**columns)
+
+    settings = {
+        'model': model,
+        'spectral_efficiency_lut': spectral_efficiency_lut,
+        'time_axis': time_axis,
+        'road_path': road_path,
+        'road_key': road_key,
+        'sites_key': sites_key,
+        'study_area_key': study_area_key,
+        'crs': crs,
+        'settlement_type': 'urban',
+        'seed_value': 42,
+        'iterations': 20,
+    }
 
-    print('Converting roads to geojson')
-    roads_geojson = convert_shapes_to_geojson(roads)
+    if args.tile_size > 0:
+        run_tiles(args, settings, area, sites, flows_path,
+            args.tile_path or os.path.join(directory_results, 'tiles'),
+            directory_results, directory)
+    else:
+        flows_key = make_key('flows', file_digest(flows_path), road_key,
+            time_axis.minutes, str(time_axis.start), time_axis.labels)
+        flows = store.load('flows', flows_key) if store else None
+        if flows is None:
+            print('Importing road flow data')
+            start = time.time()
+            flows, flow_rows, off_axis = load_road_flows(flows_path,
+                load_road_edge_ids(road_path, area), time_axis,
+                args.flow_chunk_size)
+            print('Read {} flow rows ({:.0f} rows/s)'.format(flow_rows,
+                flow_rows / max(time.time() - start, 1e-9)))
+            report_time_axis(flow_rows, off_axis, time_axis)
+            if store:
+                store.save('flows', flows_key, flows)
+
+        checkpoint = None
+        if args.checkpoint_path:
+            checkpoint = Checkpoint(args.checkpoint_path)
+
+        run_area(args, settings, area, sites, flows, store, directory_results,
+            directory, checkpoint=checkpoint)
 
     print('Writing sites to .shp')
-    write_shapefile(sites, directory, 'sites.shp', crs)
+    write_shapefile(sites.to_geojson(), directory, 'sites.shp', crs)
 
-    print('Writing roads to .shp')
-    write_shapefile(roads_geojson, directory, 'chopped_roads.shp', crs)
@@ -55,6 +55,7 @@ setup(
         'shapely',
         'numpy',
         'rtree',
+        'scipy',
         'pytest',
         'imageio',
         'contextily',
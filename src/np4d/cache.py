@@ -0,0 +1,346 @@
+"""
+Memoization of deterministic link budget results, and storage of
+pipeline stage outputs between runs
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import hashlib
+import numbers
+import os
+import shelve
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+
+from np4d.np4d import SpectralEfficiencyLUT
+from np4d.path_loss import PathLossTable
+from np4d.rng import RandomStreams
+
+
+class ResultCache(object):
+    """
+    Bounded least recently used cache of deterministic results.
+
+    Entries are held in memory up to maxsize, evicting the least
+    recently used entry first. If a path is given, every entry is also
+    written to an on-disk shelve, so repeated scenario sweeps can reuse
+    results from earlier runs. Hits and misses are counted.
+
+    Keys are built with `make_key`, and must include every input of the
+    cached result, including the seed. Stochastic (unseeded) results
+    should never be cached.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries held in memory.
+    path : string
+        Optional path of the on-disk shelve.
+
+    """
+    def __init__(self, maxsize=4096, path=None):
+
+        self.maxsize = maxsize
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.store = shelve.open(path) if path else None
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for a key, or default on a miss.
+
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        if self.store is not None and key in self.store:
+            value = self.store[key]
+            self._remember(key, value)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+
+        return default
+
+
+    def put(self, key, value):
+        """
+        Add a value to the cache, and to the on-disk store if used.
+
+        """
+        self._remember(key, value)
+
+        if self.store is not None:
+            self.store[key] = value
+
+
+    def memoize(self, key, function, *args, **kwargs):
+        """
+        Return the cached result for a key, calling function with the
+        given arguments and caching its result on a miss.
+
+        """
+        value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            value = function(*args, **kwargs)
+            self.put(key, value)
+
+        return value
+
+
+    def info(self):
+        """
+        Return the hit and miss counts and current size of the cache.
+
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+        }
+
+
+    def clear(self):
+        """
+        Empty the in-memory cache and reset the counters. The on-disk
+        store is left untouched.
+
+        """
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+    def close(self):
+        """
+        Close the on-disk store, if any.
+
+        """
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+
+    def _remember(self, key, value):
+
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+
+_MISSING = object()
+
+
+class StageStore(object):
+    """
+    Directory of the latest output of each pipeline stage.
+
+    Each stage is stored as one .npy file per array, together with the
+    key of the inputs it was built from. A stage is reused when its key
+    is unchanged, and a previous output is also available to recompute
+    only the part of a stage whose inputs changed. Arrays are
+    memory-mapped when loaded.
+
+    Parameters
+    ----------
+    path : string
+        Directory of the store.
+
+    """
+    def __init__(self, path):
+
+        self.path = path
+
+        os.makedirs(path, exist_ok=True)
+
+
+    def key(self, stage):
+        """
+        Return the key a stage was stored with, or None.
+
+        """
+        path = os.path.join(self.path, stage, 'key')
+
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'r') as source:
+            return source.read()
+
+
+    def load(self, stage, key=None, mmap_mode='r'):
+        """
+        Load the arrays of a stage.
+
+        Parameters
+        ----------
+        stage : string
+            Name of the stage.
+        key : string
+            Optional key the stage must have been stored with.
+        mmap_mode : string
+            Memory-map mode passed to `np.load` (None reads the arrays
+            into memory).
+
+        Returns
+        -------
+        arrays : dict of arrays
+            The stored arrays, or None if the stage is not stored or was
+            stored with another key.
+
+        """
+        stored_key = self.key(stage)
+
+        if stored_key is None or (key is not None and stored_key != key):
+            return None
+
+        directory = os.path.join(self.path, stage)
+
+        return {
+            os.path.splitext(filename)[0]: np.load(
+                os.path.join(directory, filename), mmap_mode=mmap_mode)
+            for filename in sorted(os.listdir(directory))
+            if filename.endswith('.npy')
+        }
+
+
+    def save(self, stage, key, arrays):
+        """
+        Store the arrays of a stage, replacing any earlier output.
+
+        The arrays are written to a temporary directory which is then
+        renamed, so a partly written stage is never loaded.
+
+        """
+        directory = os.path.join(self.path, stage)
+        temporary = '{}.tmp{}'.format(directory, os.getpid())
+        os.makedirs(temporary)
+
+        for name, value in arrays.items():
+            np.save(os.path.join(temporary, name + '.npy'), np.asarray(value))
+
+        with open(os.path.join(temporary, 'key'), 'w') as sink:
+            sink.write(key)
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.rename(temporary, directory)
+
+
+def make_key(*parts):
+    """
+    Build a stable cache key from function inputs.
+
+    Scalars, strings, tuples, lists, dicts, numpy arrays, random
+    streams, compiled lookup tables and path loss tables are all
+    supported. The key is a hex digest, so it is the same in every
+    process and can be used by the on-disk store.
+
+    Numeric scalars are keyed by value, not type: 0.5, np.float32(0.5)
+    and np.float64(0.5) share a key, as do 800 and 800.0. Booleans
+    and integers too large to hold exactly as a float keep their own
+    keys. Arrays are keyed by dtype, shape and bytes, so arrays of
+    equal values but different dtypes differ.
+
+    Parameters
+    ----------
+    parts : objects
+        Every input the cached result depends on.
+
+    Returns
+    -------
+    key : string
+        Hex digest identifying the inputs.
+
+    """
+    digest = hashlib.sha1()
+
+    for part in parts:
+        _update_digest(digest, part)
+
+    return digest.hexdigest()
+
+
+def file_digest(path, block_size=1048576):
+    """
+    Hash the contents of a file, reading it in blocks.
+
+    Parameters
+    ----------
+    path : string
+        Path of the file.
+    block_size : int
+        Number of bytes read at a time.
+
+    Returns
+    -------
+    digest : string
+        Hex digest of the file contents.
+
+    """
+    digest = hashlib.sha1()
+
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def _update_digest(digest, part):
+
+    if isinstance(part, np.generic):
+        part = part.item()
+
+    if isinstance(part, np.ndarray):
+        part = np.ascontiguousarray(part)
+        digest.update(repr(('ndarray', part.dtype.str, part.shape)).encode())
+        digest.update(part.tobytes())
+
+    elif isinstance(part, (list, tuple)):
+        digest.update(repr((type(part).__name__, len(part))).encode())
+        for item in part:
+            _update_digest(digest, item)
+
+    elif isinstance(part, dict):
+        digest.update(repr(('dict', len(part))).encode())
+        for name in sorted(part):
+            _update_digest(digest, name)
+            _update_digest(digest, part[name])
+
+    elif isinstance(part, numbers.Real) and not isinstance(part, bool):
+        if isinstance(part, numbers.Integral) and float(part) != part:
+            digest.update(repr(('int', int(part))).encode())
+        else:
+            digest.update(repr(('number', float(part).hex())).encode())
+
+    elif isinstance(part, RandomStreams):
+        digest.update(repr((type(part).__name__, part.entropy)).encode())
+
+    elif isinstance(part, SpectralEfficiencyLUT):
+        _update_digest(digest, ('SpectralEfficiencyLUT', part.tables))
+
+    elif isinstance(part, PathLossTable):
+        _update_digest(digest, ('PathLossTable', part.model, part.frequency,
+            part.parameters, part.distances, part.path_loss))
+
+    else:
+        digest.update(repr(part).encode())
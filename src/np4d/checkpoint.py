@@ -0,0 +1,176 @@
+"""
+Checkpoints of the completed work units of long runs
+
+A run is split into work units (batches of road segments, or tiles),
+and each unit is recorded in a manifest once complete, together with
+the key of the inputs it was computed from and the digest of every file
+it wrote. A restarted run skips the units whose key is unchanged
+and whose files are intact, and recomputes only the rest.
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from np4d.cache import file_digest
+
+
+class Checkpoint(object):
+    """
+    Directory of work unit outputs, described by a manifest.
+
+    The manifest (manifest.jsonl) holds one json line per completed
+    unit, appended and flushed to disk as each unit completes, so its
+    cost does not grow with the number of units. A line cut short by a
+    crash is dropped when the manifest is next opened, and a later line
+    for a unit replaces an earlier one. The manifest should be updated
+    by a single process; workers return their outputs to the process
+    holding the checkpoint.
+
+    Parameters
+    ----------
+    path : string
+        Directory of the checkpoint. File names recorded for each unit
+        are relative to it.
+
+    """
+    def __init__(self, path):
+
+        self.path = path
+        self.units = OrderedDict()
+
+        os.makedirs(path, exist_ok=True)
+
+        manifest_path = os.path.join(path, 'manifest.jsonl')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'rb+') as source:
+                length = 0
+                for line in source:
+                    if not line.endswith(b'\n'):
+                        break
+                    entry = json.loads(line.decode(),
+                        object_pairs_hook=OrderedDict)
+                    self.units[entry.pop('unit')] = entry
+                    length += len(line)
+                #drop a line cut short by a crash
+                source.truncate(length)
+
+
+    def __len__(self):
+        return len(self.units)
+
+
+    def done(self, unit, key):
+        """
+        Check a unit was completed from the given inputs, and that every
+        file it wrote is unchanged since.
+
+        Parameters
+        ----------
+        unit : string
+            Name of the unit.
+        key : string
+            Key of the inputs of the unit (see `make_key`).
+
+        Returns
+        -------
+        done : bool
+            False if the unit is missing, was computed from other
+            inputs, or any of its files are missing or altered.
+
+        """
+        entry = self.units.get(unit)
+
+        if entry is None or entry['key'] != key:
+            return False
+
+        for filename, digest in entry['files'].items():
+            path = os.path.join(self.path, filename)
+            if not os.path.exists(path) or file_digest(path) != digest:
+                return False
+
+        return True
+
+
+    def files(self, unit):
+        """
+        Return the files written by a completed unit, relative to the
+        checkpoint directory.
+
+        """
+        return list(self.units[unit]['files'])
+
+
+    def complete(self, unit, key, files=(), **summary):
+        """
+        Record a unit as complete.
+
+        Parameters
+        ----------
+        unit : string
+            Name of the unit.
+        key : string
+            Key of the inputs of the unit.
+        files : list of strings
+            Files written by the unit, relative to the checkpoint
+            directory, which are hashed so a later run can verify them.
+        summary : objects
+            Further json values kept in the manifest entry of the unit.
+
+        """
+        entry = OrderedDict([
+            ('key', key),
+            ('files', OrderedDict(
+                (filename, file_digest(os.path.join(self.path, filename)))
+                for filename in files)),
+        ])
+        entry.update(summary)
+
+        self.units[unit] = entry
+
+        with open(os.path.join(self.path, 'manifest.jsonl'), 'a') as sink:
+            sink.write(json.dumps(OrderedDict(unit=unit, **entry)) + '\n')
+            sink.flush()
+            os.fsync(sink.fileno())
+
+
+    def load_arrays(self, unit, key):
+        """
+        Load the arrays stored for a unit by `save_arrays`.
+
+        Returns
+        -------
+        arrays : dict of arrays
+            The stored arrays, or None if the unit is not complete for
+            the given key.
+
+        """
+        if not self.done(unit, key):
+            return None
+
+        with np.load(os.path.join(self.path, unit + '.npz')) as source:
+            return {name: source[name] for name in source.files}
+
+
+    def save_arrays(self, unit, key, arrays, **summary):
+        """
+        Store the arrays of a unit as an .npz file and record the unit as
+        complete. The file is written under a temporary name and then
+        renamed, so it is either complete or missing.
+
+        """
+        path = os.path.join(self.path, unit + '.npz')
+        temporary = path[:-len('.npz')] + '.tmp.npz'
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(temporary, **arrays)
+        os.replace(temporary, path)
+
+        self.complete(unit, key, [unit + '.npz'], **summary)
+
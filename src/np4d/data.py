@@ -0,0 +1,378 @@
+"""
+Columnar data model for cell sites, road segments and road flows
+
+Each collection is held as a small number of typed numpy arrays rather
+than as a dict (or geojson feature) per item, so the memory used per
+road segment stays small and the model stages can work on whole columns
+at once. Geojson is only built when writing outputs.
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import numpy as np
+from shapely.geometry import mapping
+
+from np4d.spatial import linestrings
+
+
+#stride between the ids of consecutive roads in `Segments.link_ids`,
+#above the number of segments any road is cut into
+SEGMENT_ID_STRIDE = 1 << 20
+
+
+class Sites(object):
+    """
+    Cell sites held as columns.
+
+    Parameters
+    ----------
+    site_id : array
+        (n,) array of site identifiers.
+    pcd_sector : array
+        (n,) array of the postcode sector of each site.
+    coordinates : array
+        (n, 2) array of site x and y coordinates.
+    ant_height : array
+        Optional (n,) array of antenna heights (m). Defaults to 30 m.
+    eirp : array
+        Optional (n,) array of equivalent isotropically radiated power
+        (dBm). Defaults to 55 dBm (40 dBm, 16 dB gain and 1 dB losses).
+    frequency : array
+        Optional (n,) array of the carrier band (MHz) of each site.
+        Unknown (NaN) by default.
+    ant_type : array
+        Optional (n,) array of antenna types. Defaults to macro.
+
+    """
+    __slots__ = ('site_id', 'pcd_sector', 'coordinates', 'ant_height',
+        'eirp', 'frequency', 'ant_type')
+
+    def __init__(self, site_id, pcd_sector, coordinates, ant_height=None,
+        eirp=None, frequency=None, ant_type=None):
+
+        self.site_id = np.asarray(site_id, dtype=str)
+        self.pcd_sector = np.asarray(pcd_sector, dtype=str)
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+
+        length = len(self.coordinates)
+        self.ant_height = _column(ant_height, 30, length, float)
+        self.eirp = _column(eirp, 40 + 16 - 1, length, float)
+        self.frequency = _column(frequency, np.nan, length, float)
+        self.ant_type = _column(ant_type, 'macro', length, str)
+
+
+    def __len__(self):
+        return len(self.coordinates)
+
+
+    def to_geojson(self):
+        """
+        Convert the sites to geojson point features, for output.
+
+        Returns
+        -------
+        sites : list of dicts
+            Contains the site_id, pcd_sector and point geometry.
+
+        """
+        sites = []
+
+        for site_id, pcd_sector, (x, y) in zip(self.site_id.tolist(),
+            self.pcd_sector.tolist(), self.coordinates.tolist()):
+            sites.append({
+                'type': 'Feature',
+                'geometry':{
+                    'type': 'Point',
+                    'coordinates': (x, y),
+                },
+                'properties':{
+                    'site_id': site_id,
+                    'pcd_sector': pcd_sector,
+                    'Cell Site': 'Cell Site',
+                    'b': 'b',
+                },
+            })
+
+        return sites
+
+
+class Segments(object):
+    """
+    Road segments held as columns.
+
+    Parameters
+    ----------
+    road_id : array
+        (n,) array of the road (edge) each segment was cut from.
+    segment_index : array
+        (n,) array of segment indices, where 0 is a road kept whole.
+    midpoints : array
+        (n, 2) array of segment midpoint coordinates.
+    length : array
+        (n,) array of segment lengths.
+    vertices : array, optional
+        (k, 2) array of the vertices of every segment, only needed to
+        write the segment geometries.
+    vertex_offsets : array, optional
+        (n + 1,) array, where segment i is held in
+        vertices[vertex_offsets[i]:vertex_offsets[i + 1]].
+
+    """
+    __slots__ = ('road_id', 'segment_index', 'midpoints', 'length',
+        'vertices', 'vertex_offsets')
+
+    def __init__(self, road_id, segment_index, midpoints, length,
+        vertices=None, vertex_offsets=None):
+
+        self.road_id = np.asarray(road_id, dtype=np.int64)
+        self.segment_index = np.asarray(segment_index, dtype=np.int32)
+        self.midpoints = np.asarray(midpoints, dtype=float).reshape(-1, 2)
+        self.length = np.asarray(length, dtype=float)
+        self.vertices = vertices
+        self.vertex_offsets = vertex_offsets
+
+
+    def __len__(self):
+        return len(self.road_id)
+
+
+    def select(self, selection):
+        """
+        Select a subset of the segments.
+
+        Parameters
+        ----------
+        selection : array
+            Indices, or a boolean mask, of the segments to keep.
+
+        Returns
+        -------
+        segments : Segments
+            The selected segments, in the order given, with their
+            vertices if loaded.
+
+        """
+        selection = np.arange(len(self))[selection]
+
+        vertices = None
+        vertex_offsets = None
+        if self.vertices is not None:
+            starts = np.asarray(self.vertex_offsets)[selection]
+            counts = np.asarray(self.vertex_offsets)[selection + 1] - starts
+            vertex_offsets = np.concatenate([[0], np.cumsum(counts)])
+            vertices = np.asarray(self.vertices)[
+                np.repeat(starts - vertex_offsets[:-1], counts) +
+                np.arange(vertex_offsets[-1])]
+
+        return Segments(self.road_id[selection], self.segment_index[selection],
+            self.midpoints[selection], self.length[selection], vertices,
+            vertex_offsets)
+
+
+    def link_ids(self):
+        """
+        Stable id of each segment, used as its random stream id, so a
+        segment receives the same draws whichever other roads are
+        evaluated with it (e.g. in a tile or after a road is added).
+
+        Returns
+        -------
+        link_ids : array
+            (n,) array of road_id * SEGMENT_ID_STRIDE + segment_index.
+
+        """
+        if len(self) and (self.road_id.min() < 0 or
+            self.road_id.max() >= np.iinfo(np.int64).max // SEGMENT_ID_STRIDE or
+            self.segment_index.max() >= SEGMENT_ID_STRIDE):
+            raise ValueError('Road ids must be non-negative and below {}, with '
+                'fewer than {} segments per road'.format(
+                    np.iinfo(np.int64).max // SEGMENT_ID_STRIDE,
+                    SEGMENT_ID_STRIDE))
+
+        return self.road_id * SEGMENT_ID_STRIDE + self.segment_index
+
+
+    def names(self):
+        """
+        Name each segment, as used in the results and shapefiles.
+
+        Returns
+        -------
+        names : list of strings
+            The road_id for a road kept whole, or road_id_segment_index.
+
+        """
+        return [
+            str(road_id) if segment_index == 0 else
+                '{}_{}'.format(road_id, segment_index)
+            for road_id, segment_index in zip(self.road_id.tolist(),
+                self.segment_index.tolist())
+        ]
+
+
+    def to_geojson(self):
+        """
+        Convert the segments to geojson linestring features, for output.
+
+        Returns
+        -------
+        links : list of dicts
+            Contains the road_id_segment name and linestring geometry.
+
+        """
+        if self.vertices is None:
+            raise ValueError('Segment vertices were not loaded')
+
+        geometries = linestrings(self.vertices, self.vertex_offsets)
+
+        links = []
+
+        for name, geom in zip(self.names(), geometries):
+            links.append({
+                'type': 'Feature',
+                'geometry': mapping(geom),
+                'properties': {
+                    'road_id_segment': name
+                }
+            })
+
+        return links
+
+
+class Flows(object):
+    """
+    Vehicle counts held as a time by segment matrix.
+
+    Parameters
+    ----------
+    times : tuple
+        Label of each time slice (row).
+    vehicles : array
+        (times, segments) array of vehicle counts, held as int32 when
+        every count fits and as int64 otherwise (counts summed over long
+        time slices can exceed the int32 range).
+    observed : array
+        (times, segments) boolean array, False where no flow was
+        recorded for that road and time.
+
+    """
+    __slots__ = ('times', 'vehicles', 'observed')
+
+    def __init__(self, times, vehicles, observed):
+
+        self.times = tuple(str(time) for time in times)
+        self.vehicles = compact_int(vehicles)
+        self.observed = np.asarray(observed, dtype=bool)
+
+
+    @classmethod
+    def from_records(cls, edge_id, time, vehicles, road_id, times):
+        """
+        Spread road flow records onto segments, as a time by segment
+        matrix.
+
+        Every segment of a road carries the flow of that road, and
+        repeated records for the same road and time are summed.
+
+        Parameters
+        ----------
+        edge_id : array
+            (m,) array of the road of each flow record.
+        time : array
+            (m,) array of the time slice index of each record, as given
+            by `TimeAxis.index`.
+        vehicles : array
+            (m,) array of the number of vehicles in each record.
+        road_id : array
+            (n,) array of the road each segment was cut from.
+        times : tuple or TimeAxis
+            Label of each time slice, in order.
+
+        Returns
+        -------
+        flows : Flows
+            Vehicle counts for each time slice and segment.
+
+        """
+        times = getattr(times, 'labels', times)
+
+        edge_id = np.asarray(edge_id, dtype=np.int64)
+        time = np.asarray(time, dtype=np.int64)
+        vehicles = np.asarray(vehicles, dtype=np.int64)
+
+        roads, segment_road = np.unique(np.asarray(road_id, dtype=np.int64),
+            return_inverse=True)
+
+        column = np.searchsorted(roads, edge_id)
+        keep = (column < len(roads)) & (time < len(times))
+        keep[keep] = roads[column[keep]] == edge_id[keep]
+
+        counts = np.zeros((len(times), len(roads)), dtype=np.int64)
+        observed = np.zeros((len(times), len(roads)), dtype=bool)
+
+        np.add.at(counts, (time[keep], column[keep]), vehicles[keep])
+        observed[time[keep], column[keep]] = True
+
+        return cls(times, counts[:, segment_road], observed[:, segment_road])
+
+
+def fits_int32(values):
+    """
+    Check every value of an integer array fits in an int32.
+
+    """
+    values = np.asarray(values)
+    limits = np.iinfo(np.int32)
+
+    return values.size == 0 or (values.min() >= limits.min and
+        values.max() <= limits.max)
+
+
+def compact_int(values):
+    """
+    Return integer values as int32 if they all fit, otherwise as int64,
+    rather than letting a cast wrap them silently.
+
+    """
+    values = np.asarray(values, dtype=np.int64)
+
+    if fits_int32(values):
+        return values.astype(np.int32)
+
+    return values
+
+
+def _column(value, default, length, dtype):
+    """
+    Return a column, filled with a default value if it is not given.
+
+    """
+    if value is None:
+        return np.asarray(np.full(length, default), dtype=dtype)
+
+    return np.asarray(value, dtype=dtype)
+
+
+def to_columns(item):
+    """
+    Return the columns of a Sites, Segments or Flows collection.
+
+    Parameters
+    ----------
+    item : Sites, Segments or Flows
+        Columnar collection.
+
+    Returns
+    -------
+    columns : dict of arrays
+        Every column that is set, keyed by name, so the collection can be
+        rebuilt with type(item)(**columns).
+
+    """
+    return {
+        name: np.asarray(getattr(item, name))
+        for name in type(item).__slots__
+        if getattr(item, name) is not None
+    }
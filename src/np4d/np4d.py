@@ -6,15 +6,31 @@ November 2019
 Oxford, UK
 
 """
-from shapely.geometry import Point, LineString, mapping
+from shapely.geometry import LineString
 import numpy as np
-from itertools import tee
 
-from np4d.path_loss import path_loss_calculator
+from np4d.path_loss import (path_loss_calculator, path_loss_calculator_array,
+    PathLossTable, _link_ids)
+from np4d.rng import as_random_streams, sub_link_ids, MedianStreams
+
+#site and user equipment parameters used by the batch link budgets
+LINK_PARAMETERS = {
+    'ant_height': 30,
+    'ant_type': 'macro',
+    'building_height': 20,
+    'street_width': 20,
+    'type_of_sight': 'los',
+    'ue_height': 5,
+    'above_roof': 0,
+    'indoor': 0,
+}
+
+#random stream family of interfering links, kept apart from serving links
+INTERFERER_LINKS = 1
 
 
 def estimate_link_budget(model, receiver, site, frequency, bandwidth, settlement_type,
-    seed_value, iterations, modulation_and_coding_lut):
+    seed_value, iterations, modulation_and_coding_lut, link_id=0):
     """
     Function for estimating the link budget of a single point.
 
@@ -38,15 +54,16 @@ def estimate_link_budget(model, receiver, site, frequency, bandwidth, settlement
         The mean value will be used.
     modulation_and_coding_lut : list of tuples
         Lookup table containg sinr and spectral efficiency values.
+    link_id : int
+        Id of the link, selecting its random number streams (see
+        `path_loss_calculator`).
 
     Return
     ------
-    mean_capacity_mbps : float
-        The average capacity received as Mbps per km^2
+    capacity_mbps : float
+        The capacity received as Mbps per km^2
 
     """
-    capacity_results = []
-
     #turn path between cell site and user equipment into shapely line object
     line_geom = LineString([(receiver.x, receiver.y),(site.x, site.y)])
 
@@ -56,18 +73,16 @@ def estimate_link_budget(model, receiver, site, frequency, bandwidth, settlement
     ant_type = 'macro'
     building_height = 20
     street_width = 20
-    settlement_type = 'urban'
     type_of_sight = 'los'
     ue_height = 5
     above_roof = 0
     indoor = 0
-    seed_value = 42
-    iterations = 20
 
     # #frequency in MHz, distance in kilometers
     path_loss_dB = path_loss_calculator(model, frequency, distance,
         ant_height, ant_type, building_height, street_width, settlement_type,
-        type_of_sight, ue_height, above_roof, indoor, seed_value, iterations)
+        type_of_sight, ue_height, above_roof, indoor, seed_value, iterations,
+        link_id)
 
     #Equivalent Isotropically Radiated Power (EIRP) - Effective radiated power
     #eirp = site power + site gain - site losses
@@ -102,11 +117,472 @@ def estimate_link_budget(model, receiver, site, frequency, bandwidth, settlement
     #capacity_mbps = (bits per Hz * channel bandwidth) * 1e6
     link_budget_mbps = (spectral_efficiency * BW) / 1e6
 
-    capacity_results.append(link_budget_mbps)
+    return round(link_budget_mbps)
+
+
+def estimate_link_budgets(model, receivers, sites, frequency, bandwidth,
+    settlement_type, seed_value, iterations, modulation_and_coding_lut,
+    link_ids=None, path_loss_table=None, interferers=None,
+    site_parameters=None, interferer_parameters=None):
+    """
+    Function for estimating the link budget of many points in one pass.
+
+    This is the batch counterpart of `estimate_link_budget`. Every
+    receiver is paired with the serving site in the same row, and terms
+    which are constant across the batch (EIRP and noise) are only
+    computed once.
+
+    Without interferers, a constant -60 dBm interference is used, as in
+    `estimate_link_budget`. With interferers, the received power of
+    every interfering (co-channel) site is summed in mW, and the sinr is
+    the received power over that sum plus the noise.
+
+    Parameters
+    ----------
+    model : string
+        Propagation model (see `path_loss_calculator`).
+    receivers : array
+        (n, 2) array of receiver x and y coordinates.
+    sites : array
+        (n, 2) array of serving site x and y coordinates.
+    frequency : int
+        Carrier band (f) required in MHz.
+    bandwidth : int
+        Width of the carrier frequency in MHz.
+    settlement_type : string
+        General environment (urban/suburban/rural).
+    seed_value : int, None or RandomStreams
+        Set the seed for the pseudo random number generator
+        allowing reproducible stochastic restsults.
+    iterations : int
+        Specify the number of random numbers to be generated.
+        The mean value will be used.
+    modulation_and_coding_lut : list of tuples or SpectralEfficiencyLUT
+        Lookup table containg sinr and spectral efficiency values.
+    link_ids : array
+        Non-negative integer id of each link, selecting its random
+        number stream. Defaults to the position of each link.
+    path_loss_table : PathLossTable
+        Optional precomputed table (see `build_path_loss_table`). If
+        given, each link takes the interpolated median path loss,
+        without shadow fading, in place of the exact model.
+    interferers : array
+        Optional (n, m, 2) array of the x and y coordinates of up to m
+        interfering sites for each receiver, with NaN where a receiver
+        has fewer interferers.
+    site_parameters : dict of arrays
+        Optional (n,) arrays of the frequency (MHz), ant_height (m) and
+        eirp (dBm) of each serving site, in place of the given frequency
+        and the default 30 m, 55 dBm macro site.
+    interferer_parameters : dict of arrays
+        Optional (n, m) arrays of the ant_height and eirp of each
+        interfering site. Interferers share the serving frequency.
+
+    Return
+    ------
+    link_budgets : dict of arrays
+        Contains the path loss (dB), received power (dBm), interference
+        (dBm), sinr, spectral efficiency (bps/Hz) and capacity (Mbps) of
+        each link.
+
+    """
+    receivers = np.asarray(receivers, dtype=float).reshape(-1, 2)
+    sites = np.asarray(sites, dtype=float).reshape(-1, 2)
+
+    distance = np.sqrt(
+        (receivers[:, 0] - sites[:, 0])**2 +
+        (receivers[:, 1] - sites[:, 1])**2
+    )
+
+    return _link_budgets(model, distance, frequency, bandwidth,
+        settlement_type, seed_value, iterations, modulation_and_coding_lut,
+        link_ids, path_loss_table,
+        interferer_distances(receivers, interferers), site_parameters,
+        interferer_parameters)
+
+
+def interferer_distances(receivers, interferers):
+    """
+    Distance from each receiver to each of its interfering sites.
+
+    Parameters
+    ----------
+    receivers : array
+        (n, 2) array of receiver x and y coordinates.
+    interferers : array
+        (n, m, 2) array of interfering site coordinates, NaN for none.
+
+    Returns
+    -------
+    distances : array
+        (n, m) array of distances, infinite where there is no
+        interferer, or None if interferers is None.
+
+    """
+    if interferers is None:
+        return None
+
+    receivers = np.asarray(receivers, dtype=float).reshape(-1, 2)
+    interferers = np.asarray(interferers, dtype=float).reshape(
+        len(receivers), -1, 2)
+
+    distances = np.sqrt(np.sum(
+        (interferers - receivers[:, np.newaxis, :])**2, axis=2))
+
+    return np.where(np.isnan(distances), np.inf, distances)
+
+
+def build_path_loss_table(model, frequency, settlement_type, max_distance,
+    bin_width):
+    """
+    Build the median path loss table used by the batch link budgets
+    for one scenario.
+
+    Parameters
+    ----------
+    model : string
+        Propagation model (see `path_loss_calculator`).
+    frequency : int
+        Carrier band (f) required in MHz.
+    settlement_type : string
+        General environment (urban/suburban/rural).
+    max_distance : float
+        Largest link distance to tabulate (m).
+    bin_width : float
+        Distance between table entries (m).
+
+    Return
+    ------
+    path_loss_table : PathLossTable
+        Distance to median path loss table, with its max_error.
+
+    """
+    return PathLossTable(model, frequency, max_distance, bin_width,
+        settlement_type=settlement_type, **LINK_PARAMETERS)
+
+
+def estimate_link_budgets_monte_carlo(model, receivers, sites, frequency,
+    bandwidth, settlement_type, seed_value, realisations,
+    modulation_and_coding_lut, link_ids=None, chunk_size=10000,
+    interferers=None, site_parameters=None, interferer_parameters=None):
+    """
+    Monte Carlo estimate of the link budget of many points.
+
+    Each link is evaluated for a number of independent shadow fading
+    realisations, drawn as one (links x realisations) array, and the
+    capacity distribution of every link is summarised. Links are
+    processed in chunks so memory is bounded by chunk_size x
+    realisations, whatever the number of links.
+
+    Parameters
+    ----------
+    model : string
+        Propagation model (see `path_loss_calculator`).
+    receivers : array
+        (n, 2) array of receiver x and y coordinates.
+    sites : array
+        (n, 2) array of serving site x and y coordinates.
+    frequency : int
+        Carrier band (f) required in MHz.
+    bandwidth : int
+        Width of the carrier frequency in MHz.
+    settlement_type : string
+        General environment (urban/suburban/rural).
+    seed_value : int, None or RandomStreams
+        Set the seed for the pseudo random number generator
+        allowing reproducible stochastic restsults.
+    realisations : int
+        Number of shadow fading realisations for each link.
+    modulation_and_coding_lut : list of tuples or SpectralEfficiencyLUT
+        Lookup table containg sinr and spectral efficiency values.
+    link_ids : array
+        Non-negative integer id of each link, selecting its random
+        number stream. Defaults to the position of each link.
+    chunk_size : int
+        Maximum number of links evaluated at a time.
+    interferers : array
+        Optional (n, m, 2) array of interfering site coordinates, NaN
+        for none (see `estimate_link_budgets`).
+    site_parameters : dict of arrays
+        Optional (n,) arrays of the frequency (MHz), ant_height (m) and
+        eirp (dBm) of each serving site, in place of the given frequency
+        and the default 30 m, 55 dBm macro site.
+    interferer_parameters : dict of arrays
+        Optional (n, m) arrays of the ant_height and eirp of each
+        interfering site. Interferers share the serving frequency.
+
+    Return
+    ------
+    capacity_statistics : dict of arrays
+        Contains the mean, 5th, 50th and 95th percentile capacity
+        (Mbps) of each link.
+
+    """
+    receivers = np.asarray(receivers, dtype=float).reshape(-1, 2)
+    sites = np.asarray(sites, dtype=float).reshape(-1, 2)
+    lut = compile_lut(modulation_and_coding_lut)
+    streams = as_random_streams(seed_value)
+
+    if link_ids is None:
+        link_ids = np.arange(len(receivers))
+    link_ids = np.asarray(link_ids, dtype=np.int64)
+
+    distance = np.sqrt(
+        (receivers[:, 0] - sites[:, 0])**2 +
+        (receivers[:, 1] - sites[:, 1])**2
+    )
+    interference_distance = interferer_distances(receivers, interferers)
+
+    statistics = {
+        'capacity_mean': np.empty(len(distance)),
+        'capacity_p5': np.empty(len(distance)),
+        'capacity_p50': np.empty(len(distance)),
+        'capacity_p95': np.empty(len(distance)),
+    }
+
+    for start in range(0, len(distance), chunk_size):
+        chunk = slice(start, start + chunk_size)
+
+        #each realisation of a link has its own stream
+        realisation_ids = sub_link_ids(link_ids[chunk], realisations)
+
+        chunk_interference = None
+        if interference_distance is not None:
+            chunk_interference = np.broadcast_to(
+                interference_distance[chunk, np.newaxis, :],
+                realisation_ids.shape + interference_distance.shape[1:])
+
+        #site parameters are shared by every realisation of a link
+        chunk_sites = {key: np.asarray(value)[chunk, np.newaxis]
+            for key, value in (site_parameters or {}).items()}
+        chunk_interferers = {key: np.asarray(value)[chunk, np.newaxis, :]
+            for key, value in (interferer_parameters or {}).items()}
+
+        link_budgets = _link_budgets(model,
+            np.broadcast_to(distance[chunk, np.newaxis], realisation_ids.shape),
+            frequency, bandwidth, settlement_type, streams, 1, lut,
+            realisation_ids, interference_distance=chunk_interference,
+            site_parameters=chunk_sites,
+            interferer_parameters=chunk_interferers)
+
+        capacity = link_budgets['capacity_mbps']
+
+        statistics['capacity_mean'][chunk] = np.mean(capacity, axis=1)
+        (statistics['capacity_p5'][chunk],
+            statistics['capacity_p50'][chunk],
+            statistics['capacity_p95'][chunk]) = np.percentile(
+                capacity, [5, 50, 95], axis=1)
+
+    return statistics
+
+
+def _link_budgets(model, distance, frequency, bandwidth, settlement_type,
+    seed_value, iterations, modulation_and_coding_lut, link_ids,
+    path_loss_table=None, interference_distance=None, site_parameters=None,
+    interferer_parameters=None):
+    """
+    Estimate link budgets for an array of distances of any shape.
+
+    If given, interference_distance has one more (last) axis than
+    distance, holding the distance to each interfering site (infinite
+    for none). The frequency, ant_height and eirp of site_parameters
+    broadcast against distance, and the ant_height and eirp of
+    interferer_parameters against interference_distance. Interferers
+    share the frequency of the serving site.
+
+    """
+    site_parameters = site_parameters or {}
+    interferer_parameters = interferer_parameters or {}
+
+    if path_loss_table is not None and (site_parameters or interferer_parameters):
+        raise ValueError('A path loss table cannot be used with site parameters')
 
-    mean_capacity_mbps = round(sum(capacity_results) / len(capacity_results))
+    def link_path_loss(distance, frequency, ant_height, streams, link_ids):
+        if path_loss_table is None:
+            parameters = dict(LINK_PARAMETERS, ant_height=ant_height)
+            return path_loss_calculator_array(model, frequency, distance,
+                settlement_type=settlement_type, seed_value=streams,
+                iterations=iterations, link_ids=link_ids, **parameters)
+        return path_loss_table.lookup(distance)
 
-    return mean_capacity_mbps
+    streams = as_random_streams(seed_value)
+
+    frequency = site_parameters.get('frequency', frequency)
+
+    path_loss_dB = link_path_loss(distance, frequency,
+        site_parameters.get('ant_height', LINK_PARAMETERS['ant_height']),
+        streams, link_ids)
+
+    #eirp = site power + site gain - site losses
+    eirp = site_parameters.get('eirp', 40 + 16 - 1)
+
+    #received power = eirp - path_loss - ue_misc_losses + ue_gain - ue_losses
+    received_power = eirp - path_loss_dB - 4 + 4 - 4
+
+    if interference_distance is None:
+        inteference = np.full(np.shape(received_power), -60.0)
+        capacity = link_capacity(received_power, bandwidth,
+            modulation_and_coding_lut)
+    else:
+        inteference = _interference(link_path_loss, interference_distance,
+            frequency, interferer_parameters, streams, link_ids)
+        capacity = link_capacity(received_power, bandwidth,
+            modulation_and_coding_lut, inteference)
+
+    return dict({
+        'path_loss': path_loss_dB,
+        'received_power': received_power,
+        'interference': inteference,
+    }, **capacity)
+
+
+def link_capacity(received_power, bandwidth, modulation_and_coding_lut,
+    interference=None):
+    """
+    Estimate the sinr, spectral efficiency and capacity of links from
+    their received power.
+
+    Received power does not depend on the channel bandwidth, so the
+    capacity of many bandwidths can be found from one propagation run,
+    by giving bandwidth an axis which broadcasts against received_power
+    (e.g. a (b, 1) array for (n,) links gives (b, n) results).
+
+    Parameters
+    ----------
+    received_power : float or array
+        Received power (dBm) of each link.
+    bandwidth : float or array
+        Channel bandwidth (MHz).
+    modulation_and_coding_lut : list of tuples or SpectralEfficiencyLUT
+        Lookup table containg sinr and spectral efficiency values.
+    interference : float or array
+        Summed interference (dBm) of each link. None uses the constant
+        -60 dBm of the original model.
+
+    Returns
+    -------
+    capacity : dict of arrays
+        Contains the sinr, spectral efficiency (bps/Hz) and capacity
+        (Mbps) of each link.
+
+    """
+    k = 1.38e-23
+    t = 290
+    BW = np.asarray(bandwidth)*1000000
+    noise = 10*np.log10(k*t*1000)+1.5+10*np.log10(BW)
+
+    if interference is None:
+        #the interference plus noise denominator is shared by every link
+        sinr = received_power - np.log10((10**-60) + (10**noise))
+    else:
+        #sum interference and noise in mW, then take the ratio in dB
+        sinr = received_power - 10*np.log10(
+            10**(interference / 10) + 10**(noise / 10))
+
+    spectral_efficiency = compile_lut(modulation_and_coding_lut).lookup(
+                            sinr, '4G')
+
+    capacity_mbps = (spectral_efficiency * BW) / 1e6
+
+    return {
+        'sinr': sinr,
+        'spectral_efficiency': spectral_efficiency,
+        'capacity_mbps': capacity_mbps,
+    }
+
+
+def _interference(link_path_loss, interference_distance, frequency,
+    interferer_parameters, streams, link_ids):
+    """
+    Total received power (dBm) from the interfering sites of each link.
+
+    Interfering links take the sub link ids of each link (see
+    `sub_link_ids`) from their own stream family, so their shadow fading
+    is independent of the serving links.
+
+    """
+    interference_distance = np.asarray(interference_distance, dtype=float)
+    shape = interference_distance.shape
+    number_of_interferers = shape[-1]
+
+    link_ids = _link_ids(link_ids, shape[:-1]).astype(np.int64)
+    interferer_ids = sub_link_ids(link_ids, number_of_interferers)
+
+    frequency = np.broadcast_to(np.asarray(frequency, dtype=float)[..., np.newaxis],
+        shape)
+    ant_height = np.broadcast_to(interferer_parameters.get('ant_height',
+        LINK_PARAMETERS['ant_height']), shape)
+    eirp = np.broadcast_to(interferer_parameters.get('eirp', 40 + 16 - 1), shape)
+
+    present = np.isfinite(interference_distance)
+
+    received_mw = np.zeros(shape)
+    if np.any(present):
+        path_loss_dB = link_path_loss(interference_distance[present],
+            frequency[present], ant_height[present],
+            streams.spawn(INTERFERER_LINKS), interferer_ids[present])
+        received_mw[present] = 10**((eirp[present] - path_loss_dB - 4 + 4 - 4) / 10)
+
+    with np.errstate(divide='ignore'):
+        return 10*np.log10(np.sum(received_mw, axis=-1))
+
+
+def best_server(model, receivers, candidates, candidate_parameters,
+    settlement_type):
+    """
+    Pick the candidate site giving the strongest received power.
+
+    The received power of every (receiver, candidate) pair is found in
+    one vectorized pass, using the median path loss (without shadow
+    fading) at each candidate's own frequency, antenna height and EIRP.
+
+    Parameters
+    ----------
+    model : string
+        Propagation model (see `path_loss_calculator`).
+    receivers : array
+        (n, 2) array of receiver x and y coordinates.
+    candidates : array
+        (n, k, 2) array of candidate site coordinates, NaN for none
+        (for example from `SiteIndex.k_nearest`).
+    candidate_parameters : dict of arrays
+        (n, k) arrays of the frequency (MHz), ant_height (m) and eirp
+        (dBm) of each candidate.
+    settlement_type : string
+        General environment (urban/suburban/rural).
+
+    Returns
+    -------
+    best : array
+        (n,) array giving the column of the strongest candidate.
+    received_power : array
+        (n, k) array of the received power (dBm) of each candidate,
+        -inf where there is no candidate.
+
+    """
+    receivers = np.asarray(receivers, dtype=float).reshape(-1, 2)
+    candidates = np.asarray(candidates, dtype=float).reshape(
+        len(receivers), -1, 2)
+
+    distance = np.sqrt(np.sum(
+        (candidates - receivers[:, np.newaxis, :])**2, axis=2))
+    shape = distance.shape
+
+    frequency = np.broadcast_to(candidate_parameters['frequency'], shape)
+    ant_height = np.broadcast_to(candidate_parameters['ant_height'], shape)
+    eirp = np.broadcast_to(candidate_parameters['eirp'], shape)
+
+    present = np.isfinite(distance) & np.isfinite(frequency)
+
+    received_power = np.full(shape, -np.inf)
+    if np.any(present):
+        parameters = dict(LINK_PARAMETERS, ant_height=ant_height[present])
+        path_loss_dB = path_loss_calculator_array(model, frequency[present],
+            distance[present], settlement_type=settlement_type,
+            seed_value=MedianStreams(), iterations=1, **parameters)
+        received_power[present] = eirp[present] - path_loss_dB - 4 + 4 - 4
+
+    return np.argmax(received_power, axis=1), received_power
 
 
 def modulation_scheme_and_coding_rate(sinr, generation,
@@ -121,46 +597,108 @@ def modulation_scheme_and_coding_rate(sinr, generation,
         Signal to Interference plus Noise Ratio.
     generation : string
         Generation of cellular technology (e.g. '4G').
-    modulation_and_coding_lut : list of tuples
+    modulation_and_coding_lut : list of tuples or SpectralEfficiencyLUT
         Lookup table containg sinr and spectral efficiency values.
 
+    Returns
+    -------
+    spectral_efficiency : float
+        Spectral efficiency (bps/Hz) of the highest CQI whose sinr
+        threshold is met, or 0 below the lowest CQI.
+
+    """
+    return compile_lut(modulation_and_coding_lut).lookup(sinr, generation)
+
+
+class SpectralEfficiencyLUT(object):
     """
-    for lower, upper in pairwise(modulation_and_coding_lut):
-        if lower[0] and upper[0] == generation:
+    Compiled SINR to spectral efficiency lookup table.
 
-            lower_sinr = lower[5]
-            upper_sinr = upper[5]
+    The modulation and coding lookup table is split by generation and
+    sorted by sinr threshold once, so each lookup is a binary search
+    over a scalar or a whole array of sinr values.
 
-            if sinr >= lower_sinr and sinr < upper_sinr:
-                return lower[4]
+    A sinr below the lowest CQI threshold gives a spectral efficiency
+    of 0, and a sinr at or above the highest CQI threshold gives the
+    spectral efficiency of the highest CQI. NaN sinr values give NaN.
+
+    Parameters
+    ----------
+    modulation_and_coding_lut : list of tuples
+        Lookup table containg generation, CQI, modulation, coding
+        rate, spectral efficiency and sinr values.
+
+    """
+    def __init__(self, modulation_and_coding_lut):
+
+        self.tables = {}
+
+        for generation in set(row[0] for row in modulation_and_coding_lut):
+
+            rows = sorted(
+                (row for row in modulation_and_coding_lut
+                    if row[0] == generation),
+                key=lambda row: row[5]
+            )
+
+            thresholds = np.array([row[5] for row in rows], dtype=float)
+            efficiencies = np.array([0] + [row[4] for row in rows],
+                dtype=float)
+
+            self.tables[generation] = (thresholds, efficiencies)
 
-            if sinr >= modulation_and_coding_lut[-1][5]:
-                return modulation_and_coding_lut[-1][4]
 
-            if sinr < lower_sinr:
-                return 0
+    def lookup(self, sinr, generation):
+        """
+        Return the spectral efficiency for each sinr value.
 
+        Parameters
+        ----------
+        sinr : float or array
+            Signal to Interference plus Noise Ratio.
+        generation : string
+            Generation of cellular technology (e.g. '4G').
 
-def pairwise(iterable):
+        Returns
+        -------
+        spectral_efficiency : float or array
+            Spectral efficiency (bps/Hz), matching the shape of sinr.
+
+        """
+        if generation not in self.tables:
+            raise ValueError(
+                'Did not recognise generation {}'.format(generation))
+
+        thresholds, efficiencies = self.tables[generation]
+
+        sinr = np.asarray(sinr, dtype=float)
+
+        spectral_efficiency = np.where(np.isnan(sinr), np.nan,
+            efficiencies[np.searchsorted(thresholds, sinr, side='right')])
+
+        if spectral_efficiency.ndim == 0:
+            return float(spectral_efficiency)
+
+        return spectral_efficiency
+
+
+def compile_lut(modulation_and_coding_lut):
     """
-    Return iterable of 2-tuples in a sliding window.
+    Return a SpectralEfficiencyLUT, compiling the lookup table if it
+    has been given as a list of tuples.
 
     Parameters
     ----------
-    iterable : list
-        Sliding window
+    modulation_and_coding_lut : list of tuples or SpectralEfficiencyLUT
+        Lookup table containg sinr and spectral efficiency values.
 
     Returns
     -------
-    list of tuple
-        Iterable of 2-tuples
-    Example
-    -------
-    list(pairwise([1,2,3,4]))
-        [(1,2),(2,3),(3,4)]
+    lut : SpectralEfficiencyLUT
+        Compiled lookup table.
 
     """
-    a, b = tee(iterable)
-    next(b, None)
+    if isinstance(modulation_and_coding_lut, SpectralEfficiencyLUT):
+        return modulation_and_coding_lut
 
-    return zip(a, b)
+    return SpectralEfficiencyLUT(modulation_and_coding_lut)
@@ -0,0 +1,301 @@
+"""
+Parallel evaluation of road segments
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from np4d.np4d import (estimate_link_budgets,
+    estimate_link_budgets_monte_carlo, compile_lut, LINK_PARAMETERS)
+from np4d.rng import as_random_streams
+
+
+def partition(length, chunk_size):
+    """
+    Split a run of segments into contiguous chunks.
+
+    Parameters
+    ----------
+    length : int
+        Number of segments.
+    chunk_size : int
+        Maximum number of segments in each chunk.
+
+    Returns
+    -------
+    chunks : list of slices
+        Slices covering every segment, in order.
+
+    """
+    chunk_size = max(1, int(chunk_size))
+
+    return [
+        slice(start, min(start + chunk_size, length))
+        for start in range(0, length, chunk_size)
+    ]
+
+
+def estimate_link_budgets_parallel(model, receivers, sites, frequency,
+    bandwidth, settlement_type, seed_value, iterations,
+    modulation_and_coding_lut, workers=1, chunk_size=10000, realisations=1,
+    path_loss_table=None, link_ids=None, interferers=None,
+    site_parameters=None, interferer_parameters=None):
+    """
+    Estimate the link budget of many points across worker processes.
+
+    The receivers and sites are split into contiguous chunks, and each
+    chunk is passed to `estimate_link_budgets` (or to
+    `estimate_link_budgets_monte_carlo` when more than one realisation
+    is requested) in a worker process as plain coordinate arrays. Results are joined back together in the
+    original order. Each link keeps its position (or given id) as its
+    random stream id, so seeded runs give the same results whatever the
+    number of workers.
+
+    Parameters
+    ----------
+    model : string
+        Propagation model (see `path_loss_calculator`).
+    receivers : array
+        (n, 2) array of receiver x and y coordinates.
+    sites : array
+        (n, 2) array of serving site x and y coordinates.
+    frequency : int
+        Carrier band (f) required in MHz.
+    bandwidth : int
+        Width of the carrier frequency in MHz.
+    settlement_type : string
+        General environment (urban/suburban/rural).
+    seed_value : int, None or RandomStreams
+        Set the seed for the pseudo random number generator
+        allowing reproducible stochastic restsults.
+    iterations : int
+        Specify the number of random numbers to be generated.
+        The mean value will be used.
+    modulation_and_coding_lut : list of tuples or SpectralEfficiencyLUT
+        Lookup table containg sinr and spectral efficiency values.
+    workers : int
+        Number of worker processes. One or fewer runs serially in the
+        current process.
+    chunk_size : int
+        Maximum number of links sent to a worker at a time.
+    realisations : int
+        Number of Monte Carlo shadow fading realisations for each link.
+        One gives a single estimate using the given iterations.
+    path_loss_table : PathLossTable
+        Optional median path loss table, used for single estimates
+        (see `estimate_link_budgets`).
+    link_ids : array
+        Optional (n,) array of link ids selecting the random stream of
+        each link. Defaults to the position of each link, so a subset of
+        links recomputed with their original positions gives the same
+        results as the full run.
+    interferers : array
+        Optional (n, m, 2) array of interfering site coordinates, NaN
+        for none (see `estimate_link_budgets`).
+    site_parameters : dict of arrays
+        Optional (n,) arrays of the frequency, ant_height and eirp of
+        each serving site (see `estimate_link_budgets`).
+    interferer_parameters : dict of arrays
+        Optional (n, m) arrays of the ant_height and eirp of each
+        interfering site.
+
+    Returns
+    -------
+    link_budgets : dict of arrays
+        As returned by `estimate_link_budgets`, or the capacity
+        statistics returned by `estimate_link_budgets_monte_carlo`.
+
+    """
+    receivers = np.ascontiguousarray(receivers, dtype=float).reshape(-1, 2)
+    sites = np.ascontiguousarray(sites, dtype=float).reshape(-1, 2)
+    lut = compile_lut(modulation_and_coding_lut)
+    streams = as_random_streams(seed_value)
+    if link_ids is None:
+        link_ids = np.arange(len(receivers))
+    link_ids = np.asarray(link_ids, dtype=np.int64)
+    if interferers is not None:
+        interferers = np.ascontiguousarray(interferers, dtype=float).reshape(
+            len(receivers), -1, 2)
+
+    if realisations > 1:
+        function = partial(estimate_link_budgets_monte_carlo,
+            chunk_size=chunk_size)
+        arguments = (frequency, bandwidth, settlement_type, streams,
+            realisations, lut)
+    else:
+        function = partial(estimate_link_budgets,
+            path_loss_table=path_loss_table)
+        arguments = (frequency, bandwidth, settlement_type, streams,
+            iterations, lut)
+
+    if workers is None or workers <= 1 or len(receivers) <= chunk_size:
+        return function(model, receivers, sites, *arguments, link_ids,
+            interferers=interferers, site_parameters=site_parameters,
+            interferer_parameters=interferer_parameters)
+
+    chunks = partition(len(receivers), chunk_size)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(function, model, receivers[chunk], sites[chunk],
+                *arguments, link_ids[chunk], interferers=(
+                    None if interferers is None else interferers[chunk]),
+                site_parameters=rows(site_parameters, chunk),
+                interferer_parameters=rows(interferer_parameters, chunk))
+            for chunk in chunks
+        ]
+        results = [future.result() for future in futures]
+
+    return {
+        key: np.concatenate([result[key] for result in results])
+        for key in results[0]
+    }
+
+
+def estimate_carrier_link_budgets_parallel(model, receivers, sites, bands,
+    bandwidths, settlement_type, seed_value, iterations,
+    modulation_and_coding_lut, workers=1, chunk_size=10000, link_ids=None,
+    interferers=None, site_parameters=None, interferer_parameters=None):
+    """
+    Estimate the link budget of every carrier of many serving sites, for
+    carrier aggregation.
+
+    Each site may carry any of the given bands. Links are batched by
+    band, so path loss is evaluated in one `estimate_link_budgets_parallel`
+    run per unique frequency, over every link whose serving site carries
+    that band. Only interferers carrying the same band are counted. The
+    carriers of a link share its random stream, so shadow fading is
+    correlated across the bands of a site.
+
+    Parameters
+    ----------
+    model : string
+        Propagation model (see `path_loss_calculator`).
+    receivers : array
+        (n, 2) array of receiver x and y coordinates.
+    sites : array
+        (n, 2) array of serving site x and y coordinates.
+    bands : array
+        (b,) array of carrier frequencies in MHz.
+    bandwidths : array
+        (b,) array of the width of each carrier in MHz.
+    settlement_type : string
+        General environment (urban/suburban/rural).
+    seed_value : int, None or RandomStreams
+        Set the seed for the pseudo random number generator
+        allowing reproducible stochastic restsults.
+    iterations : int
+        Specify the number of random numbers to be generated.
+        The mean value will be used.
+    modulation_and_coding_lut : list of tuples or SpectralEfficiencyLUT
+        Lookup table containg sinr and spectral efficiency values.
+    workers : int
+        Number of worker processes.
+    chunk_size : int
+        Maximum number of links sent to a worker at a time.
+    link_ids : array
+        Optional (n,) array of link ids selecting the random stream of
+        each link. Defaults to the position of each link.
+    interferers : array
+        Optional (n, m, 2) array of interfering site coordinates, NaN
+        for none.
+    site_parameters : dict of arrays
+        Optional (n, b) arrays of the ant_height and eirp of each
+        carrier of the serving site, with a NaN eirp where the site
+        does not carry a band. By default every site carries every band
+        as a 30 m, 55 dBm macro site.
+    interferer_parameters : dict of arrays
+        Optional (n, m, b) arrays of the ant_height and eirp of each
+        carrier of each interfering site, NaN where it is not carried.
+
+    Returns
+    -------
+    link_budgets : dict of arrays
+        The link budgets returned by `estimate_link_budgets`, as (n, b)
+        arrays with NaN where a band is not carried (and a spectral
+        efficiency and capacity of 0), so the aggregated capacity of
+        each link is the sum over the last axis.
+
+    """
+    receivers = np.ascontiguousarray(receivers, dtype=float).reshape(-1, 2)
+    sites = np.ascontiguousarray(sites, dtype=float).reshape(-1, 2)
+    bands = np.asarray(bands, dtype=float).reshape(-1)
+    bandwidths = np.broadcast_to(np.asarray(bandwidths, dtype=float),
+        bands.shape)
+    lut = compile_lut(modulation_and_coding_lut)
+    if link_ids is None:
+        link_ids = np.arange(len(receivers))
+    link_ids = np.asarray(link_ids, dtype=np.int64)
+
+    shape = (len(receivers), len(bands))
+    site_parameters = site_parameters or {}
+    ant_height = np.broadcast_to(site_parameters.get('ant_height',
+        LINK_PARAMETERS['ant_height']), shape)
+    eirp = np.broadcast_to(site_parameters.get('eirp', 40 + 16 - 1), shape)
+
+    if interferers is not None:
+        interferers = np.asarray(interferers, dtype=float).reshape(
+            len(receivers), -1, 2)
+        interferer_shape = interferers.shape[:2] + (len(bands),)
+        interferer_parameters = interferer_parameters or {}
+        interferer_ant_height = np.broadcast_to(interferer_parameters.get(
+            'ant_height', LINK_PARAMETERS['ant_height']), interferer_shape)
+        interferer_eirp = np.broadcast_to(interferer_parameters.get('eirp',
+            40 + 16 - 1), interferer_shape)
+
+    link_budgets = {
+        key: np.full(shape, np.nan) for key in ['path_loss',
+            'received_power', 'interference', 'sinr']
+    }
+    link_budgets['spectral_efficiency'] = np.zeros(shape)
+    link_budgets['capacity_mbps'] = np.zeros(shape)
+
+    for column, (band, bandwidth) in enumerate(zip(bands.tolist(),
+        bandwidths.tolist())):
+
+        carried = np.flatnonzero(np.isfinite(eirp[:, column]))
+        if len(carried) == 0:
+            continue
+
+        band_interferers = None
+        band_interferer_parameters = None
+        if interferers is not None:
+            other = np.isfinite(interferer_eirp[carried, :, column])
+            band_interferers = np.where(other[..., np.newaxis],
+                interferers[carried], np.nan)
+            band_interferer_parameters = {
+                'ant_height': interferer_ant_height[carried, :, column],
+                'eirp': interferer_eirp[carried, :, column],
+            }
+
+        result = estimate_link_budgets_parallel(model, receivers[carried],
+            sites[carried], band, bandwidth, settlement_type, seed_value,
+            iterations, lut, workers=workers, chunk_size=chunk_size,
+            link_ids=link_ids[carried], interferers=band_interferers,
+            site_parameters={
+                'frequency': np.full(len(carried), band),
+                'ant_height': ant_height[carried, column],
+                'eirp': eirp[carried, column],
+            }, interferer_parameters=band_interferer_parameters)
+
+        for key, value in result.items():
+            link_budgets[key][carried, column] = value
+
+    return link_budgets
+
+
+def rows(arrays, selection):
+    """
+    Select rows of every array in a dict, passing None through.
+
+    """
+    if arrays is None:
+        return None
+
+    return {key: np.asarray(value)[selection] for key, value in arrays.items()}
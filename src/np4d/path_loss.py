@@ -7,9 +7,18 @@ Date: November 2019
 import numpy as np
 from math import pi, sqrt
 
+from np4d.rng import as_random_streams, MedianStreams
+
+#random number streams for each stochastic term of the array models
+SHADOW_FADING_STREAM = 1
+BREAKPOINT_STREAM = 2
+NLOS_STREAM = 3
+UMA_NLOS_OPTIONAL_STREAM = 4
+INDOOR_STREAM = 5
+
 def path_loss_calculator(model, frequency, distance, ant_height, ant_type,
     building_height, street_width, settlement_type, type_of_sight,
-    ue_height, above_roof, indoor, seed_value, iterations):
+    ue_height, above_roof, indoor, seed_value, iterations, link_id=0):
     """
     Calculate the correct path loss given a range of critera.
 
@@ -50,6 +59,10 @@ def path_loss_calculator(model, frequency, distance, ant_height, ant_type,
     iterations : int
         Specifies how many iterations a calculation should
         be run for.
+    link_id : int
+        Non-negative integer id of the link, selecting its random
+        number streams, so each link gets its own draws (the same as
+        the array implementation gives that link).
 
     Returns
     -------
@@ -66,11 +79,11 @@ def path_loss_calculator(model, frequency, distance, ant_height, ant_type,
                 ant_height, ant_type, building_height,
                 street_width, settlement_type, type_of_sight,
                 ue_height, above_roof, indoor, seed_value,
-                iterations
+                iterations, link_id
             )
 
             path_loss = path_loss + outdoor_to_indoor_path_loss(
-                    frequency, indoor, seed_value
+                    frequency, indoor, seed_value, link_id
                 )
 
         else:
@@ -85,14 +98,14 @@ def path_loss_calculator(model, frequency, distance, ant_height, ant_type,
 
         path_loss = extended_hata(frequency, distance/1e3, ant_height,
             ue_height, above_roof, settlement_type, seed_value,
-            iterations)
+            iterations, link_id)
 
     return round(path_loss)
 
 
 def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
     building_height, street_width, settlement_type, type_of_sight,
-    ue_height, above_roof, indoor, seed_value, iterations):
+    ue_height, above_roof, indoor, seed_value, iterations, link_id=0):
     """
     This is the ETSI 138.901 for the 3GPP TR 38.901 (see the 5G
     study on channel models for frequencies from 0.5 to 100 GHz
@@ -132,6 +145,8 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
     iterations : int
         Specifies how many iterations a calculation
         should be run for.
+    link_id : int
+        Id of the link, selecting its random number streams.
 
     Returns
     -------
@@ -182,7 +197,8 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
             np.log10(d3d) - min(0.044*h**1.72,14.77) +
             0.002*np.log10(h)*d3d +
             generate_log_normal_dist_value(
-                fc, 1, 4, iterations, seed_value
+                fc, 1, 4, iterations, seed_value, link_id,
+                SHADOW_FADING_STREAM
             )
         )
 
@@ -197,11 +213,13 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
             np.log10(dbp) - min(0.044*h**1.72,14.77) +
             0.002*np.log10(h)*dbp +
             generate_log_normal_dist_value(
-                fc, 1, 4, iterations, seed_value
+                fc, 1, 4, iterations, seed_value, link_id,
+                SHADOW_FADING_STREAM
             ) +
             40*np.log10(d3d / dbp) +
             generate_log_normal_dist_value(
-                fc, 1, 6, iterations, seed_value
+                fc, 1, 6, iterations, seed_value, link_id,
+                BREAKPOINT_STREAM
             )
         )
 
@@ -219,7 +237,8 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
                 20*np.log10(fc) -
                 (3.2 * (np.log10(11.75*hut))**2 - 4.97) +
                 generate_log_normal_dist_value(
-                    fc, 1, 8, iterations, seed_value
+                    fc, 1, 8, iterations, seed_value, link_id,
+                    NLOS_STREAM
                 )
             )
 
@@ -229,14 +248,15 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
 
         if d2d > 10000:
             return uma_nlos_optional(frequency, distance,
-                ant_height, ue_height, seed_value, iterations)
+                ant_height, ue_height, seed_value, iterations, link_id)
 
     elif settlement_type == 'urban':
 
         pl1 = round(
             28 + 22 * np.log10(d3d) + 20 * np.log10(fc) +
             generate_log_normal_dist_value(
-                fc, 1, 4, iterations, seed_value
+                fc, 1, 4, iterations, seed_value, link_id,
+                SHADOW_FADING_STREAM
             )
         )
 
@@ -249,7 +269,8 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
             28 + 40*np.log10(d3d) + 20 * np.log10(fc) -
             9*np.log10((d_apost_bp)**2 + (hbs-hut)**2) +
             generate_log_normal_dist_value(
-                fc, 1, 4, iterations, seed_value
+                fc, 1, 4, iterations, seed_value, link_id,
+                SHADOW_FADING_STREAM
             )
         )
 
@@ -267,7 +288,8 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
                     13.54 + 39.08 * np.log10(d3d) + 20 *
                     np.log10(fc) - 0.6 * (hut - 1.5) +
                     generate_log_normal_dist_value(
-                        fc, 1, 6, iterations, seed_value
+                        fc, 1, 6, iterations, seed_value, link_id,
+                        NLOS_STREAM
                     )
                 )
 
@@ -275,7 +297,7 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
 
                 pl_apostrophe_uma_nlos = uma_nlos_optional(
                     frequency, distance, ant_height,
-                    ue_height, seed_value, iterations
+                    ue_height, seed_value, iterations, link_id
                 )
 
             pl_uma_nlos = max(pl_apostrophe_uma_nlos, pl_uma_los)
@@ -292,7 +314,7 @@ def etsi_tr_138_901(frequency, distance, ant_height, ant_type,
 
 
 def uma_nlos_optional(frequency, distance, ant_height, ue_height,
-    seed_value, iterations):
+    seed_value, iterations, link_id=0):
     """
     UMa NLOS / Optional from ETSI TR 138.901 / 3GPP TR 38.901.
 
@@ -312,6 +334,8 @@ def uma_nlos_optional(frequency, distance, ant_height, ue_height,
         Dictates repeatable random number generation.
     iterations : int
         Specifies iterations for a specific calculation.
+    link_id : int
+        Id of the link, selecting its random number streams.
 
     Returns
     -------
@@ -326,7 +350,8 @@ def uma_nlos_optional(frequency, distance, ant_height, ue_height,
     path_loss = 32.4 + 20*np.log10(fc) + 30*np.log10(d3d)
 
     random_variation = generate_log_normal_dist_value(
-        frequency, 1, 7.8, iterations, seed_value
+        frequency, 1, 7.8, iterations, seed_value, link_id,
+        UMA_NLOS_OPTIONAL_STREAM
     )
 
     return round(path_loss + random_variation)
@@ -389,7 +414,8 @@ def check_3gpp_applicability(building_height, street_width,
 
 
 def extended_hata(frequency, distance, ant_height, ue_height,
-                above_roof, settlement_type, seed_value, iterations):
+                above_roof, settlement_type, seed_value, iterations,
+                link_id=0):
     """
     Implements the Extended Hata path loss model.
 
@@ -414,6 +440,8 @@ def extended_hata(frequency, distance, ant_height, ue_height,
     iterations : string
         Specify the number of random numbers to be generated.
         The mean value will be used.
+    link_id : int
+        Id of the link, selecting its random number streams.
 
     Returns
     -------
@@ -521,7 +549,8 @@ def extended_hata(frequency, distance, ant_height, ue_height,
     if distance <= 0.04:
 
         path_loss = path_loss + generate_log_normal_dist_value(
-                    frequency, 1, 3.5, iterations, seed_value)
+                    frequency, 1, 3.5, iterations, seed_value,
+                    link_id, SHADOW_FADING_STREAM)
 
     elif 0.04 < distance <= 0.1:
 
@@ -530,7 +559,8 @@ def extended_hata(frequency, distance, ant_height, ue_height,
             sigma = (3.5 + ((12-3.5)/0.1-0.04) * (distance - 0.04))
 
             random_quantity = generate_log_normal_dist_value(
-                            frequency, 1, sigma, iterations, seed_value)
+                            frequency, 1, sigma, iterations, seed_value,
+                            link_id, SHADOW_FADING_STREAM)
 
             path_loss = (path_loss + random_quantity)
 
@@ -539,7 +569,8 @@ def extended_hata(frequency, distance, ant_height, ue_height,
             sigma = (3.5 + ((17-3.5)/0.1-0.04) * (distance - 0.04))
 
             random_quantity = generate_log_normal_dist_value(
-                            frequency, 1, sigma, iterations, seed_value)
+                            frequency, 1, sigma, iterations, seed_value,
+                            link_id, SHADOW_FADING_STREAM)
 
             path_loss = (path_loss + random_quantity)
 
@@ -551,11 +582,13 @@ def extended_hata(frequency, distance, ant_height, ue_height,
 
         if above_roof == 1:
             random_quantity = generate_log_normal_dist_value(frequency,
-                                1, 12, iterations, seed_value)
+                                1, 12, iterations, seed_value,
+                                link_id, SHADOW_FADING_STREAM)
             path_loss = (path_loss + random_quantity)
         elif above_roof == 0:
             random_quantity = generate_log_normal_dist_value(frequency,
-                                1, 17, iterations, seed_value)
+                                1, 17, iterations, seed_value,
+                                link_id, SHADOW_FADING_STREAM)
             path_loss = (path_loss + random_quantity)
         else:
             raise ValueError(
@@ -566,13 +599,15 @@ def extended_hata(frequency, distance, ant_height, ue_height,
         if above_roof == 1:
             sigma = (12 + ((9-12)/0.6-0.2) * (distance - 0.02))
             random_quantity = generate_log_normal_dist_value(frequency,
-                                1, sigma, iterations, seed_value)
+                                1, sigma, iterations, seed_value,
+                                link_id, SHADOW_FADING_STREAM)
             path_loss = (path_loss + random_quantity)
 
         elif above_roof == 0:
             sigma = (17 + (9-17) / (0.6-0.2) * (distance - 0.02))
             random_quantity = generate_log_normal_dist_value(frequency,
-                                1, sigma, iterations, seed_value)
+                                1, sigma, iterations, seed_value,
+                                link_id, SHADOW_FADING_STREAM)
             path_loss = (path_loss + random_quantity)
         else:
             raise ValueError(
@@ -581,7 +616,8 @@ def extended_hata(frequency, distance, ant_height, ue_height,
     elif 0.6 < distance:
 
         random_quantity = generate_log_normal_dist_value(frequency,
-                                1, 12, iterations, seed_value)
+                                1, 12, iterations, seed_value,
+                                link_id, SHADOW_FADING_STREAM)
 
         path_loss = (path_loss + random_quantity)
 
@@ -589,7 +625,7 @@ def extended_hata(frequency, distance, ant_height, ue_height,
 
 
 def generate_log_normal_dist_value(frequency, mu, sigma, draws,
-    seed_value):
+    seed_value, link_id=0, stream=0):
     """
     Generates random values using a lognormal distribution,
     given a specific mean (mu) and standard deviation (sigma).
@@ -601,38 +637,34 @@ def generate_log_normal_dist_value(frequency, mu, sigma, draws,
     Parameters
     ----------
     frequency : int
-        The frequency of the carrier frequency.
+        The frequency of the carrier frequency. Not used by the draws,
+        which are told apart by link_id and stream.
     mu : int
         Mean of the desired distribution.
     sigma : int
         Standard deviation of the desired distribution.
     draws : int
         Number of required values.
-    seed_value : int
+    seed_value : int, None or RandomStreams
         Dictates repeatable random number generation.
+    link_id : int
+        Non-negative integer id of the link, selecting its random
+        number stream, so each link gets its own draws.
+    stream : int
+        Identifies the random term being drawn.
 
     Returns
     -------
     random_variation : float
-        Mean of the random variation over the specified itations.
+        Mean of the random variation over the specified itations, equal
+        to that of `generate_log_normal_dist_values` for the same link.
 
     """
-    if seed_value == None:
-        pass
-    else:
-        frequency_seed_value = seed_value * frequency * 100
-
-        np.random.seed(int(str(frequency_seed_value)[:2]))
+    return float(generate_log_normal_dist_values(mu, sigma, draws,
+        seed_value, link_id, stream))
 
-    normal_std = np.sqrt(np.log10(1 + (sigma/mu)**2))
-    normal_mean = np.log10(mu) - normal_std**2 / 2
-
-    hs = np.random.lognormal(normal_mean, normal_std, draws)
 
-    return round(np.mean(hs),2)
-
-
-def outdoor_to_indoor_path_loss(frequency, indoor, seed_value):
+def outdoor_to_indoor_path_loss(frequency, indoor, seed_value, link_id=0):
     """
     ITU-R M.1225 suggests building penetration loss for shadow fading
     can be modelled as a log-normal distribution with a mean and
@@ -646,6 +678,8 @@ def outdoor_to_indoor_path_loss(frequency, indoor, seed_value):
         Indicates if the user is indoor (True) or outdoor (False).
     seed_value : int
         Dictates repeatable random number generation.
+    link_id : int
+        Id of the link, selecting its random number streams.
 
     Returns
     -------
@@ -656,7 +690,7 @@ def outdoor_to_indoor_path_loss(frequency, indoor, seed_value):
     if indoor:
 
         path_loss = generate_log_normal_dist_value(
-            frequency, 12, 8, 1, seed_value
+            frequency, 12, 8, 1, seed_value, link_id, INDOOR_STREAM
         )
 
     else:
@@ -664,3 +698,781 @@ def outdoor_to_indoor_path_loss(frequency, indoor, seed_value):
         path_loss = 0
 
     return path_loss
+
+
+def path_loss_calculator_array(model, frequency, distance, ant_height,
+    ant_type, building_height, street_width, settlement_type,
+    type_of_sight, ue_height, above_roof, indoor, seed_value, iterations,
+    link_ids=None):
+    """
+    Calculate the path loss for an array of links in a single call.
+
+    This is the array counterpart of `path_loss_calculator`. The
+    distance, frequency and height arguments may be scalars or numpy
+    arrays and are broadcast against each other, with one path loss
+    value returned per link. The breakpoint, line of sight and
+    settlement type branches are evaluated as masks.
+
+    The random variation of each link is drawn from its own stream (see
+    `np4d.rng.RandomStreams`), so links sharing a frequency receive
+    independent shadow fading, and no global random state is used.
+
+    Parameters
+    ----------
+    model: string
+        Specifies which propagation model to use.
+    frequency : float or array
+        Carrier band (f) required in MHz.
+    distance : float or array
+        Distance between the transmitter and receiver
+        in meters.
+    ant_height: float or array
+        Height of the antenna.
+    ant_type : string
+        Indicates the type of site antenna (hotspot,
+        micro, macro).
+    building_height : int
+        Height of surrounding buildings in meters (m).
+    street_width : float
+        Width of street in meters (m).
+    settlement_type : string or array
+        Gives the type of settlement (urban, suburban
+        or rural).
+    type_of_sight : string or array
+        Indicates whether the path is (Non) Line of Sight
+        (LOS or NLOS).
+    ue_height : float or array
+        Height of the User Equipment.
+    above_roof : int or array
+        Indicates if the propagation line is above or below
+        building roofs. Above = 1, below = 0.
+    indoor : binary or array
+        Indicates if the user is indoor (True) or
+        outdoor (False).
+    seed_value : int, None or RandomStreams
+        Dictates repeatable random number generation.
+    iterations : int
+        Specifies how many iterations a calculation should
+        be run for.
+    link_ids : array
+        Non-negative integer id of each link, selecting its random
+        number stream. Defaults to the position of each link.
+
+    Returns
+    -------
+    path_loss : array
+        Path loss in decibels (dB) for each link.
+
+    """
+    frequency = np.asarray(frequency, dtype=float)
+    distance = np.asarray(distance, dtype=float)
+
+    shape = np.broadcast(frequency, distance, np.asarray(ant_height),
+        np.asarray(ue_height)).shape
+    link_ids = _link_ids(link_ids, shape)
+    streams = as_random_streams(seed_value)
+
+    if model == 'etsi_tr_138_901':
+        if np.any((frequency <= 500) | (frequency > 100000)):
+            raise ValueError (
+                "frequency of {} NOT within correct range".format(
+                    frequency[(frequency <= 500) | (frequency > 100000)]
+                )
+            )
+
+        path_loss = etsi_tr_138_901_array(frequency, distance,
+            ant_height, ant_type, building_height,
+            street_width, settlement_type, type_of_sight,
+            ue_height, above_roof, indoor, streams,
+            iterations, link_ids
+        )
+
+        path_loss = path_loss + outdoor_to_indoor_path_loss_array(
+                frequency, indoor, streams, link_ids
+            )
+
+    elif model == 'extended_hata':
+
+        path_loss = extended_hata_array(frequency, distance/1e3,
+            ant_height, ue_height, above_roof, settlement_type,
+            streams, iterations, link_ids)
+
+    else:
+        raise ValueError('Did not recognise model {}'.format(model))
+
+    return np.round(path_loss)
+
+
+def etsi_tr_138_901_array(frequency, distance, ant_height, ant_type,
+    building_height, street_width, settlement_type, type_of_sight,
+    ue_height, above_roof, indoor, seed_value, iterations, link_ids=None):
+    """
+    Array implementation of the ETSI 138.901 / 3GPP TR 38.901 model.
+
+    Follows the same branches as `etsi_tr_138_901` for each link, with
+    the random variation drawn per link. A rural or suburban line of
+    sight link closer than 10 m, which the scalar model leaves
+    undefined, takes the first line of sight path loss (pl1).
+
+    Parameters
+    ----------
+    frequency : float or array
+        Carrier band (f) required in MHz.
+    distance : float or array
+        Distance between the transmitter and receiver (m).
+    ant_height: float or array
+        Height of the antenna (m).
+    ant_type : string
+        Indicates the type of site antenna (hotspot,
+        micro, macro).
+    building_height : int
+        Height of surrounding buildings in meters (m).
+    street_width : float
+        Width of street in meters (m).
+    settlement_type : string or array
+        Gives the type of settlement (urban, suburban
+        or rural).
+    type_of_sight : string or array
+        Indicates whether the path is (Non) Line of Sight
+        (LOS or NLOS).
+    ue_height : float or array
+        Height of the User Equipment.
+    above_roof : int
+        Indicates if the propagation line is above or
+        below building roofs. Above = 1, below = 0.
+    indoor : binary
+        Indicates if the user is indoor (True) or
+        outdoor (False).
+    seed_value : int, None or RandomStreams
+        Dictates repeatable random number generation.
+    iterations : int
+        Specifies how many iterations a calculation
+        should be run for.
+    link_ids : array
+        Non-negative integer id of each link, selecting its random
+        number stream. Defaults to the position of each link.
+
+    Returns
+    -------
+    path_loss : array
+        Path loss in decibels (dB)
+
+    """
+    frequency, distance, ant_height, ue_height = np.broadcast_arrays(
+        np.asarray(frequency, dtype=float), np.asarray(distance, dtype=float),
+        np.asarray(ant_height, dtype=float), np.asarray(ue_height, dtype=float)
+    )
+    settlement_type = np.broadcast_to(np.asarray(settlement_type), distance.shape)
+    type_of_sight = np.broadcast_to(np.asarray(type_of_sight), distance.shape)
+    link_ids = _link_ids(link_ids, distance.shape)
+    streams = as_random_streams(seed_value)
+
+    suburban_or_rural = (settlement_type == 'suburban') | (settlement_type == 'rural')
+    urban = settlement_type == 'urban'
+    if not np.all(suburban_or_rural | urban):
+        raise ValueError('Did not recognise settlement_type')
+
+    los = type_of_sight == 'los'
+    nlos = type_of_sight == 'nlos'
+    if not np.all(los | nlos):
+        raise ValueError('Did not recognise type_of_sight')
+
+    #frequency needs to be in GHz
+    fc = frequency / 1e3
+    #define speed of light
+    c = 3e8
+
+    #see etsi_tr_138_901 for the definition of each term
+    he = 1
+    hbs = ant_height
+    hut = ue_height
+    h_apost_bs = ant_height - ue_height
+    h_apost_ut = ue_height - he
+    w = street_width
+    h = building_height
+
+    dbp = 2 * pi * hbs * hut * (fc * 1e9) / c
+    d_apost_bp = 4 * h_apost_bs * h_apost_ut * (fc*1e9) / c
+    d2d_in = 10 #mean d2d_in value
+    d2d_out = distance - d2d_in
+    d2d = d2d_out + d2d_in
+    d3d = np.sqrt((d2d_out + d2d_in)**2 + (hbs - hut)**2)
+
+    #make sure parameters comply
+    check_3gpp_applicability_array(building_height, street_width,
+        ant_height, ue_height
+    )
+
+    path_loss = np.zeros(distance.shape)
+
+    if np.any(suburban_or_rural):
+
+        pl1 = np.round(
+            20*np.log10(40*pi*d3d*fc/3) +
+            min(0.03*h**1.72,10) *
+            np.log10(d3d) - min(0.044*h**1.72,14.77) +
+            0.002*np.log10(h)*d3d +
+            generate_log_normal_dist_values(
+                1, 4, iterations, streams, link_ids, SHADOW_FADING_STREAM
+            )
+        )
+
+        pl2 = np.round(
+            20*np.log10(40*pi*dbp*fc/3) +
+            min(0.03*h**1.72,10) *
+            np.log10(dbp) - min(0.044*h**1.72,14.77) +
+            0.002*np.log10(h)*dbp +
+            generate_log_normal_dist_values(
+                1, 4, iterations, streams, link_ids, SHADOW_FADING_STREAM
+            ) +
+            40*np.log10(d3d / dbp) +
+            generate_log_normal_dist_values(
+                1, 6, iterations, streams, link_ids, BREAKPOINT_STREAM
+            )
+        )
+
+        pl_apostrophe_rma_nlos = np.round(
+            161.04 - 7.1 * np.log10(w)+7.5*np.log10(h) -
+            (24.37 - 3.7 * (h/hbs)**2)*np.log10(hbs) +
+            (43.42 - 3.1*np.log10(hbs))*(np.log10(d3d)-3) +
+            20*np.log10(fc) -
+            (3.2 * (np.log10(11.75*hut))**2 - 4.97) +
+            generate_log_normal_dist_values(
+                1, 8, iterations, streams, link_ids, NLOS_STREAM
+            )
+        )
+
+        pl_rma = np.select(
+            [
+                los & (10 <= d2d) & (d2d <= dbp),
+                los & (dbp <= d2d) & (d2d <= 10000),
+                nlos,
+                d2d > 10000,
+            ],
+            [
+                pl1,
+                pl2,
+                np.maximum(pl_apostrophe_rma_nlos, pl2),
+                uma_nlos_optional_array(frequency, distance,
+                    ant_height, ue_height, streams, iterations, link_ids),
+            ],
+            default=pl1
+        )
+
+        path_loss = np.where(suburban_or_rural, pl_rma, path_loss)
+
+    if np.any(urban):
+
+        pl1 = np.round(
+            28 + 22 * np.log10(d3d) + 20 * np.log10(fc) +
+            generate_log_normal_dist_values(
+                1, 4, iterations, streams, link_ids, SHADOW_FADING_STREAM
+            )
+        )
+
+        pl2 = np.round(
+            28 + 40*np.log10(d3d) + 20 * np.log10(fc) -
+            9*np.log10((d_apost_bp)**2 + (hbs-hut)**2) +
+            generate_log_normal_dist_values(
+                1, 4, iterations, streams, link_ids, SHADOW_FADING_STREAM
+            )
+        )
+
+        pl_apostrophe_uma_nlos = np.where(d2d <= 5000,
+            np.round(
+                13.54 + 39.08 * np.log10(d3d) + 20 *
+                np.log10(fc) - 0.6 * (hut - 1.5) +
+                generate_log_normal_dist_values(
+                    1, 6, iterations, streams, link_ids, NLOS_STREAM
+                )
+            ),
+            uma_nlos_optional_array(frequency, distance, ant_height,
+                ue_height, streams, iterations, link_ids)
+        )
+
+        pl_uma = np.select(
+            [
+                los & (10 <= d2d) & (d2d <= d_apost_bp),
+                los & (d_apost_bp <= d2d) & (d2d <= 5000),
+                nlos,
+            ],
+            [
+                pl1,
+                pl2,
+                np.maximum(pl_apostrophe_uma_nlos, pl2),
+            ],
+            default=pl2
+        )
+
+        path_loss = np.where(urban, pl_uma, path_loss)
+
+    return path_loss
+
+
+def uma_nlos_optional_array(frequency, distance, ant_height, ue_height,
+    seed_value, iterations, link_ids=None):
+    """
+    Array implementation of `uma_nlos_optional`.
+
+    Parameters
+    ----------
+    frequency : float or array
+        Carrier band (f) required in GHz.
+    distance : float or array
+        Distance (d) between transmitter and receiver (km).
+    ant_height : float or array
+        Transmitter antenna height (h1) (m, above ground).
+    ue_height : float or array
+        Receiver antenna height (h2) (m, above ground).
+    seed_value : int, None or RandomStreams
+        Dictates repeatable random number generation.
+    iterations : int
+        Specifies iterations for a specific calculation.
+    link_ids : array
+        Non-negative integer id of each link, selecting its random
+        number stream. Defaults to the position of each link.
+
+    Returns
+    -------
+    path_loss : array
+        Path loss in decibels (dB).
+
+    """
+    fc = np.asarray(frequency, dtype=float)
+
+    d3d = np.sqrt((distance)**2 + (ant_height - ue_height)**2)
+
+    path_loss = 32.4 + 20*np.log10(fc) + 30*np.log10(d3d)
+
+    random_variation = generate_log_normal_dist_values(
+        1, 7.8, iterations, seed_value,
+        _link_ids(link_ids, np.shape(path_loss)), UMA_NLOS_OPTIONAL_STREAM
+    )
+
+    return np.round(path_loss + random_variation)
+
+
+def check_3gpp_applicability_array(building_height, street_width,
+    ant_height, ue_height):
+    """
+    Checks that every link in a batch conforms to the 3gpp model
+    assumptions, reporting each non-compliant parameter once.
+
+    Parameters
+    ----------
+    building_height : int or array
+        Height of surrounding buildings in meters (m).
+    street_width : float or array
+        Width of street in meters (m).
+    ant_height: float or array
+        Height of the antenna.
+    ue_height : float or array
+        Height of the User Equipment.
+
+    Returns
+    -------
+    overall_compliant : array
+        Indicates whether each link complies (True) or not (False).
+
+    """
+    checks = [
+        ('building_height', building_height, 5, 50),
+        ('Street_width', street_width, 5, 50),
+        ('ant_height', ant_height, 10, 150),
+        ('ue_height', ue_height, 1, 10),
+    ]
+
+    overall_compliant = True
+
+    for name, value, lower, upper in checks:
+        compliant = (lower <= np.asarray(value)) & (np.asarray(value) < upper)
+        if not np.all(compliant):
+            print('{} not compliant'.format(name))
+        overall_compliant = overall_compliant & compliant
+
+    return overall_compliant
+
+
+def extended_hata_array(frequency, distance, ant_height, ue_height,
+    above_roof, settlement_type, seed_value, iterations, link_ids=None):
+    """
+    Array implementation of the Extended Hata path loss model.
+
+    Follows the same branches as `extended_hata` for each link, with
+    the distance bands and settlement types evaluated as masks and the
+    random variation drawn per link.
+
+    Parameters
+    ----------
+    frequency : float or array
+        Carrier band (f) required in MHz.
+    distance : float or array
+        Distance (d) between transmitter and receiver (kilometres).
+    ant_height : float or array
+        Transmitter antenna height (h1) (m, above ground).
+    ue_height : float or array
+        Receiver antenna height (h2) (m, above ground).
+    above_roof : int or array
+        Whether the path is above or below the roof line
+        (0=below, 1=above).
+    settlement_type : string or array
+        General environment (urban/suburban/rural).
+    seed_value : int, None or RandomStreams
+        Set the seed for the pseudo random number generator
+        allowing reproducible stochastic restsults.
+    iterations : string
+        Specify the number of random numbers to be generated.
+        The mean value will be used.
+    link_ids : array
+        Non-negative integer id of each link, selecting its random
+        number stream. Defaults to the position of each link.
+
+    Returns
+    -------
+    path_loss : array
+        Estimated path loss (dB).
+
+    """
+    frequency, distance, ant_height, ue_height, above_roof = np.broadcast_arrays(
+        np.asarray(frequency, dtype=float), np.asarray(distance, dtype=float),
+        np.asarray(ant_height, dtype=float), np.asarray(ue_height, dtype=float),
+        np.asarray(above_roof)
+    )
+    settlement_type = np.broadcast_to(np.asarray(settlement_type), distance.shape)
+
+    if not np.all(distance < 100): #units : km
+        raise ValueError('Distance over 100km not compliant')
+
+    #find smallest and largest height values
+    hm = np.minimum(ant_height, ue_height)
+    hb = np.maximum(ant_height, ue_height)
+
+    near = distance < 0.04
+    mid = (0.04 <= distance) & (distance < 0.1)
+    far = distance >= 0.1
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+
+        alpha_hm = ((1.1*np.log10(frequency) - 0.7) *
+            np.minimum(10, hm) - (1.56*np.log10(frequency) - 0.8) +
+            np.maximum(0, (20*np.log10(hm/10))))
+
+        beta_hb = np.minimum(0, (20*np.log10(hb/30)))
+
+        alpha_exponent = np.where(distance <= 20, 1,
+            1 + (0.14 + 1.87e-4 * frequency + 1.07e-3 * hb) *
+            (np.log10(np.maximum(distance, 20)/20))**0.8)
+
+        ###PART 1####
+        #Determine initial path loss based on distance,
+        # frequency and environment.
+        path_loss_near = ((32.4 + (20*np.log10(frequency)) +
+            (10*np.log10((distance**2) +
+            ((hb - hm)**2) / (10**6)))))
+
+        bands = [
+            (30 < frequency) & (frequency <= 150),
+            (150 < frequency) & (frequency <= 1500),
+            (1500 < frequency) & (frequency <= 2000),
+            (2000 < frequency) & (frequency <= 4000),
+        ]
+        if np.any(far & ~np.any(bands, axis=0)):
+            raise ValueError('Frequency incorrect for Extended Hata')
+
+        clutter = ((44.9 - 6.55*np.log10(np.maximum(30, hb))) *
+            (np.log10(distance))**alpha_exponent - alpha_hm - beta_hb)
+
+        path_loss_far = np.select(bands, [
+            69.6 + 26.2*np.log10(150) - 20*np.log10(150/frequency) -
+                13.82*np.log10(np.maximum(30, hb)),
+            69.6 + 26.2 * np.log10(frequency) -
+                13.82 * np.log10(np.maximum(30, hb)),
+            46.3 + 33.9 * np.log10(frequency) -
+                13.82 * np.log10(np.maximum(30, hb)),
+            46.3 + 33.9*np.log10(2000) + 10*np.log10(frequency/2000) -
+                13.82*np.log10(np.maximum(30, hb)),
+        ]) + clutter
+
+        bounded_frequency = np.minimum(np.maximum(150, frequency), 2000)
+
+        path_loss_far = np.select(
+            [settlement_type == 'suburban', settlement_type == 'rural'],
+            [
+                path_loss_far - 2 *
+                    (np.log10((bounded_frequency/28))) ** 2 - 5.4,
+                path_loss_far - 4.78 *
+                    (np.log10(bounded_frequency))**2 +
+                    18.33 * np.log10(bounded_frequency) - 40.94,
+            ],
+            default=path_loss_far
+        )
+
+        #distance pre-set at 0.1
+        l_fixed_distance_upper = (32.4 + (20*np.log10(frequency)) +
+              (10*np.log10(0.1**2 + (hb - hm)**2 / 10**6)))
+
+        #distance pre-set at 0.04
+        l_fixed_distance_lower = (32.4 + (20*np.log10(frequency)) +
+              (10*np.log10(0.04**2 + (hb - hm)**2 / 10**6)))
+
+        path_loss_mid = (l_fixed_distance_lower +
+             (np.log10(distance) - np.log10(0.04)) / \
+            (np.log10(0.1) - np.log10(0.04)) *
+            (l_fixed_distance_upper - l_fixed_distance_lower))
+
+    path_loss = np.select([near, far, mid],
+        [path_loss_near, path_loss_far, path_loss_mid])
+
+    ###PART 2####
+    #determine variation in path loss using stochastic component
+    above = above_roof == 1
+    below = above_roof == 0
+
+    if np.any((0.04 < distance) & (distance <= 0.6) & ~(above | below)):
+        raise ValueError(
+            'Could not determine if above or below roof line')
+
+    sigma = np.select(
+        [
+            distance <= 0.04,
+            (distance <= 0.1) & above,
+            (distance <= 0.1) & below,
+            distance <= 0.2,
+            (distance <= 0.6) & above,
+            (distance <= 0.6) & below,
+        ],
+        [
+            3.5,
+            3.5 + ((12-3.5)/0.1-0.04) * (distance - 0.04),
+            3.5 + ((17-3.5)/0.1-0.04) * (distance - 0.04),
+            np.where(above, 12, 17),
+            12 + ((9-12)/0.6-0.2) * (distance - 0.02),
+            17 + (9-17) / (0.6-0.2) * (distance - 0.02),
+        ],
+        default=12
+    )
+
+    path_loss = path_loss + generate_log_normal_dist_values(
+        1, sigma, iterations, seed_value, _link_ids(link_ids, distance.shape),
+        SHADOW_FADING_STREAM)
+
+    return np.round(path_loss, 2)
+
+
+def generate_log_normal_dist_values(mu, sigma, draws, seed_value,
+    link_ids, stream=0):
+    """
+    Array implementation of `generate_log_normal_dist_value`.
+
+    Returns one random variation per link, each drawn from the link's
+    own stream, so results do not depend on how links are batched.
+
+    Parameters
+    ----------
+    mu : int
+        Mean of the desired distribution.
+    sigma : float or array
+        Standard deviation of the desired distribution.
+    draws : int
+        Number of required values.
+    seed_value : int, None or RandomStreams
+        Dictates repeatable random number generation.
+    link_ids : array
+        Non-negative integer id of each link.
+    stream : int
+        Identifies the random term being drawn.
+
+    Returns
+    -------
+    random_variation : array
+        Mean of the random variation over the specified itations.
+
+    """
+    sigma, link_ids = np.broadcast_arrays(
+        np.asarray(sigma, dtype=float), np.asarray(link_ids))
+
+    normal_std = np.sqrt(np.log10(1 + (sigma/mu)**2))
+    normal_mean = np.log10(mu) - normal_std**2 / 2
+
+    #lognormal draws are exp(mean + std * z) for standard normal z
+    z = as_random_streams(seed_value).standard_normal(
+        link_ids, draws, stream).reshape(link_ids.shape + (draws,))
+
+    hs = np.exp(normal_mean[..., np.newaxis] + normal_std[..., np.newaxis] * z)
+
+    return np.round(np.mean(hs, axis=-1), 2)
+
+
+def outdoor_to_indoor_path_loss_array(frequency, indoor, seed_value,
+    link_ids=None):
+    """
+    Array implementation of `outdoor_to_indoor_path_loss`.
+
+    Parameters
+    ----------
+    frequency : float or array
+        Carrier band (f) required in MHz.
+    indoor : binary or array
+        Indicates if the user is indoor (True) or outdoor (False).
+    seed_value : int, None or RandomStreams
+        Dictates repeatable random number generation.
+    link_ids : array
+        Non-negative integer id of each link, selecting its random
+        number stream. Defaults to the position of each link.
+
+    Returns
+    -------
+    path_loss : array
+        Outdoor to indoor path loss in decibels (dB)
+
+    """
+    frequency, indoor = np.broadcast_arrays(
+        np.asarray(frequency, dtype=float), np.asarray(indoor, dtype=bool))
+    if link_ids is not None:
+        #a scalar frequency and indoor flag apply to every link
+        frequency, indoor, link_ids = np.broadcast_arrays(frequency, indoor,
+            np.asarray(link_ids))
+
+    if not np.any(indoor):
+        return np.zeros(frequency.shape)
+
+    path_loss = generate_log_normal_dist_values(
+        12, 8, 1, seed_value, _link_ids(link_ids, frequency.shape),
+        INDOOR_STREAM
+    )
+
+    return np.where(indoor, path_loss, 0)
+
+
+def _link_ids(link_ids, shape):
+    """
+    Broadcast link ids to the shape of a batch, defaulting to the
+    position of each link.
+
+    """
+    if link_ids is None:
+        return np.arange(int(np.prod(shape))).reshape(shape)
+
+    return np.broadcast_to(np.asarray(link_ids), shape)
+
+
+class PathLossTable(object):
+    """
+    Dense distance to median path loss table for one scenario.
+
+    The median path loss (every random term at its median) of a model
+    only depends on distance once the model, frequency, heights and
+    settlement type are fixed. The table evaluates the exact model once
+    per distance bin, and links are then evaluated by linear
+    interpolation. The model's known discontinuities (breakpoint
+    distances and distance bands) are added as extra entries on both
+    sides of the step, so interpolation never smooths across them.
+    Distances outside the table fall back to the exact model.
+
+    Parameters
+    ----------
+    model : string
+        Specifies which propagation model to use.
+    frequency : float
+        Carrier band (f) required in MHz.
+    max_distance : float
+        Largest distance covered by the table (m).
+    bin_width : float
+        Distance between table entries (m).
+    parameters : dict
+        The remaining path_loss_calculator_array arguments (ant_height,
+        ant_type, building_height, street_width, settlement_type,
+        type_of_sight, ue_height, above_roof and indoor).
+
+    Attributes
+    ----------
+    max_error : float
+        Largest absolute difference (dB) between the interpolated and
+        exact path loss, checked at the midpoint of every bin.
+
+    """
+    def __init__(self, model, frequency, max_distance, bin_width,
+        **parameters):
+
+        self.model = model
+        self.frequency = frequency
+        self.bin_width = bin_width
+        self.parameters = parameters
+
+        number_of_bins = int(np.ceil(max_distance / bin_width))
+        grid = np.arange(number_of_bins + 1) * bin_width
+
+        breakpoints = _path_loss_breakpoints(model, frequency, parameters)
+        breakpoints = breakpoints[(breakpoints > 0) & (breakpoints < grid[-1])]
+
+        self.distances = np.unique(np.concatenate([
+            grid, breakpoints, np.nextafter(breakpoints, 0)
+        ]))
+        self.path_loss = self.exact(self.distances)
+
+        midpoints = grid[:-1] + bin_width / 2
+        if len(midpoints) > 0:
+            self.max_error = float(np.max(np.abs(
+                np.interp(midpoints, self.distances, self.path_loss) -
+                self.exact(midpoints)
+            )))
+        else:
+            self.max_error = 0.0
+
+
+    def exact(self, distance):
+        """
+        Evaluate the exact median path loss (dB) of the model.
+
+        """
+        return path_loss_calculator_array(self.model, self.frequency,
+            distance, seed_value=MedianStreams(), iterations=1,
+            **self.parameters)
+
+
+    def lookup(self, distance):
+        """
+        Evaluate the median path loss (dB) of each distance by
+        interpolating the table.
+
+        Parameters
+        ----------
+        distance : float or array
+            Distance between the transmitter and receiver (m).
+
+        Returns
+        -------
+        path_loss : array
+            Median path loss in decibels (dB).
+
+        """
+        distance = np.asarray(distance, dtype=float)
+        flat_distance = distance.ravel()
+
+        path_loss = np.interp(flat_distance, self.distances, self.path_loss)
+
+        outside = ((flat_distance < self.distances[0]) |
+            (flat_distance > self.distances[-1]))
+        if np.any(outside):
+            path_loss[outside] = self.exact(flat_distance[outside])
+
+        return path_loss.reshape(distance.shape)
+
+
+def _path_loss_breakpoints(model, frequency, parameters):
+    """
+    Distances (m) at which the median path loss of a model can jump.
+
+    """
+    if model == 'etsi_tr_138_901':
+        fc = frequency / 1e3
+        hbs = parameters['ant_height']
+        hut = parameters['ue_height']
+        dbp = 2 * pi * hbs * hut * (fc * 1e9) / 3e8
+        d_apost_bp = 4 * (hbs - hut) * (hut - 1) * (fc*1e9) / 3e8
+        return np.array([10, dbp, d_apost_bp, 5000, 10000], dtype=float)
+
+    if model == 'extended_hata':
+        return np.array([40, 100, 200, 600, 20000], dtype=float)
+
+    return np.array([], dtype=float)
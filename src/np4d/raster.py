@@ -0,0 +1,348 @@
+"""
+Tiled raster grids of coverage and capacity
+
+A raster is split into square tiles, each stored as a compressed .npz
+file of float32 layers, plus a raster.json file holding the grid,
+coordinate reference system and a key of the inputs. Tiles are written
+as they are computed, so memory is bounded by the tile size, and an
+interrupted run resumes from the tiles already written.
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import json
+import os
+
+import numpy as np
+
+
+class RasterGrid(object):
+    """
+    Regular grid of square cells, with rows running north to south.
+
+    Parameters
+    ----------
+    minx : float
+        West edge of the grid.
+    maxy : float
+        North edge of the grid.
+    resolution : float
+        Width and height of each cell.
+    width : int
+        Number of columns.
+    height : int
+        Number of rows.
+
+    """
+    __slots__ = ('minx', 'maxy', 'resolution', 'width', 'height')
+
+    def __init__(self, minx, maxy, resolution, width, height):
+
+        self.minx = float(minx)
+        self.maxy = float(maxy)
+        self.resolution = float(resolution)
+        self.width = int(width)
+        self.height = int(height)
+
+
+    @classmethod
+    def from_bounds(cls, bounds, resolution):
+        """
+        Smallest grid of the given resolution covering the bounds
+        (minx, miny, maxx, maxy), edges included.
+
+        """
+        minx, miny, maxx, maxy = bounds
+        width = int((maxx - minx) // resolution) + 1
+        height = int((maxy - miny) // resolution) + 1
+
+        return cls(minx, maxy, resolution, width, height)
+
+
+    def __len__(self):
+        return self.width * self.height
+
+
+    @property
+    def bounds(self):
+        """
+        Extent of the grid as (minx, miny, maxx, maxy).
+
+        """
+        return (self.minx, self.maxy - self.height * self.resolution,
+            self.minx + self.width * self.resolution, self.maxy)
+
+
+    @property
+    def transform(self):
+        """
+        Affine transform from (column, row) to x and y, in the order of
+        a GDAL geotransform.
+
+        """
+        return (self.minx, self.resolution, 0.0, self.maxy, 0.0,
+            -self.resolution)
+
+
+    def tiles(self, tile_size):
+        """
+        Split the grid into tiles of up to tile_size by tile_size cells.
+
+        Returns
+        -------
+        tiles : list of tuples
+            The (tile_row, tile_col, rows, cols) of each tile, where rows
+            and cols are slices of the grid.
+
+        """
+        return [
+            (tile_row, tile_col,
+                slice(row, min(row + tile_size, self.height)),
+                slice(col, min(col + tile_size, self.width)))
+            for tile_row, row in enumerate(range(0, self.height, tile_size))
+            for tile_col, col in enumerate(range(0, self.width, tile_size))
+        ]
+
+
+    def centres(self, rows, cols):
+        """
+        Coordinates of the cell centres in a window.
+
+        Parameters
+        ----------
+        rows, cols : slice
+            Window of the grid.
+
+        Returns
+        -------
+        centres : array
+            (rows * cols, 2) array of x and y coordinates, row by row.
+
+        """
+        x = self.minx + (np.arange(cols.start, cols.stop) + 0.5) * self.resolution
+        y = self.maxy - (np.arange(rows.start, rows.stop) + 0.5) * self.resolution
+        x, y = np.meshgrid(x, y)
+
+        return np.column_stack([x.ravel(), y.ravel()])
+
+
+    def cell_centres(self, row, col):
+        """
+        Coordinates of the centres of the given cells.
+
+        Parameters
+        ----------
+        row, col : array
+            (n,) arrays of the row and column of each cell.
+
+        Returns
+        -------
+        centres : array
+            (n, 2) array of x and y coordinates.
+
+        """
+        return np.column_stack([
+            self.minx + (np.asarray(col) + 0.5) * self.resolution,
+            self.maxy - (np.asarray(row) + 0.5) * self.resolution,
+        ])
+
+
+    def cell_ids(self, rows, cols):
+        """
+        Flat index (row * width + col) of every cell in a window, row by
+        row, used as the random stream id of each cell.
+
+        """
+        row, col = np.meshgrid(np.arange(rows.start, rows.stop),
+            np.arange(cols.start, cols.stop), indexing='ij')
+
+        return (row * self.width + col).ravel()
+
+
+    def locate(self, points):
+        """
+        Find the cell holding each point.
+
+        Parameters
+        ----------
+        points : array
+            (n, 2) array of x and y coordinates.
+
+        Returns
+        -------
+        rows, cols : array
+            (n,) arrays of the row and column of each point, -1 for
+            points outside the grid.
+
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+        cols = np.floor((points[:, 0] - self.minx) / self.resolution)
+        rows = np.floor((self.maxy - points[:, 1]) / self.resolution)
+
+        inside = ((cols >= 0) & (cols < self.width) &
+            (rows >= 0) & (rows < self.height))
+
+        return (np.where(inside, rows, -1).astype(np.int64),
+            np.where(inside, cols, -1).astype(np.int64))
+
+
+class RasterStore(object):
+    """
+    Directory of compressed raster tiles.
+
+    Parameters
+    ----------
+    path : string
+        Directory of the raster.
+    grid : RasterGrid
+        Grid of the raster.
+    tile_size : int
+        Number of rows and columns of each tile.
+    layers : tuple of strings
+        Names of the layers held in every tile.
+
+    """
+    __slots__ = ('path', 'grid', 'tile_size', 'layers')
+
+    def __init__(self, path, grid, tile_size, layers):
+
+        self.path = path
+        self.grid = grid
+        self.tile_size = int(tile_size)
+        self.layers = tuple(layers)
+
+
+    @classmethod
+    def create(cls, path, grid, tile_size, layers, key, crs=None):
+        """
+        Open the raster at path for writing. Tiles written earlier under
+        the same key and grid are kept, so an interrupted run resumes,
+        while those of any other inputs are removed.
+
+        """
+        raster = cls(path, grid, tile_size, layers)
+        metadata = {
+            'key': key,
+            'crs': crs,
+            'transform': grid.transform,
+            'width': grid.width,
+            'height': grid.height,
+            'tile_size': raster.tile_size,
+            'layers': list(raster.layers),
+        }
+
+        metadata_path = os.path.join(path, 'raster.json')
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r') as source:
+                previous = json.load(source)
+            if previous == json.loads(json.dumps(metadata)):
+                return raster
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        for filename in os.listdir(path):
+            if filename.startswith('tile_') and filename.endswith('.npz'):
+                os.remove(os.path.join(path, filename))
+
+        with open(metadata_path, 'w') as sink:
+            json.dump(metadata, sink, indent=1)
+
+        return raster
+
+
+    @classmethod
+    def open(cls, path):
+        """
+        Open an existing raster for reading.
+
+        """
+        with open(os.path.join(path, 'raster.json'), 'r') as source:
+            metadata = json.load(source)
+
+        minx, resolution, _, maxy, _, _ = metadata['transform']
+        grid = RasterGrid(minx, maxy, resolution, metadata['width'],
+            metadata['height'])
+
+        return cls(path, grid, metadata['tile_size'], metadata['layers'])
+
+
+    def tile_path(self, tile_row, tile_col):
+        return os.path.join(self.path,
+            'tile_{}_{}.npz'.format(tile_row, tile_col))
+
+
+    def has_tile(self, tile_row, tile_col):
+        return os.path.exists(self.tile_path(tile_row, tile_col))
+
+
+    def write_tile(self, tile_row, tile_col, arrays):
+        """
+        Write the layers of one tile, compressed as float32. The file is
+        written under a temporary name and then renamed, so a tile is
+        either complete or missing.
+
+        """
+        path = self.tile_path(tile_row, tile_col)
+        temporary = path[:-len('.npz')] + '.tmp.npz'
+
+        np.savez_compressed(temporary, **{
+            name: np.asarray(arrays[name], dtype=np.float32)
+            for name in self.layers
+        })
+        os.replace(temporary, path)
+
+
+    def read_tile(self, tile_row, tile_col):
+        """
+        Read the layers of one tile, or None if it has not been written.
+
+        """
+        path = self.tile_path(tile_row, tile_col)
+
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as tile:
+            return {name: tile[name] for name in self.layers}
+
+
+    def sample(self, points):
+        """
+        Sample every layer at the cells holding the given points, reading
+        each tile once.
+
+        Parameters
+        ----------
+        points : array
+            (n, 2) array of x and y coordinates.
+
+        Returns
+        -------
+        values : dict of arrays
+            (n,) float array of each layer, NaN for points outside the
+            grid or in cells not computed.
+
+        """
+        rows, cols = self.grid.locate(points)
+
+        values = {name: np.full(len(rows), np.nan) for name in self.layers}
+
+        inside = np.flatnonzero(rows >= 0)
+        tile_rows = rows[inside] // self.tile_size
+        tile_cols = cols[inside] // self.tile_size
+
+        for tile_row, tile_col in set(zip(tile_rows.tolist(), tile_cols.tolist())):
+            tile = self.read_tile(tile_row, tile_col)
+            if tile is None:
+                continue
+            selected = inside[(tile_rows == tile_row) & (tile_cols == tile_col)]
+            row = rows[selected] - tile_row * self.tile_size
+            col = cols[selected] - tile_col * self.tile_size
+            for name in self.layers:
+                values[name][selected] = tile[name][row, col]
+
+        return values
@@ -0,0 +1,219 @@
+"""
+Reproducible random number streams
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import numpy as np
+from scipy.special import ndtri
+
+#increment and multipliers of the SplitMix64 generator, whose output
+#function is a bijective mix of a 64 bit counter
+_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+_SHIFTS = (np.uint64(30), np.uint64(27), np.uint64(31))
+
+
+def _mix(values):
+    """
+    SplitMix64 output function of a uint64 array (wrapping arithmetic).
+
+    """
+    with np.errstate(over='ignore'):
+        values = (values ^ (values >> _SHIFTS[0])) * _MULTIPLIERS[0]
+        values = (values ^ (values >> _SHIFTS[1])) * _MULTIPLIERS[1]
+
+    return values ^ (values >> _SHIFTS[2])
+
+
+class RandomStreams(object):
+    """
+    Independent, reproducible random number streams for each link.
+
+    Streams are counter based: draw j of a link in a stream is a hash of
+    the root key (from a `numpy.random.SeedSequence`), the stream, the
+    link id and j, mapped to a standard normal value through the inverse
+    normal CDF. There is no generator state, so a link always receives
+    the same draws for a given seed, whichever other links, batch or
+    worker process it is evaluated with, and numpy's global random state
+    is never touched. Every draw costs the same whatever the link ids,
+    so sparse ids (e.g. `Segments.link_ids`) cost no more than dense
+    ones.
+
+    Parameters
+    ----------
+    seed_value : int
+        Seed for the root SeedSequence. If None, fresh entropy is used,
+        which can be recovered from `entropy` to repeat the run.
+
+    """
+    def __init__(self, seed_value=None):
+
+        self.seed_sequence = np.random.SeedSequence(seed_value)
+        self.key = self.seed_sequence.generate_state(1, np.uint64)[0]
+
+
+    @property
+    def entropy(self):
+        return self.seed_sequence.entropy
+
+
+    def spawn(self, family):
+        """
+        Return an independent set of streams for another family of
+        links, such as interfering links, whose ids would otherwise
+        overlap with the serving links.
+
+        Parameters
+        ----------
+        family : int
+            Identifies the family of links.
+
+        Returns
+        -------
+        streams : RandomStreams
+            Streams seeded from the root entropy and family.
+
+        """
+        return RandomStreams([self.entropy, int(family)])
+
+
+    def uniform_bits(self, link_ids, draws, stream=0):
+        """
+        Draw uniformly distributed 64 bit integers for each link.
+
+        Parameters
+        ----------
+        link_ids : array
+            Non-negative integer id of each link.
+        draws : int
+            Number of values required per link.
+        stream : int
+            Identifies the random term being drawn.
+
+        Returns
+        -------
+        bits : array
+            (len(link_ids), draws) uint64 array.
+
+        """
+        link_ids = np.asarray(link_ids, dtype=np.int64).ravel()
+
+        if np.any(link_ids < 0):
+            raise ValueError('link_ids must be non-negative')
+
+        #each (stream, link) pair starts its counter at a hashed position
+        with np.errstate(over='ignore'):
+            stream_key = _mix(self.key + _GAMMA * np.uint64(int(stream) + 1))
+            start = _mix(link_ids.astype(np.uint64) ^ stream_key)
+            counters = start[:, np.newaxis] + _GAMMA * np.arange(1, draws + 1,
+                dtype=np.uint64)
+
+        return _mix(counters)
+
+
+    def standard_normal(self, link_ids, draws, stream=0):
+        """
+        Draw standard normal values for each link.
+
+        Parameters
+        ----------
+        link_ids : array
+            Non-negative integer id of each link.
+        draws : int
+            Number of values required per link.
+        stream : int
+            Identifies the random term being drawn.
+
+        Returns
+        -------
+        values : array
+            (len(link_ids), draws) array of standard normal values.
+
+        """
+        bits = self.uniform_bits(link_ids, draws, stream)
+
+        #the top 53 bits give a uniform value strictly inside (0, 1)
+        uniform = ((bits >> np.uint64(11)).astype(float) + 0.5) * 2.0**-53
+
+        return ndtri(uniform)
+
+
+def sub_link_ids(link_ids, count):
+    """
+    Ids of the sub links of each link, such as its Monte Carlo
+    realisations or its interfering links.
+
+    Sub link j of a link takes a 63 bit hash of the link id and j, so
+    the ids stay non-negative whatever the link ids and count, where
+    link_id * count + j could overflow. Two sub links share an id (and
+    so their draws) only by a hash collision, with a probability of
+    about k**2 / 2**64 for k sub links.
+
+    Parameters
+    ----------
+    link_ids : array
+        Non-negative integer id of each link, of any shape.
+    count : int
+        Number of sub links of each link.
+
+    Returns
+    -------
+    sub_link_ids : array
+        (link_ids.shape + (count,)) int64 array of sub link ids.
+
+    """
+    link_ids = np.asarray(link_ids, dtype=np.int64)
+
+    if np.any(link_ids < 0):
+        raise ValueError('link_ids must be non-negative')
+
+    with np.errstate(over='ignore'):
+        keys = _mix(_mix(link_ids.astype(np.uint64))[..., np.newaxis] +
+            _GAMMA * np.arange(1, count + 1, dtype=np.uint64))
+
+    return (keys >> np.uint64(1)).astype(np.int64)
+
+
+def as_random_streams(seed_value):
+    """
+    Return RandomStreams for a seed, passing existing streams through.
+
+    Parameters
+    ----------
+    seed_value : int, None or RandomStreams
+        Seed for the random number streams.
+
+    Returns
+    -------
+    streams : RandomStreams
+        Random number streams.
+
+    """
+    if isinstance(seed_value, RandomStreams):
+        return seed_value
+
+    return RandomStreams(seed_value)
+
+
+class MedianStreams(RandomStreams):
+    """
+    Streams which always draw zero, so that every lognormal random
+    term takes its median value. Used to evaluate the median
+    (deterministic) path loss of a model.
+
+    """
+    def __init__(self):
+        super(MedianStreams, self).__init__(0)
+
+
+    def standard_normal(self, link_ids, draws, stream=0):
+
+        return np.zeros((np.size(link_ids), draws))
+
+
+    def spawn(self, family):
+
+        return self
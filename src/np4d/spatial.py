@@ -0,0 +1,421 @@
+"""
+Spatial indexing of cell sites and segmentation of roads
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import os
+
+import fiona
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+
+class SiteIndex(object):
+    """
+    Reusable spatial index of cell sites.
+
+    The index is built once from the site features and then answers
+    nearest and k-nearest site queries for whole arrays of points.
+
+    Parameters
+    ----------
+    sites : Sites or list of dicts
+        Contains the site coordinates, either as columnar `Sites` or
+        as site geojson features.
+
+    """
+    def __init__(self, sites):
+
+        self.sites = sites
+
+        if hasattr(sites, 'coordinates'):
+            self.coordinates = np.asarray(sites.coordinates, dtype=float)
+        else:
+            self.coordinates = np.array(
+                [site['geometry']['coordinates'] for site in sites],
+                dtype=float
+            )
+
+        self.coordinates = self.coordinates.reshape(-1, 2)
+
+        self.tree = cKDTree(self.coordinates)
+
+
+    def __len__(self):
+        return len(self.coordinates)
+
+
+    def nearest(self, points):
+        """
+        Find the nearest site to each point.
+
+        Parameters
+        ----------
+        points : array
+            (n, 2) array of x and y coordinates.
+
+        Returns
+        -------
+        distances : array
+            (n,) array of distances to the nearest site.
+        indices : array
+            (n,) array of nearest site indices.
+
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+        distances, indices = self.tree.query(points, k=1)
+
+        return distances, indices
+
+
+    def k_nearest(self, points, k, distance_upper_bound=np.inf):
+        """
+        Find the k nearest sites to each point, closest first.
+
+        Parameters
+        ----------
+        points : array
+            (n, 2) array of x and y coordinates.
+        k : int
+            Number of sites to return for each point. This is capped at
+            the number of sites in the index.
+        distance_upper_bound : float
+            Only return sites within this distance. Missing neighbours
+            have an infinite distance and an index equal to len(self).
+
+        Returns
+        -------
+        distances : array
+            (n, k) array of distances to each site.
+        indices : array
+            (n, k) array of site indices.
+
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+
+        k = min(k, len(self))
+
+        distances, indices = self.tree.query(points, k=[i + 1 for i in range(k)],
+            distance_upper_bound=distance_upper_bound)
+
+        return distances, indices
+
+
+class ShapefileIndex(object):
+    """
+    Persistent index of the bounding box and id of every shapefile
+    feature.
+
+    The bounding boxes are read straight from the record headers of the
+    .shp file (located through the .shx file) without decoding any
+    geometry, and the ids are read without geometries. The index is
+    saved next to the shapefile and rebuilt only when the shapefile
+    changes, so later queries never touch rejected features.
+
+    Parameters
+    ----------
+    path : string
+        Path of the .shp file.
+    id_field : string
+        Name of the integer id property.
+    index_path : string
+        Optional path of the saved index. Defaults to the shapefile path
+        with a .np4d.npz extension.
+
+    """
+    def __init__(self, path, id_field, index_path=None):
+
+        self.path = path
+        self.id_field = id_field
+        self.index_path = index_path or (
+            os.path.splitext(path)[0] + '.np4d.npz')
+
+        stamp = self._stamp()
+
+        if os.path.exists(self.index_path):
+            with np.load(self.index_path) as index:
+                if (index['id_field'] == id_field and
+                    np.array_equal(index['stamp'], stamp)):
+                    self.bounds = index['bounds']
+                    self.ids = index['ids']
+                    return
+
+        self.bounds = _read_record_bounds(path)
+        self.ids = _read_ids(path, id_field, len(self.bounds))
+
+        np.savez(self.index_path, stamp=stamp, id_field=id_field,
+            bounds=self.bounds, ids=self.ids)
+
+
+    def __len__(self):
+        return len(self.ids)
+
+
+    def query(self, bounds=None, ids=None):
+        """
+        Find the features whose bounding box intersects bounds and whose
+        id is in ids.
+
+        Parameters
+        ----------
+        bounds : tuple
+            Optional (minx, miny, maxx, maxy) bounding box.
+        ids : list
+            Optional ids to keep.
+
+        Returns
+        -------
+        fids : array
+            Feature ids (record numbers from 0) of matching features, in
+            file order.
+
+        """
+        keep = np.ones(len(self), dtype=bool)
+
+        if bounds is not None:
+            minx, miny, maxx, maxy = bounds
+            keep &= ((self.bounds[:, 0] <= maxx) & (self.bounds[:, 2] >= minx) &
+                (self.bounds[:, 1] <= maxy) & (self.bounds[:, 3] >= miny))
+
+        if ids is not None:
+            keep &= np.isin(self.ids, np.asarray(list(ids), dtype=np.int64))
+
+        return np.flatnonzero(keep)
+
+
+    def _stamp(self):
+        """
+        Size and modification time of each shapefile part.
+
+        """
+        stamp = []
+
+        for extension in ('.shp', '.shx', '.dbf'):
+            part = os.path.splitext(self.path)[0] + extension
+            if os.path.exists(part):
+                status = os.stat(part)
+                stamp.extend([status.st_size, status.st_mtime_ns])
+
+        return np.array(stamp, dtype=np.int64)
+
+
+def _read_record_bounds(path):
+    """
+    Bounding box of every record of a .shp file, from the record
+    headers. Null shapes have a NaN bounding box.
+
+    """
+    offsets = np.fromfile(os.path.splitext(path)[0] + '.shx',
+        dtype='>i4', offset=100).reshape(-1, 2)[:, 0].astype(np.int64) * 2
+
+    shapes = np.memmap(path, dtype=np.uint8, mode='r')
+
+    #after the 8 byte record header comes the shape type, then either
+    #x and y (points) or the bounding box (every other shape)
+    content = offsets[:, np.newaxis] + 8 + np.arange(36)
+    content = np.minimum(content, len(shapes) - 1)
+    records = np.ascontiguousarray(shapes[content])
+
+    shape_type = records[:, :4].view('<i4')[:, 0]
+    values = records[:, 4:].view('<f8')
+
+    bounds = values.copy()
+    point = np.isin(shape_type, [1, 11, 21])
+    bounds[point] = values[point][:, [0, 1, 0, 1]]
+    bounds[shape_type == 0] = np.nan
+
+    return bounds
+
+
+def _read_ids(path, id_field, length):
+    """
+    Integer id property of every feature, read without geometries.
+
+    """
+    ids = np.zeros(length, dtype=np.int64)
+
+    with fiona.open(path, ignore_geometry=True,
+        include_fields=[id_field]) as source:
+        for item in source:
+            ids[int(item.id)] = int(item['properties'][id_field])
+
+    return ids
+
+
+def segment_lines(coordinates, line_index, segment_length=250,
+    vertices=True):
+    """
+    Cut a batch of linestrings into segments of a set length.
+
+    Every vertex of every line is held in one coordinate array, so the
+    cut points of all lines are placed at once using cumulative length
+    arrays and `np.searchsorted`. A line shorter than segment_length is
+    kept whole (segment index 0). A longer line is cut into
+    round(length / segment_length) pieces, numbered from 1, with the
+    last piece running to the end of the line.
+
+    Parameters
+    ----------
+    coordinates : array
+        (m, 2) array of the vertices of every line, in order.
+    line_index : array
+        (m,) array giving the line each vertex belongs to. Vertices of
+        the same line must be contiguous, with lines numbered from 0 in
+        order (as returned by `shapely.get_coordinates` with
+        return_index=True).
+    segment_length : float
+        Target length of each segment.
+    vertices : bool
+        Whether to return the vertices of each segment.
+
+    Returns
+    -------
+    segments : dict of arrays
+        Contains the line and segment index, start and end distance
+        along the line, length and midpoint of each segment. If
+        requested, the vertices of every segment are returned in one
+        (k, 2) array, with segment i held in
+        vertices[vertex_offsets[i]:vertex_offsets[i + 1]].
+
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    line_index = np.asarray(line_index, dtype=np.int64)
+
+    number_of_lines = int(line_index[-1]) + 1 if len(line_index) else 0
+    first_vertex = np.searchsorted(line_index, np.arange(number_of_lines))
+    last_vertex = np.r_[first_vertex[1:], len(line_index)] - 1
+
+    #distance of every vertex along its own line, and along all lines
+    step = np.sqrt(np.sum(np.diff(coordinates, axis=0)**2, axis=1))
+    step[np.diff(line_index) != 0] = 0
+    position = np.r_[0, np.cumsum(step)]
+    line_start = position[first_vertex]
+    line_length = position[last_vertex] - line_start
+
+    pieces = np.where(line_length >= segment_length,
+        np.maximum(np.round(line_length / segment_length), 1), 1).astype(np.int64)
+
+    line = np.repeat(np.arange(number_of_lines), pieces)
+    piece_start = np.cumsum(pieces) - pieces
+    segment = np.arange(len(line)) - piece_start[line] + 1
+    segment[line_length[line] < segment_length] = 0
+
+    start = np.maximum(segment - 1, 0) * float(segment_length)
+    last = (segment == 0) | (segment == pieces[line])
+    end = np.where(last, line_length[line], segment * float(segment_length))
+
+    midpoints = _interpolate(coordinates, position, line_start, first_vertex,
+        last_vertex, line, (start + end) / 2)
+
+    segments = {
+        'line': line,
+        'segment': segment,
+        'start': start,
+        'end': end,
+        'length': end - start,
+        'midpoints': midpoints,
+    }
+
+    if vertices:
+        segments['vertices'], segments['vertex_offsets'] = _segment_vertices(
+            coordinates, position, line_start, first_vertex, last_vertex,
+            line, start, end)
+
+    return segments
+
+
+def _vertex_before(position, line_start, first_vertex, last_vertex, line,
+    distance, side):
+    """
+    Index of the vertex starting the edge of each line containing a
+    distance along that line.
+
+    """
+    vertex = np.searchsorted(position, line_start[line] + distance,
+        side=side) - 1
+
+    return np.clip(vertex, first_vertex[line],
+        np.maximum(last_vertex[line] - 1, first_vertex[line]))
+
+
+def _interpolate(coordinates, position, line_start, first_vertex,
+    last_vertex, line, distance):
+    """
+    Coordinates of the points a distance along each line.
+
+    """
+    vertex = _vertex_before(position, line_start, first_vertex, last_vertex,
+        line, distance, 'right')
+    following = np.minimum(vertex + 1, last_vertex[line])
+
+    edge_length = position[following] - position[vertex]
+    fraction = np.divide(line_start[line] + distance - position[vertex],
+        edge_length, out=np.zeros(len(line)), where=edge_length > 0)
+    fraction = np.clip(fraction, 0, 1)
+
+    return (coordinates[vertex] +
+        (coordinates[following] - coordinates[vertex]) * fraction[:, np.newaxis])
+
+
+def _segment_vertices(coordinates, position, line_start, first_vertex,
+    last_vertex, line, start, end):
+    """
+    Build each segment from its start point, the line vertices strictly
+    inside it and its end point.
+
+    """
+    start_points = _interpolate(coordinates, position, line_start,
+        first_vertex, last_vertex, line, start)
+    end_points = _interpolate(coordinates, position, line_start,
+        first_vertex, last_vertex, line, end)
+
+    first_inside = _vertex_before(position, line_start, first_vertex,
+        last_vertex, line, start, 'right') + 1
+    last_inside = np.searchsorted(position, line_start[line] + end,
+        side='left') - 1
+    last_inside = np.minimum(last_inside, last_vertex[line])
+    inside = np.maximum(last_inside - first_inside + 1, 0)
+
+    #each segment has a start point, its inside vertices and an end point
+    counts = inside + 2
+    offsets = np.cumsum(counts) - counts
+    segment_coordinates = np.empty((int(counts.sum()), 2))
+    segment_coordinates[offsets] = start_points
+    segment_coordinates[offsets + counts - 1] = end_points
+
+    inside_segment = np.repeat(np.arange(len(line)), inside)
+    inside_rank = np.arange(len(inside_segment)) - np.repeat(
+        np.cumsum(inside) - inside, inside)
+    segment_coordinates[offsets[inside_segment] + 1 + inside_rank] = (
+        coordinates[first_inside[inside_segment] + inside_rank])
+
+    return segment_coordinates, np.r_[offsets, counts.sum()]
+
+
+def linestrings(vertices, vertex_offsets):
+    """
+    Build shapely LineStrings from the vertices of a batch of lines.
+
+    Parameters
+    ----------
+    vertices : array
+        (k, 2) array of the vertices of every line, in order.
+    vertex_offsets : array
+        (n + 1,) array, where line i is held in
+        vertices[vertex_offsets[i]:vertex_offsets[i + 1]].
+
+    Returns
+    -------
+    geometries : array
+        (n,) array of shapely LineStrings.
+
+    """
+    counts = np.diff(vertex_offsets)
+
+    return shapely.linestrings(vertices,
+        indices=np.repeat(np.arange(len(counts)), counts))
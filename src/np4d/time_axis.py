@@ -0,0 +1,282 @@
+"""
+Time axis of flows and results
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import json
+
+import numpy as np
+
+
+#named hours used by the Oxford flow data
+HOUR_NAMES = (
+    'MIDNIGHT', 'ONEAM', 'TWOAM', 'THREEAM', 'FOURAM', 'FIVEAM',
+    'SIXAM', 'SEVENAM', 'EIGHTAM', 'NINEAM', 'TENAM', 'ELEVENAM',
+    'NOON', 'ONEPM', 'TWOPM', 'THREEPM', 'FOURPM', 'FIVEPM',
+    'SIXPM', 'SEVENPM', 'EIGHTPM', 'NINEPM', 'TENPM', 'ELEVENPM',
+)
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class TimeAxis(object):
+    """
+    Regular time axis, mapping timestamps or interval codes to compact
+    integer indices.
+
+    An axis is either a daily profile (no start), where every value is
+    placed by its time of day, or a series starting at a given time,
+    which can span many days. Values may be named hours (e.g. 'ONEAM'),
+    times of day ('HH:MM' or 'HH:MM:SS') or ISO timestamps
+    ('YYYY-MM-DD HH:MM' or 'YYYY-MM-DDTHH:MM'). Each distinct value is
+    parsed only once, so indexing a large column costs little more
+    than a hash lookup per row.
+
+    Parameters
+    ----------
+    minutes : int
+        Length of each time slice in minutes.
+    length : int
+        Number of time slices.
+    start : string or numpy.datetime64
+        Start of a series. None gives a daily profile.
+    labels : tuple of strings
+        Optional label of each slice, used in outputs. By default the
+        time of day ('HH:MM') of a profile, or the ISO start time of
+        each slice of a series.
+
+    """
+    __slots__ = ('minutes', 'length', 'start', 'labels')
+
+    def __init__(self, minutes, length, start=None, labels=None):
+
+        self.minutes = int(minutes)
+        self.length = int(length)
+        self.start = None if start is None else np.datetime64(start, 'm')
+
+        if labels is None:
+            offsets = np.arange(self.length) * self.minutes
+            if self.start is None:
+                labels = ['{:02d}:{:02d}'.format(offset // 60, offset % 60)
+                    for offset in offsets.tolist()]
+            else:
+                labels = np.datetime_as_string(self.start +
+                    offsets.astype('timedelta64[m]'), unit='m').tolist()
+
+        self.labels = tuple(str(label) for label in labels)
+
+        if len(self.labels) != self.length:
+            raise ValueError('Expected {} time labels'.format(self.length))
+
+
+    @classmethod
+    def profile(cls, minutes=60):
+        """
+        Daily profile of slices of the given length. An hourly profile
+        is labelled with the named hours of the Oxford flow data.
+
+        """
+        if MINUTES_PER_DAY % minutes:
+            raise ValueError('{} minutes do not divide a day'.format(minutes))
+
+        labels = HOUR_NAMES if minutes == 60 else None
+
+        return cls(minutes, MINUTES_PER_DAY // minutes, labels=labels)
+
+
+    @classmethod
+    def series(cls, start, end, minutes=60):
+        """
+        Series of slices from start up to (not including) end.
+
+        """
+        start = np.datetime64(start, 'm')
+        end = np.datetime64(end, 'm')
+        length = int((end - start) // np.timedelta64(int(minutes), 'm'))
+
+        if length <= 0:
+            raise ValueError('The time series must end after it starts')
+
+        return cls(minutes, length, start)
+
+
+    @classmethod
+    def from_config(cls, section, time_resolution=None, time_start=None,
+        time_end=None):
+        """
+        Build the axis from the time settings of a config section
+        (time_resolution in minutes, and an optional time_start and
+        time_end giving a series). Settings given as arguments (e.g.
+        from the command line) override those of the section.
+
+        """
+        minutes = section.getint('time_resolution', fallback=60)
+        start = section.get('time_start', fallback='')
+        end = section.get('time_end', fallback='')
+
+        if time_resolution is not None:
+            minutes = time_resolution
+        if time_start is not None:
+            start = time_start
+        if time_end is not None:
+            end = time_end
+
+        if start:
+            return cls.series(start, end, minutes)
+
+        return cls.profile(minutes)
+
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an axis written by `save`.
+
+        """
+        with open(path, 'r') as source:
+            settings = json.load(source)
+
+        return cls(settings['minutes'], settings['length'], settings['start'],
+            settings['labels'])
+
+
+    def save(self, path):
+        """
+        Write the axis to a json file, so outputs can be read back
+        against the axis they were produced with.
+
+        """
+        with open(path, 'w') as sink:
+            json.dump({
+                'minutes': self.minutes,
+                'length': self.length,
+                'start': None if self.start is None else str(self.start),
+                'labels': list(self.labels),
+            }, sink, indent=1)
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __str__(self):
+        if self.start is None:
+            return 'daily profile of {} slices of {} minutes'.format(
+                self.length, self.minutes)
+
+        return 'series of {} slices of {} minutes from {}'.format(self.length,
+            self.minutes, self.labels[0])
+
+
+    @property
+    def dtype(self):
+        """
+        Smallest unsigned integer type holding every index, plus the
+        missing value.
+
+        """
+        for dtype in (np.uint8, np.uint16, np.uint32):
+            if self.length < np.iinfo(dtype).max:
+                return np.dtype(dtype)
+
+        return np.dtype(np.uint64)
+
+
+    @property
+    def missing(self):
+        """
+        Index given to values outside the axis.
+
+        """
+        return np.iinfo(self.dtype).max
+
+
+    def index(self, values):
+        """
+        Map timestamps or interval codes to slice indices.
+
+        Parameters
+        ----------
+        values : array
+            Strings (or numpy.datetime64 values) to map.
+
+        Returns
+        -------
+        indices : array
+            Slice index of each value, of type `dtype`, with `missing`
+            for values that cannot be parsed or fall outside the axis.
+
+        """
+        values = np.asarray(values)
+
+        if values.size == 0:
+            return np.empty(values.shape, dtype=self.dtype)
+
+        unique, inverse = np.unique(values.ravel(), return_inverse=True)
+
+        codes = {label: code for code, label in enumerate(self.labels)}
+        unique_indices = np.array([
+            codes[value] if value in codes else self._slice(value)
+            for value in unique.tolist()
+        ], dtype=self.dtype)
+
+        return unique_indices[inverse].reshape(values.shape)
+
+
+    def _slice(self, value):
+        """
+        Slice index of a single value.
+
+        """
+        time = _parse_time(value)
+
+        if time is None:
+            return self.missing
+
+        if self.start is None:
+            if isinstance(time, np.datetime64):
+                time = int((time - time.astype('datetime64[D]')) //
+                    np.timedelta64(1, 'm'))
+            offset = time % MINUTES_PER_DAY
+        else:
+            if not isinstance(time, np.datetime64):
+                return self.missing
+            offset = int((time - self.start) // np.timedelta64(1, 'm'))
+
+        position = offset // self.minutes
+
+        if position < 0 or position >= self.length:
+            return self.missing
+
+        return position
+
+
+def _parse_time(value):
+    """
+    Parse a named hour or time of day (as minutes after midnight) or a
+    timestamp (as numpy.datetime64 in minutes). Returns None if the
+    value cannot be parsed.
+
+    """
+    if isinstance(value, np.datetime64):
+        return value.astype('datetime64[m]')
+
+    value = str(value).strip()
+
+    if value in HOUR_NAMES:
+        return HOUR_NAMES.index(value) * 60
+
+    try:
+        if '-' in value:
+            return np.datetime64(value.replace(' ', 'T'), 'm')
+        parts = [int(part) for part in value.split(':')]
+    except ValueError:
+        return None
+
+    if len(parts) in (2, 3):
+        return parts[0] * 60 + parts[1]
+
+    return None
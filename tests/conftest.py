@@ -0,0 +1,145 @@
+"""
+Shared test setup
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import argparse
+import os
+import sys
+
+import fiona
+import pytest
+from shapely.geometry import LineString, mapping
+
+#the pipeline stages live in scripts/run.py, which is not installed
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import run
+from np4d.data import Sites
+from np4d.np4d import SpectralEfficiencyLUT
+from np4d.time_axis import TimeAxis
+
+
+MODULATION_AND_CODING_LUT = [
+    ('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+    ('4G', 5, 'QPSK', 0.4385, 0.877, 2.4),
+    ('4G', 9, '16QAM', 0.6016, 2.4063, 10.3),
+    ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
+]
+
+#a 600 m road cut into two segments, a short road kept whole and a
+#road far from the others, in two 1 km tiles
+ROADS = [
+    (11, [(0, 100), (600, 100)]),
+    (12, [(100, 500), (100, 700)]),
+    (13, [(1500, 1200), (1700, 1200)]),
+]
+
+#the 800 MHz sites carry 10 MHz, and site A also carries 2600 MHz
+SITES = Sites(['A', 'A', 'B', 'C'], ['OX1 1'] * 4,
+    [(300, 300), (300, 300), (900, 600), (1600, 4200)],
+    frequency=[800, 2600, 800, 800])
+
+FLOWS = [
+    ('edgeID', 'hour', 'vehicles'),
+    (11, 'MIDNIGHT', 100),
+    (11, 'NINEAM', 2400),
+    (12, 'NINEAM', 730),
+    (13, 'FIVEPM', 1250),
+]
+
+
+@pytest.fixture
+def road_path(tmp_path):
+
+    path = str(tmp_path / 'roads.shp')
+    schema = {'geometry': 'LineString', 'properties': {'EdgeID': 'int'}}
+
+    with fiona.open(path, 'w', 'ESRI Shapefile', schema,
+        crs='epsg:27700') as sink:
+        for edge_id, vertices in ROADS:
+            sink.write({
+                'geometry': mapping(LineString(vertices)),
+                'properties': {'EdgeID': edge_id},
+            })
+
+    return path
+
+
+@pytest.fixture
+def flows_path(tmp_path):
+
+    path = str(tmp_path / 'flows.csv')
+
+    with open(path, 'w') as sink:
+        sink.writelines(','.join(map(str, row)) + '\n' for row in FLOWS)
+
+    return path
+
+
+@pytest.fixture
+def area_sites():
+
+    return SITES
+
+
+@pytest.fixture
+def settings(road_path):
+
+    return {
+        'model': 'etsi_tr_138_901',
+        'spectral_efficiency_lut': SpectralEfficiencyLUT(
+            MODULATION_AND_CODING_LUT),
+        'time_axis': TimeAxis.profile(60),
+        'road_path': road_path,
+        'road_key': 'roads',
+        'sites_key': 'sites',
+        'study_area_key': None,
+        'crs': 'epsg:27700',
+        'settlement_type': 'urban',
+        'seed_value': 42,
+        'iterations': 20,
+    }
+
+
+@pytest.fixture
+def options():
+    """
+    Build run options, defaulting to those of scripts/run.py.
+
+    """
+    def build(**overrides):
+        defaults = {
+            'workers': 1, 'chunk_size': 10000, 'realisations': 1,
+            'path_loss_bin_width': 0, 'cache_path': None,
+            'segment_length': 250, 'flow_chunk_size': 100000,
+            'stage_cache_path': None, 'interference_sites': 0,
+            'interference_distance': 0, 'best_server_sites': 0,
+            'frequency': [800], 'bandwidth': [10], 'target_capacity': [2],
+            'obf': [50], 'carrier_bandwidths': None,
+            'raster_resolution': 0, 'raster_tile_size': 256,
+            'raster_path': None, 'tile_size': 0, 'tile_halo': 10000,
+            'tile_path': None, 'checkpoint_path': None,
+            'checkpoint_size': 100000,
+        }
+        return argparse.Namespace(**dict(defaults, **overrides))
+
+    return build
+
+
+@pytest.fixture
+def run_area(tmp_path, settings, flows_path, area_sites):
+    """
+    Evaluate the test roads as one area, returning the summary.
+
+    """
+    def evaluate(args):
+        flows, _, _ = run.load_road_flows(flows_path,
+            time_axis=settings['time_axis'])
+        return run.run_area(args, settings, None, area_sites, flows, None,
+            str(tmp_path / 'results'), str(tmp_path / 'shapes'))
+
+    return evaluate
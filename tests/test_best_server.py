@@ -0,0 +1,108 @@
+"""
+Test the choice of the best serving site
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import argparse
+
+import numpy as np
+import pytest
+
+import run
+from np4d.data import Sites
+from np4d.np4d import LINK_PARAMETERS, best_server
+from np4d.path_loss import path_loss_calculator_array
+from np4d.rng import MedianStreams
+from np4d.spatial import SiteIndex
+
+
+def received_power(distance, frequency, ant_height, eirp):
+
+    path_loss = path_loss_calculator_array('etsi_tr_138_901', frequency,
+        float(distance), settlement_type='urban', seed_value=MedianStreams(),
+        iterations=1, **dict(LINK_PARAMETERS, ant_height=ant_height))
+
+    return eirp - path_loss - 4 + 4 - 4
+
+
+@pytest.fixture
+def sites():
+
+    #a weak high band site next to the road and a strong low band site
+    #further away, with a second low band site beyond it
+    return Sites(['A', 'B', 'C'], ['OX1 1'] * 3,
+        [(200, 0), (0, 600), (-1500, 0)], ant_height=[10, 40, 30],
+        eirp=[40, 58, 58], frequency=[2600, 800, 800])
+
+
+def test_strongest_not_nearest_candidate_chosen():
+
+    candidates = np.array([[[200, 0], [0, 600]]], dtype=float)
+    best, power = best_server('etsi_tr_138_901', [[0, 0]], candidates, {
+        'frequency': np.array([[2600, 800]]),
+        'ant_height': np.array([[10, 40]]),
+        'eirp': np.array([[40, 58]]),
+    }, 'urban')
+
+    expected = [received_power(200, 2600, 10, 40),
+        received_power(600, 800, 40, 58)]
+
+    assert expected[1] > expected[0]
+    assert best.tolist() == [1]
+    assert power[0] == pytest.approx(expected)
+
+
+def test_missing_candidates_never_chosen():
+
+    candidates = np.array([
+        [[np.nan, np.nan], [300, 0], [100, 0]],
+        [[np.nan, np.nan], [np.nan, np.nan], [np.nan, np.nan]],
+    ])
+    best, power = best_server('etsi_tr_138_901', [[0, 0], [0, 0]],
+        candidates, {
+            'frequency': np.array([[800, 800, np.nan]]),
+            'ant_height': 30,
+            'eirp': 55,
+        }, 'urban')
+
+    #no position and no frequency both rule a candidate out
+    assert np.isneginf(power[0, [0, 2]]).all()
+    assert np.isneginf(power[1]).all()
+    assert best.tolist() == [1, 0]
+
+
+def test_assign_sites_uses_best_server(sites):
+
+    args = argparse.Namespace(best_server_sites=2, interference_sites=2,
+        interference_distance=0)
+
+    site_ids, site_parameters, interferers, interferer_parameters = \
+        run.assign_sites(args, 'etsi_tr_138_901', 'urban',
+            np.array([[0.0, 0.0]]), sites, SiteIndex(sites))
+
+    assert site_ids.tolist() == [1]
+    assert site_parameters['frequency'].tolist() == [800]
+    assert site_parameters['ant_height'].tolist() == [40]
+    assert site_parameters['eirp'].tolist() == [58]
+
+    #only the other 800 MHz site interferes
+    present = ~np.isnan(interferers[0, :, 0])
+    assert interferers[0][present].tolist() == [[-1500, 0]]
+    assert interferer_parameters['eirp'][0][present].tolist() == [58]
+
+
+def test_assign_sites_nearest_without_best_server(sites):
+
+    args = argparse.Namespace(best_server_sites=0, interference_sites=0,
+        interference_distance=0)
+
+    site_ids, site_parameters, interferers, _ = run.assign_sites(args,
+        'etsi_tr_138_901', 'urban', np.array([[0.0, 0.0]]), sites,
+        SiteIndex(sites))
+
+    assert site_ids.tolist() == [0]
+    assert site_parameters is None
+    assert interferers is None
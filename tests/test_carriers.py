@@ -0,0 +1,128 @@
+"""
+Test carrier aggregation across the bands of each site
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import csv
+
+import numpy as np
+import pytest
+
+import run
+from np4d.data import Sites
+from np4d.parallel import (estimate_carrier_link_budgets_parallel,
+    estimate_link_budgets_parallel)
+
+
+MODULATION_AND_CODING_LUT = [
+    ('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+    ('4G', 5, 'QPSK', 0.4385, 0.877, 2.4),
+    ('4G', 9, '16QAM', 0.6016, 2.4063, 10.3),
+    ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
+]
+
+
+@pytest.fixture
+def cells():
+
+    #site A has two 800 MHz cells and a 2600 MHz cell, site B a 1800 MHz
+    #cell, which is not aggregated, and an 800 MHz cell
+    return Sites(['A', 'B', 'A', 'A', 'B'], ['OX1 1'] * 5,
+        [(0, 0), (500, 0), (0, 0), (0, 0), (500, 0)],
+        ant_height=[20, 15, 25, 30, 35], eirp=[50, 58, 52, 45, 53],
+        frequency=[800, 1800, 800, 2600, 800])
+
+
+def test_cells_grouped_into_carriers(cells):
+
+    carrier_sites, bands, bandwidths, carriers = run.get_carriers(cells,
+        {2600: 20, 800: 10})
+
+    assert carrier_sites.site_id.tolist() == ['A', 'B']
+    assert carrier_sites.coordinates.tolist() == [[0, 0], [500, 0]]
+    assert bands.tolist() == [800, 2600]
+    assert bandwidths.tolist() == [10, 20]
+
+    #several cells on one band take the highest antenna and power
+    assert carriers['ant_height'].tolist()[0] == [25, 30]
+    assert carriers['eirp'].tolist()[0] == [52, 45]
+    assert carriers['eirp'][1, 0] == 53
+    assert np.isnan(carriers['eirp'][1, 1])
+    assert carrier_sites.eirp.tolist() == [52, 53]
+
+
+def test_each_band_matches_a_single_carrier_run():
+
+    receivers = np.array([[100, 0], [400, 50], [800, 300]], dtype=float)
+    sites = np.array([[0, 0], [500, 0], [500, 0]], dtype=float)
+    site_parameters = {
+        'ant_height': np.array([[25, 30], [35, 20], [35, 20]]),
+        'eirp': np.array([[52, 45], [53, np.nan], [53, np.nan]]),
+    }
+    link_ids = np.array([4, 9, 2])
+
+    link_budgets = estimate_carrier_link_budgets_parallel('etsi_tr_138_901',
+        receivers, sites, [800, 2600], [10, 20], 'urban', 42, 1,
+        MODULATION_AND_CODING_LUT, link_ids=link_ids,
+        site_parameters=site_parameters)
+
+    assert link_budgets['capacity_mbps'].shape == (3, 2)
+
+    for column, (band, bandwidth) in enumerate([(800, 10), (2600, 20)]):
+        carried = np.isfinite(site_parameters['eirp'][:, column])
+        expected = estimate_link_budgets_parallel('etsi_tr_138_901',
+            receivers[carried], sites[carried], band, bandwidth, 'urban', 42,
+            1, MODULATION_AND_CODING_LUT, link_ids=link_ids[carried],
+            site_parameters={
+                'frequency': np.full(carried.sum(), band),
+                'ant_height': site_parameters['ant_height'][carried, column],
+                'eirp': site_parameters['eirp'][carried, column],
+            })
+        for name, value in expected.items():
+            assert np.array_equal(link_budgets[name][carried, column], value)
+
+    #a band the site does not carry adds no capacity
+    assert np.isnan(link_budgets['sinr'][1:, 1]).all()
+    assert link_budgets['capacity_mbps'][1:, 1].tolist() == [0, 0]
+
+
+def test_interferers_only_on_the_same_band():
+
+    receivers = np.array([[100, 0]], dtype=float)
+    sites = np.array([[0, 0]], dtype=float)
+    interferers = np.array([[[600, 0], [0, 900]]], dtype=float)
+
+    link_budgets = estimate_carrier_link_budgets_parallel('etsi_tr_138_901',
+        receivers, sites, [800, 2600], [10, 20], 'urban', 42, 1,
+        MODULATION_AND_CODING_LUT, interferers=interferers,
+        interferer_parameters={
+            'ant_height': np.full((1, 2, 2), 30.0),
+            'eirp': np.array([[[55, np.nan], [np.nan, np.nan]]]),
+        })
+
+    #one interferer on 800 MHz, none on 2600 MHz
+    assert np.isfinite(link_budgets['interference'][0, 0])
+    assert link_budgets['interference'][0, 1] == -np.inf
+
+
+def test_aggregated_capacity_reported_by_band(tmp_path, options, run_area):
+
+    run_area(options(carrier_bandwidths={800.0: 10.0, 2600.0: 20.0}))
+
+    with open(str(tmp_path / 'results' / 'results.csv'), 'r') as source:
+        rows = list(csv.DictReader(source))
+
+    assert list(rows[0])[-2:] == ['capacity_800', 'capacity_2600']
+    for row in rows:
+        total = int(row['capacity_800']) + int(row['capacity_2600'])
+        assert abs(int(row['capacity']) - total) <= 1
+        assert int(row['capacity_margin']) == (int(row['capacity']) -
+            int(row['demand']))
+
+    #only the segments served by site A get a 2600 MHz carrier
+    by_road = {row['road_id']: int(row['capacity_2600']) for row in rows}
+    assert by_road['11'] > 0
+    assert by_road['13'] == 0
@@ -0,0 +1,108 @@
+"""
+Test the checkpoints of completed work units
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import os
+
+import numpy as np
+import pytest
+
+from np4d.checkpoint import Checkpoint
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint'))
+
+    for unit in ('tile_0', 'tile_1'):
+        with open(os.path.join(checkpoint.path, unit + '.csv'), 'w') as sink:
+            sink.write('road_id,capacity\n1,{}\n'.format(unit))
+        checkpoint.complete(unit, 'key', [unit + '.csv'], segments=1)
+
+    return checkpoint
+
+
+def test_completed_units_reloaded(checkpoint):
+
+    reloaded = Checkpoint(checkpoint.path)
+
+    assert len(reloaded) == 2
+    assert reloaded.done('tile_0', 'key')
+    assert reloaded.files('tile_1') == ['tile_1.csv']
+    assert reloaded.units['tile_1']['segments'] == 1
+
+
+def test_truncated_manifest_line_dropped(checkpoint):
+
+    manifest_path = os.path.join(checkpoint.path, 'manifest.jsonl')
+    with open(manifest_path, 'rb') as source:
+        lines = source.readlines()
+
+    #a crash while the last line was being written
+    with open(manifest_path, 'wb') as sink:
+        sink.write(lines[0] + lines[1][:len(lines[1]) // 2])
+
+    reloaded = Checkpoint(checkpoint.path)
+
+    assert list(reloaded.units) == ['tile_0']
+    assert not reloaded.done('tile_1', 'key')
+    with open(manifest_path, 'rb') as source:
+        assert source.read() == lines[0]
+
+    #later units are appended after the last complete line
+    reloaded.complete('tile_1', 'key', ['tile_1.csv'])
+    assert list(Checkpoint(checkpoint.path).units) == ['tile_0', 'tile_1']
+
+
+def test_altered_file_not_done(checkpoint):
+
+    assert checkpoint.done('tile_0', 'key')
+
+    with open(os.path.join(checkpoint.path, 'tile_0.csv'), 'a') as sink:
+        sink.write('2,altered\n')
+
+    assert not checkpoint.done('tile_0', 'key')
+    assert checkpoint.done('tile_1', 'key')
+
+
+def test_missing_file_not_done(checkpoint):
+
+    os.remove(os.path.join(checkpoint.path, 'tile_1.csv'))
+
+    assert not checkpoint.done('tile_1', 'key')
+
+
+def test_changed_key_not_done(checkpoint):
+
+    assert not checkpoint.done('tile_0', 'other key')
+    assert not checkpoint.done('tile_2', 'key')
+
+
+def test_later_entry_replaces_earlier(checkpoint):
+
+    checkpoint.complete('tile_0', 'new key', ['tile_0.csv'])
+
+    reloaded = Checkpoint(checkpoint.path)
+
+    assert not reloaded.done('tile_0', 'key')
+    assert reloaded.done('tile_0', 'new key')
+
+
+def test_arrays_round_trip(checkpoint):
+
+    arrays = {'sinr': np.array([1.5, np.nan]), 'site': np.array([3, 4])}
+    checkpoint.save_arrays('batch_0', 'key', arrays)
+
+    loaded = Checkpoint(checkpoint.path).load_arrays('batch_0', 'key')
+
+    assert loaded.keys() == arrays.keys()
+    for name, value in arrays.items():
+        assert np.array_equal(loaded[name], value, equal_nan=True)
+    assert checkpoint.load_arrays('batch_0', 'other key') is None
+    assert not os.path.exists(os.path.join(checkpoint.path,
+        'batch_0.tmp.npz'))
@@ -0,0 +1,92 @@
+"""
+Test demand and capacity margin over the time axis and scenarios
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import csv
+import os
+
+import numpy as np
+
+import run
+
+
+def read_results(path):
+
+    with open(path, 'r') as source:
+        return list(csv.DictReader(source))
+
+
+def column(rows, name):
+
+    return np.array([float(row[name]) for row in rows])
+
+
+def test_estimate_demand_broadcasts():
+
+    vehicles = np.array([[100, 2400, 730]])
+    target_capacities = np.array([[2.0], [5.0]])
+    obfs = np.array([[50.0], [20.0]])
+
+    demand = run.estimate_demand(vehicles, target_capacities, obfs)
+
+    assert demand.shape == (2, 3)
+    assert demand.dtype.kind == 'i'
+    assert demand.tolist() == [
+        [run.estimate_demand(value, 2, 50) for value in [100, 2400, 730]],
+        [run.estimate_demand(value, 5, 20) for value in [100, 2400, 730]],
+    ]
+    assert run.estimate_demand(730, 2, 50) == 29
+
+
+def test_results_cover_every_observed_segment_and_time(tmp_path, options,
+    run_area):
+
+    summary = run_area(options())
+    rows = read_results(str(tmp_path / 'results' / 'results.csv'))
+
+    #road 11 is cut into two segments, each observed at two times
+    assert summary['segments'] == 4
+    assert summary['results'] == 6
+    assert [(row['road_id_segment'], row['hour']) for row in rows] == [
+        ('11_1', 'MIDNIGHT'), ('11_1', 'NINEAM'),
+        ('11_2', 'MIDNIGHT'), ('11_2', 'NINEAM'),
+        ('12', 'NINEAM'), ('13', 'FIVEPM'),
+    ]
+    assert column(rows, 'demand').tolist() == [4, 96, 4, 96, 29, 50]
+
+
+def test_capacity_broadcast_against_demand(tmp_path, options, run_area):
+
+    run_area(options(target_capacity=[2, 5], obf=[50, 20]))
+
+    scenarios = tmp_path / 'results' / 'scenarios'
+    results = {
+        (target_capacity, obf): read_results(str(scenarios / 'frequency=800' /
+            'bandwidth=10' / 'target_capacity={}'.format(target_capacity) /
+            'obf={}'.format(obf) / 'results.csv'))
+        for target_capacity in (2, 5) for obf in (50, 20)
+    }
+
+    base = results[2, 50]
+    for (target_capacity, obf), rows in results.items():
+        vehicles = column(rows, 'vehicle_density')
+        capacity = column(rows, 'capacity')
+
+        #the radio capacity is the same for every demand scenario and every
+        #time of a segment
+        assert np.array_equal(capacity, column(base, 'capacity'))
+        assert np.array_equal(column(rows, 'demand'),
+            run.estimate_demand(vehicles, target_capacity, obf))
+        assert np.array_equal(column(rows, 'capacity_margin'),
+            capacity - column(rows, 'demand'))
+
+    by_segment = {}
+    for row in base:
+        by_segment.setdefault(row['road_id_segment'], set()).add(
+            row['capacity'])
+    assert all(len(values) == 1 for values in by_segment.values())
+    assert os.path.exists(str(scenarios / 'scenarios.csv'))
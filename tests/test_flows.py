@@ -0,0 +1,32 @@
+"""
+Test the time by segment matrix of road flows
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import numpy as np
+
+from np4d.data import Flows
+
+
+def test_records_spread_onto_segments():
+
+    flows = Flows.from_records([7, 7, 9, 4], [0, 0, 1, 1], [2, 3, 4, 5],
+        [9, 7, 7], ('MIDNIGHT', 'ONEAM'))
+
+    assert flows.times == ('MIDNIGHT', 'ONEAM')
+    assert flows.vehicles.dtype == np.int32
+    assert flows.vehicles.tolist() == [[0, 5, 5], [4, 0, 0]]
+    assert flows.observed.tolist() == [[False, True, True], [True, False, False]]
+
+
+def test_counts_beyond_int32_kept():
+
+    limit = np.iinfo(np.int32).max
+
+    flows = Flows.from_records([7, 7], [0, 0], [limit, 5], [7], ('DAY',))
+
+    assert flows.vehicles.dtype == np.int64
+    assert flows.vehicles.tolist() == [[limit + 5]]
@@ -0,0 +1,147 @@
+"""
+Test incremental recomputation of the link budget stage
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import argparse
+
+import numpy as np
+import pytest
+
+import run
+from np4d.cache import StageStore
+from np4d.parallel import estimate_link_budgets_parallel
+
+
+MODULATION_AND_CODING_LUT = [
+    ('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+    ('4G', 5, 'QPSK', 0.4385, 0.877, 2.4),
+    ('4G', 9, '16QAM', 0.6016, 2.4063, 10.3),
+    ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
+]
+
+
+@pytest.fixture
+def links():
+
+    rng = np.random.default_rng(3)
+    receivers = rng.uniform(0, 3000, (40, 2))
+    sites = rng.uniform(0, 3000, (4, 2))
+    serving = sites[rng.integers(0, len(sites), len(receivers))]
+    link_ids = (rng.choice(10**6, len(receivers), replace=False) << 20) + 1
+
+    return receivers, sites, serving, link_ids
+
+
+class CountingEstimator(object):
+    """
+    Estimator recording the number of links of each call.
+
+    """
+    def __init__(self):
+        self.calls = []
+
+
+    def __call__(self, model, receivers, *args, **kwargs):
+        self.calls.append(len(receivers))
+        return estimate_link_budgets_parallel(model, receivers, *args,
+            **kwargs)
+
+
+def stage(store, receivers, serving, link_ids, seed_value=42,
+    estimator=None):
+
+    args = argparse.Namespace(workers=1, chunk_size=10000, cache_path=None)
+    link_inputs = {'closest_sites': serving, 'link_ids': link_ids}
+    link_site_options = {'link_ids': link_ids, 'interferers': None,
+        'site_parameters': None, 'interferer_parameters': None}
+
+    return run.link_budget_stage(args, store, 'link_budget_key',
+        ('etsi_tr_138_901', receivers, serving, 800, 10, 'urban',
+            seed_value, 1, MODULATION_AND_CODING_LUT),
+        {'realisations': 1, 'path_loss_table': None}, link_site_options,
+        link_inputs, estimator or estimate_link_budgets_parallel)
+
+
+def assert_same(link_budgets, expected):
+
+    assert link_budgets.keys() == expected.keys()
+    for name, value in expected.items():
+        assert np.array_equal(link_budgets[name], value, equal_nan=True)
+
+
+def test_unchanged_inputs_reused(tmp_path, links):
+
+    receivers, sites, serving, link_ids = links
+    store = StageStore(str(tmp_path))
+    first = stage(store, receivers, serving, link_ids)
+
+    estimator = CountingEstimator()
+    second = stage(store, receivers, serving, link_ids, estimator=estimator)
+
+    assert estimator.calls == []
+    assert_same(second, first)
+
+
+def test_changed_serving_site_recomputed(tmp_path, links):
+
+    receivers, sites, serving, link_ids = links
+    store = StageStore(str(tmp_path))
+    stage(store, receivers, serving, link_ids)
+
+    #two segments move to another site, e.g. after a site is added
+    moved = serving.copy()
+    moved[[3, 17]] = sites[0] + [250, -120]
+
+    estimator = CountingEstimator()
+    link_budgets = stage(store, receivers, moved, link_ids,
+        estimator=estimator)
+
+    assert estimator.calls == [2]
+    assert_same(link_budgets, stage(None, receivers, moved, link_ids))
+
+
+def test_roads_added_and_removed_matched_by_id(tmp_path, links):
+
+    receivers, sites, serving, link_ids = links
+    store = StageStore(str(tmp_path))
+    stage(store, receivers, serving, link_ids)
+
+    #drop five segments, add three new ones and shuffle the rest
+    order = np.random.default_rng(4).permutation(len(receivers))[5:]
+    new_receivers = np.concatenate([receivers[order], [[10, 20], [30, 40],
+        [2900, 2900]]])
+    new_serving = np.concatenate([serving[order], sites[:3]])
+    new_link_ids = np.concatenate([link_ids[order], [7, 8 << 20, 9 << 20]])
+
+    estimator = CountingEstimator()
+    link_budgets = stage(store, new_receivers, new_serving, new_link_ids,
+        estimator=estimator)
+
+    assert estimator.calls == [3]
+    assert_same(link_budgets,
+        stage(None, new_receivers, new_serving, new_link_ids))
+
+
+def test_unseeded_runs_not_stored(tmp_path, links):
+
+    receivers, sites, serving, link_ids = links
+    store = StageStore(str(tmp_path))
+    stage(store, receivers, serving, link_ids, seed_value=None)
+
+    assert store.key('link_budgets') is None
+
+
+def test_changed_rows():
+
+    previous = {'closest_sites': np.array([[0, 0], [1, 1], [np.nan, 2]]),
+        'link_ids': np.array([1, 2, 3])}
+    current = {'closest_sites': np.array([[0, 0], [1, 5], [np.nan, 2]]),
+        'link_ids': np.array([1, 2, 3])}
+
+    assert run.changed_rows(previous, current, 3).tolist() == [1]
+    assert run.changed_rows(previous, dict(current, interferers=np.zeros(3)),
+        3).tolist() == [0, 1, 2]
@@ -0,0 +1,115 @@
+"""
+Test interference from the k nearest co-channel sites
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import argparse
+
+import numpy as np
+import pytest
+
+import run
+from np4d.data import Sites
+from np4d.np4d import LINK_PARAMETERS, estimate_link_budgets
+from np4d.path_loss import path_loss_calculator_array
+from np4d.rng import MedianStreams
+from np4d.spatial import SiteIndex
+
+
+MODULATION_AND_CODING_LUT = [
+    ('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+    ('4G', 5, 'QPSK', 0.4385, 0.877, 2.4),
+    ('4G', 9, '16QAM', 0.6016, 2.4063, 10.3),
+    ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
+]
+
+
+@pytest.fixture
+def sites():
+
+    #sites along a road, 100, 900, 1900, 3900 and 8900 m from the receiver
+    return Sites(['A', 'B', 'C', 'D', 'E'], ['OX1 1'] * 5,
+        [(0, 0), (1000, 0), (2000, 0), (4000, 0), (9000, 0)])
+
+
+def assign(sites, interference_sites, interference_distance):
+
+    args = argparse.Namespace(best_server_sites=0,
+        interference_sites=interference_sites,
+        interference_distance=interference_distance)
+
+    return run.assign_sites(args, 'etsi_tr_138_901', 'urban',
+        np.array([[100.0, 0.0]]), sites, SiteIndex(sites))
+
+
+def received_power(distance):
+
+    path_loss = path_loss_calculator_array('etsi_tr_138_901', 800,
+        np.asarray(distance, dtype=float), settlement_type='urban',
+        seed_value=MedianStreams(), iterations=1, **LINK_PARAMETERS)
+
+    return 40 + 16 - 1 - path_loss - 4 + 4 - 4
+
+
+def test_interferers_exclude_serving_site(sites):
+
+    site_ids, _, interferers, _ = assign(sites, 3, 0)
+
+    assert site_ids.tolist() == [0]
+    assert interferers.shape == (1, 4, 2)
+    present = interferers[0][~np.isnan(interferers[0, :, 0])]
+    assert present.tolist() == [[1000, 0], [2000, 0], [4000, 0]]
+
+
+def test_interference_distance_cutoff(sites):
+
+    _, _, interferers, _ = assign(sites, 4, 2500)
+
+    present = interferers[0][~np.isnan(interferers[0, :, 0])]
+    assert present.tolist() == [[1000, 0], [2000, 0]]
+
+
+def test_interference_summed_in_mw(sites):
+
+    _, _, interferers, _ = assign(sites, 4, 0)
+
+    link_budgets = estimate_link_budgets('etsi_tr_138_901', [[100, 0]],
+        [[0, 0]], 800, 10, 'urban', MedianStreams(), 1,
+        MODULATION_AND_CODING_LUT, interferers=interferers)
+
+    expected = 10 * np.log10(np.sum(10**(received_power(
+        [900, 1900, 3900, 8900]) / 10)))
+
+    assert link_budgets['interference'][0] == pytest.approx(expected)
+    assert link_budgets['received_power'][0] == pytest.approx(
+        received_power(100))
+
+
+def test_more_interferers_lower_sinr(sites):
+
+    sinr = []
+    for interference_sites in (0, 1, 2, 4):
+        _, _, interferers, _ = assign(sites, interference_sites, 0)
+        link_budgets = estimate_link_budgets('etsi_tr_138_901', [[100, 0]],
+            [[0, 0]], 800, 10, 'urban', MedianStreams(), 1,
+            MODULATION_AND_CODING_LUT, interferers=interferers)
+        sinr.append(link_budgets['sinr'][0])
+
+    assert sinr == sorted(sinr, reverse=True)
+    assert len(set(sinr)) == 4
+
+
+def test_no_interferer_leaves_noise_only():
+
+    link_budgets = estimate_link_budgets('etsi_tr_138_901', [[100, 0]],
+        [[0, 0]], 800, 10, 'urban', MedianStreams(), 1,
+        MODULATION_AND_CODING_LUT, interferers=np.full((1, 3, 2), np.nan))
+
+    noise = 10 * np.log10(1.38e-23 * 290 * 1000) + 1.5 + 10 * np.log10(10e6)
+
+    assert link_budgets['interference'][0] == -np.inf
+    assert link_budgets['sinr'][0] == pytest.approx(
+        link_budgets['received_power'][0] - noise)
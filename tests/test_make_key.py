@@ -0,0 +1,35 @@
+"""
+Test the cache keys of function inputs
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import numpy as np
+import pytest
+
+from np4d.cache import make_key
+
+
+@pytest.mark.parametrize('values', [
+    (0.5, np.float32(0.5), np.float64(0.5)),
+    (800, 800.0, np.int32(800), np.float32(800)),
+    (float('nan'), np.nan, np.float32('nan')),
+])
+def test_equal_numbers_share_a_key(values):
+
+    assert len(set(make_key('model', value) for value in values)) == 1
+    assert len(set(make_key([value, 'urban']) for value in values)) == 1
+
+
+@pytest.mark.parametrize('first, second', [
+    (0.1, np.float32(0.1)),
+    (True, 1),
+    (2**60, 2**60 + 1),
+    ('0.5', 0.5),
+    (np.zeros(2, np.float32), np.zeros(2)),
+])
+def test_different_inputs_differ(first, second):
+
+    assert make_key(first) != make_key(second)
@@ -0,0 +1,83 @@
+"""
+Test the median path loss table
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import numpy as np
+import pytest
+
+from np4d.np4d import LINK_PARAMETERS, build_path_loss_table
+from np4d.path_loss import path_loss_calculator_array, _path_loss_breakpoints
+from np4d.rng import MedianStreams
+
+
+SCENARIOS = [
+    ('etsi_tr_138_901', 800, 'urban'),
+    ('etsi_tr_138_901', 2600, 'rural'),
+    ('extended_hata', 800, 'urban'),
+    ('extended_hata', 1800, 'suburban'),
+]
+
+
+def exact(model, frequency, settlement_type, distance):
+
+    return path_loss_calculator_array(model, frequency, distance,
+        settlement_type=settlement_type, seed_value=MedianStreams(),
+        iterations=1, **LINK_PARAMETERS)
+
+
+@pytest.fixture(params=SCENARIOS, ids=['-'.join(map(str, scenario))
+    for scenario in SCENARIOS])
+def scenario(request):
+
+    model, frequency, settlement_type = request.param
+    table = build_path_loss_table(model, frequency, settlement_type, 6000, 10)
+
+    return model, frequency, settlement_type, table
+
+
+def test_bin_midpoints_within_max_error(scenario):
+
+    model, frequency, settlement_type, table = scenario
+    midpoints = np.arange(0, 6000, 10) + 5
+
+    error = np.abs(table.lookup(midpoints) -
+        exact(model, frequency, settlement_type, midpoints))
+
+    assert table.max_error > 0
+    assert np.max(error) == pytest.approx(table.max_error)
+
+
+def test_entries_and_breakpoints_exact(scenario):
+
+    model, frequency, settlement_type, table = scenario
+    breakpoints = _path_loss_breakpoints(model, frequency,
+        dict(LINK_PARAMETERS, settlement_type=settlement_type))
+    breakpoints = breakpoints[breakpoints < 6000]
+
+    #both sides of every step of the model
+    distances = np.concatenate([np.arange(0, 6001, 10.0), breakpoints,
+        np.nextafter(breakpoints, 0), np.nextafter(breakpoints, np.inf)])
+
+    assert np.array_equal(table.lookup(distances),
+        exact(model, frequency, settlement_type, distances))
+
+
+def test_out_of_range_falls_back_to_exact_model(scenario):
+
+    model, frequency, settlement_type, table = scenario
+    distances = np.array([6000.5, 7500, 12000])
+
+    assert np.array_equal(table.lookup(distances),
+        exact(model, frequency, settlement_type, distances))
+
+
+def test_lookup_keeps_shape(scenario):
+
+    model, frequency, settlement_type, table = scenario
+    distances = np.array([[15.0, 250.0], [3000.0, 9000.0]])
+
+    assert table.lookup(distances).shape == (2, 2)
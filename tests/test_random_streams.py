@@ -0,0 +1,172 @@
+"""
+Test the reproducible random number streams
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import time
+
+import numpy as np
+import pytest
+
+from np4d.data import Segments
+from np4d.np4d import estimate_link_budgets
+from np4d.rng import RandomStreams, MedianStreams, sub_link_ids
+from np4d.parallel import estimate_link_budgets_parallel
+
+
+MODULATION_AND_CODING_LUT = [
+    ('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+    ('4G', 5, 'QPSK', 0.4385, 0.877, 2.4),
+    ('4G', 9, '16QAM', 0.6016, 2.4063, 10.3),
+    ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
+]
+
+
+@pytest.fixture
+def link_ids():
+
+    #dense ids spanning several blocks, plus sparse segment style ids
+    return np.r_[np.arange(3000), (60574 << 20) + np.arange(5),
+        (12 << 20) + 3]
+
+
+@pytest.fixture
+def links():
+
+    rng = np.random.default_rng(1)
+    receivers = rng.uniform(0, 2000, (300, 2))
+    sites = rng.uniform(0, 2000, (300, 2))
+
+    return receivers, sites
+
+
+def segments(road_ids, pieces):
+
+    road_id = np.repeat(road_ids, pieces)
+    segment_index = np.concatenate([np.arange(1, count + 1) if count > 1
+        else [0] for count in pieces])
+
+    return Segments(road_id, segment_index, np.zeros((len(road_id), 2)),
+        np.ones(len(road_id)))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000, 1024, 2500])
+def test_draws_independent_of_chunk_size(link_ids, chunk_size):
+
+    expected = RandomStreams(42).standard_normal(link_ids, 3)
+
+    chunks = [
+        RandomStreams(42).standard_normal(
+            link_ids[start:start + chunk_size], 3)
+        for start in range(0, len(link_ids), chunk_size)
+    ]
+
+    assert np.array_equal(np.concatenate(chunks), expected)
+
+
+def test_draws_independent_of_order(link_ids):
+
+    streams = RandomStreams(42)
+    order = np.random.default_rng(0).permutation(len(link_ids))
+
+    assert np.array_equal(streams.standard_normal(link_ids[order], 2),
+        streams.standard_normal(link_ids, 2)[order])
+
+
+def test_streams_and_families_differ(link_ids):
+
+    streams = RandomStreams(42)
+    values = streams.standard_normal(link_ids, 1)
+
+    assert not np.array_equal(values, streams.standard_normal(link_ids, 1, 1))
+    assert not np.array_equal(values,
+        streams.spawn(1).standard_normal(link_ids, 1))
+    assert np.array_equal(values,
+        RandomStreams(42).standard_normal(link_ids, 1))
+
+
+def test_negative_link_ids_rejected():
+
+    with pytest.raises(ValueError):
+        RandomStreams(42).standard_normal([3, -1], 1)
+
+
+def test_sub_link_ids_do_not_overflow(link_ids):
+
+    largest = np.iinfo(np.int64).max
+    ids = sub_link_ids(np.r_[link_ids, largest], 1000)
+
+    assert ids.shape == (len(link_ids) + 1, 1000)
+    assert ids.dtype == np.int64
+    assert ids.min() >= 0
+    assert len(np.unique(ids)) == ids.size
+    assert np.array_equal(sub_link_ids(link_ids[5:9], 1000), ids[5:9])
+    assert np.array_equal(sub_link_ids(link_ids[:3, np.newaxis], 2)[:, 0],
+        ids[:3, :2])
+
+
+def test_median_streams_draw_zero(link_ids):
+
+    assert not MedianStreams().standard_normal(link_ids, 2).any()
+
+
+@pytest.mark.parametrize('realisations', [1, 20])
+def test_link_budgets_independent_of_workers(links, realisations):
+
+    receivers, sites = links
+    link_ids = (np.arange(len(receivers)) * 977) << 4
+
+    results = [
+        estimate_link_budgets_parallel('etsi_tr_138_901', receivers, sites,
+            800, 10, 'urban', 42, 5, MODULATION_AND_CODING_LUT,
+            workers=workers, chunk_size=chunk_size, realisations=realisations,
+            link_ids=link_ids)
+        for workers, chunk_size in [(1, 10000), (1, 37), (2, 64), (3, 100)]
+    ]
+
+    for result in results[1:]:
+        assert result.keys() == results[0].keys()
+        for key, value in result.items():
+            assert np.array_equal(value, results[0][key], equal_nan=True)
+
+
+def test_segment_draws_independent_of_other_roads():
+
+    roads = segments([60574, 12, 3, 812345], [3, 1, 4, 2])
+    every_road = RandomStreams(42).standard_normal(roads.link_ids(), 2)
+
+    #the same road evaluated alone, or with a road added or removed (a
+    #tile, or an incremental update)
+    for road_ids, pieces in [([3], [4]), ([60574, 3], [3, 4]),
+        ([3, 99, 60574, 12], [4, 5, 3, 1])]:
+        subset = segments(road_ids, pieces)
+        values = RandomStreams(42).standard_normal(subset.link_ids(), 2)
+        for road_id in road_ids:
+            if road_id in roads.road_id:
+                assert np.array_equal(values[subset.road_id == road_id],
+                    every_road[roads.road_id == road_id])
+
+
+def test_sparse_link_ids_cost_no_more_than_dense():
+
+    rng = np.random.default_rng(2)
+    receivers = rng.uniform(0, 2000, (100000, 2))
+    sites = rng.uniform(0, 2000, (100000, 2))
+    dense = np.arange(len(receivers))
+    road_ids = rng.choice(10**7, len(receivers), replace=False)
+
+    def seconds(link_ids):
+        start = time.perf_counter()
+        estimate_link_budgets('etsi_tr_138_901', receivers, sites, 800, 10,
+            'urban', 42, 1, MODULATION_AND_CODING_LUT, link_ids=link_ids)
+        return time.perf_counter() - start
+
+    #one segment per road is the sparsest case
+    seconds(dense)
+    sparse = segments(road_ids, np.ones(len(road_ids), dtype=int)).link_ids()
+
+    assert min(seconds(sparse) for _ in range(3)) < 3 * min(
+        seconds(dense) for _ in range(3)) + 0.05
@@ -0,0 +1,204 @@
+"""
+Test the tiled coverage and capacity raster
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import csv
+import os
+
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+import run
+from np4d.data import Sites
+from np4d.np4d import SpectralEfficiencyLUT
+from np4d.raster import RasterGrid, RasterStore
+from np4d.spatial import SiteIndex
+
+
+MODULATION_AND_CODING_LUT = [
+    ('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+    ('4G', 5, 'QPSK', 0.4385, 0.877, 2.4),
+    ('4G', 9, '16QAM', 0.6016, 2.4063, 10.3),
+    ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
+]
+
+
+@pytest.fixture
+def grid():
+
+    #7 by 5 cells of 100 m, south and east of x = 1000, y = 2400
+    return RasterGrid.from_bounds((1000, 2000, 1650, 2400), 100)
+
+
+@pytest.fixture
+def network():
+
+    sites = Sites(['A', 'B'], ['OX1 1'] * 2, [(1100, 2000), (1600, 2250)])
+    arguments = (800, 10, 'urban', 42, 1,
+        SpectralEfficiencyLUT(MODULATION_AND_CODING_LUT))
+
+    return sites, SiteIndex(sites), arguments
+
+
+def test_grid_covers_bounds(grid):
+
+    assert (grid.width, grid.height) == (7, 5)
+    assert grid.bounds == (1000, 1900, 1700, 2400)
+    assert len(grid) == 35
+
+
+def test_tiles_cover_every_cell_once(grid):
+
+    tiles = grid.tiles(3)
+    covered = np.zeros((grid.height, grid.width), dtype=int)
+    for _, _, rows, cols in tiles:
+        covered[rows, cols] += 1
+
+    assert [(tile_row, tile_col) for tile_row, tile_col, _, _ in tiles] == [
+        (0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)]
+    assert tiles[-1][2:] == (slice(3, 5), slice(6, 7))
+    assert (covered == 1).all()
+
+
+def test_cell_centres_located_in_their_cells(grid):
+
+    rows, cols = slice(1, 4), slice(2, 6)
+    row, col = grid.locate(grid.centres(rows, cols))
+
+    assert np.array_equal(row * grid.width + col, grid.cell_ids(rows, cols))
+    assert np.array_equal(grid.cell_centres(row, col), grid.centres(rows,
+        cols))
+
+
+def test_locate_edges_and_outside(grid):
+
+    row, col = grid.locate([[1000, 2400], [1699.9, 1900.1], [1700, 2300],
+        [999.9, 2300], [1200, 2400.1], [1200, 1899.9]])
+
+    assert row.tolist() == [0, 4, -1, -1, -1, -1]
+    assert col.tolist() == [0, 6, -1, -1, -1, -1]
+
+
+def test_tiles_written_and_read(tmp_path, grid):
+
+    raster = RasterStore.create(str(tmp_path), grid, 3, ('a', 'b'), 'key')
+    raster.write_tile(1, 2, {'a': np.full((2, 1), 1.5), 'b': [[2], [3]]})
+
+    tile = raster.read_tile(1, 2)
+    assert tile['a'].dtype == np.float32
+    assert tile['b'].tolist() == [[2], [3]]
+    assert raster.read_tile(0, 0) is None
+    assert sorted(os.listdir(str(tmp_path))) == ['raster.json',
+        'tile_1_2.npz']
+
+    opened = RasterStore.open(str(tmp_path))
+    assert (opened.grid.minx, opened.grid.maxy, opened.grid.width,
+        opened.grid.height) == (1000, 2400, 7, 5)
+    assert (opened.tile_size, opened.layers) == (3, ('a', 'b'))
+
+
+def test_tiles_kept_only_for_the_same_inputs(tmp_path, grid):
+
+    raster = RasterStore.create(str(tmp_path), grid, 3, ('a',), 'key')
+    raster.write_tile(0, 1, {'a': np.zeros((3, 3))})
+
+    assert RasterStore.create(str(tmp_path), grid, 3, ('a',),
+        'key').has_tile(0, 1)
+    assert not RasterStore.create(str(tmp_path), grid, 3, ('a',),
+        'other key').has_tile(0, 1)
+
+
+def test_sample_reads_cells(tmp_path, grid):
+
+    raster = RasterStore.create(str(tmp_path), grid, 3, ('a',), 'key')
+    for tile_row, tile_col, rows, cols in grid.tiles(3):
+        if (tile_row, tile_col) != (1, 2):
+            raster.write_tile(tile_row, tile_col, {'a': grid.cell_ids(rows,
+                cols).reshape(rows.stop - rows.start, cols.stop - cols.start)})
+
+    #a cell of each tile, a point outside the grid and one in the
+    #unwritten tile
+    values = raster.sample([[1050, 2350], [1450, 2050], [1650, 2350],
+        [900, 2350], [1650, 1950]])['a']
+
+    assert values[:3].tolist() == [0, 25, 6]
+    assert np.isnan(values[3:]).all()
+
+
+def test_interrupted_raster_resumes(tmp_path, grid, options, network):
+
+    sites, site_index, arguments = network
+    args = options(raster_resolution=100)
+    path = str(tmp_path / 'raster')
+
+    raster = RasterStore.create(path, grid, 3, run.RASTER_LAYERS, 'key')
+    assert run.estimate_raster(raster, None, args, 'etsi_tr_138_901', sites,
+        site_index, arguments) == 6
+    complete = raster.sample(grid.centres(slice(0, 5), slice(0, 7)))
+
+    #lose a tile, as a run stopped part way would
+    os.remove(raster.tile_path(1, 1))
+    raster = RasterStore.create(path, grid, 3, run.RASTER_LAYERS, 'key')
+    assert run.estimate_raster(raster, None, args, 'etsi_tr_138_901', sites,
+        site_index, arguments) == 1
+
+    resumed = raster.sample(grid.centres(slice(0, 5), slice(0, 7)))
+    for name in run.RASTER_LAYERS:
+        assert np.array_equal(resumed[name], complete[name])
+
+    #every cell is its own link, whichever tile it is computed in
+    link_budgets = run.estimate_cells(args, 'etsi_tr_138_901',
+        grid.cell_centres([4], [6]), [34], sites, site_index, arguments)
+    assert complete['capacity_mbps'][-1] == np.float32(
+        link_budgets['capacity_mbps'][0])
+
+
+def test_cells_outside_area_sampled_at_their_centre(tmp_path, grid, options,
+    network):
+
+    sites, site_index, arguments = network
+    args = options(raster_resolution=100)
+    raster = RasterStore.create(str(tmp_path), grid, 3, run.RASTER_LAYERS,
+        'key')
+    run.estimate_raster(raster, box(1000, 2100, 1700, 2400), args,
+        'etsi_tr_138_901', sites, site_index, arguments)
+
+    points = np.array([[1420, 2340], [1420, 1940]])
+    assert np.isnan(raster.sample(points)['sinr'][1])
+
+    link_budgets = run.sample_raster(raster, points, args, 'etsi_tr_138_901',
+        sites, site_index, arguments)
+    expected = run.estimate_cells(args, 'etsi_tr_138_901',
+        grid.cell_centres([0, 4], [4, 4]), [4, 32], sites, site_index,
+        arguments)
+
+    for name in run.RASTER_LAYERS:
+        assert np.array_equal(link_budgets[name],
+            np.asarray(expected[name], dtype=np.float32))
+
+
+def test_segments_sample_the_raster(tmp_path, options, run_area):
+
+    run_area(options(raster_resolution=50, raster_tile_size=8))
+
+    raster = RasterStore.open(str(tmp_path / 'results' / 'raster' /
+        'frequency=800'))
+    assert raster.grid.resolution == 50
+    assert len(os.listdir(raster.path)) == 1 + len(raster.grid.tiles(8))
+
+    with open(str(tmp_path / 'results' / 'results.csv'), 'r') as source:
+        rows = list(csv.DictReader(source))
+
+    #the capacity of a segment is that of the cell holding its midpoint
+    midpoints = {'11_1': (125, 100), '11_2': (425, 100), '12': (100, 600),
+        '13': (1600, 1200)}
+    capacity = raster.sample(list(midpoints.values()))['capacity_mbps']
+    expected = dict(zip(midpoints, np.round(capacity).astype(int).tolist()))
+
+    assert all(int(row['capacity']) == expected[row['road_id_segment']]
+        for row in rows)
@@ -0,0 +1,53 @@
+"""
+Test the cache of deterministic results
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+from np4d.cache import ResultCache, make_key
+
+
+def test_memoize_counts_hits_and_misses():
+
+    calls = []
+    cache = ResultCache(2)
+
+    def square(value):
+        calls.append(value)
+        return value**2
+
+    assert cache.memoize(make_key('square', 3), square, 3) == 9
+    assert cache.memoize(make_key('square', 3.0), square, 3) == 9
+
+    assert calls == [3]
+    assert cache.info() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 2}
+
+
+def test_least_recently_used_entry_evicted():
+
+    cache = ResultCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.get('b') is None
+
+
+def test_on_disk_store_reused_by_later_runs(tmp_path):
+
+    path = str(tmp_path / 'link_budgets')
+
+    cache = ResultCache(1, path)
+    cache.memoize('batch', dict, capacity_mbps=[1.5, 2.5])
+    cache.close()
+
+    cache = ResultCache(1, path)
+    value = cache.memoize('batch', dict)
+    cache.close()
+
+    assert value == {'capacity_mbps': [1.5, 2.5]}
+    assert cache.info()['hits'] == 1
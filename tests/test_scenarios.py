@@ -0,0 +1,135 @@
+"""
+Test the grid of swept scenarios and their output paths
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import argparse
+import csv
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+
+import pytest
+
+import run
+
+
+RUN_PATH = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'run.py')
+
+
+def read_results(path):
+
+    with open(path, 'r') as source:
+        return list(csv.DictReader(source))
+
+
+def test_grid_varies_last_parameter_fastest():
+
+    scenarios = run.scenario_grid(OrderedDict([
+        ('frequency', [800, 2600]),
+        ('bandwidth', [10]),
+        ('obf', [50, 20, 10]),
+    ]))
+
+    assert len(scenarios) == 6
+    assert [list(scenario.values()) for scenario in scenarios] == [
+        [800, 10, 50], [800, 10, 20], [800, 10, 10],
+        [2600, 10, 50], [2600, 10, 20], [2600, 10, 10],
+    ]
+    assert all(list(scenario) == ['frequency', 'bandwidth', 'obf']
+        for scenario in scenarios)
+
+
+def test_scenario_path_partitioned_by_parameter():
+
+    scenario = OrderedDict([('frequency', 800.0), ('bandwidth', 2.5),
+        ('target_capacity', 2.0), ('obf', 50.0)])
+
+    assert run.scenario_path(scenario) == os.path.join('frequency=800',
+        'bandwidth=2.5', 'target_capacity=2', 'obf=50')
+
+
+def test_single_scenario_written_to_results():
+
+    scenarios = run.scenario_grid(OrderedDict([('frequency', [800.0]),
+        ('obf', [50.0])]))
+
+    assert run.scenario_results_path(scenarios, scenarios[0]) == 'results.csv'
+
+
+def test_sweep_written_under_scenarios():
+
+    scenarios = run.scenario_grid(OrderedDict([('frequency', [800.0]),
+        ('obf', [50.0, 20.0])]))
+
+    assert run.scenario_results_path(scenarios, scenarios[1]) == os.path.join(
+        'scenarios', 'frequency=800', 'obf=20', 'results.csv')
+
+
+def test_scenario_index(tmp_path):
+
+    scenarios = run.scenario_grid(OrderedDict([('frequency', [800.0, 2600.0]),
+        ('obf', [50.0])]))
+
+    path = run.write_scenario_index(scenarios, str(tmp_path))
+
+    assert path == str(tmp_path / 'scenarios' / 'scenarios.csv')
+    assert read_results(path) == [
+        {'frequency': '800', 'obf': '50',
+            'path': os.path.join('frequency=800', 'obf=50', 'results.csv')},
+        {'frequency': '2600', 'obf': '50',
+            'path': os.path.join('frequency=2600', 'obf=50', 'results.csv')},
+    ]
+
+
+def test_scenario_values():
+
+    assert run.scenario_values('800, 2600,') == [800.0, 2600.0]
+    with pytest.raises(argparse.ArgumentTypeError):
+        run.scenario_values(' , ')
+
+
+def test_frequency_sweep_written_per_scenario(tmp_path, options, run_area):
+
+    args = options(frequency=[800, 2600], target_capacity=[2, 4])
+    summary = run_area(args)
+
+    directory_results = tmp_path / 'results'
+    scenarios = run.swept_scenarios(args)
+    paths = [str(directory_results / run.scenario_results_path(scenarios,
+        scenario)) for scenario in scenarios]
+
+    assert len(scenarios) == 4
+    assert summary['files'][:5] == paths + [
+        str(directory_results / 'scenarios' / 'scenarios.csv')]
+    assert not os.path.exists(str(directory_results / 'results.csv'))
+
+    results = [read_results(path) for path in paths]
+    capacity = [[row['capacity'] for row in rows] for rows in results]
+    demand = [[row['demand'] for row in rows] for rows in results]
+
+    #capacity follows the frequency and demand the target capacity
+    assert capacity[0] == capacity[1]
+    assert capacity[2] == capacity[3]
+    assert capacity[0] != capacity[2]
+    assert demand[0] == demand[2]
+    assert demand[0] != demand[1]
+
+
+@pytest.mark.parametrize('arguments', [
+    ['--frequency', '800,2600', '--best-server-sites', '2'],
+    ['--carrier-bandwidths', '800:10,2600:20', '--bandwidth', '5,10'],
+])
+def test_sweeps_relabelling_one_run_rejected(tmp_path, arguments):
+
+    #the options are checked before any data is read
+    process = subprocess.run([sys.executable, RUN_PATH] + arguments,
+        cwd=str(tmp_path), capture_output=True, text=True)
+
+    assert process.returncode == 2
+    assert 'cannot be swept' in process.stderr
+    assert os.listdir(str(tmp_path)) == []
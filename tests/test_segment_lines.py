@@ -0,0 +1,82 @@
+"""
+Test cutting roads into segments
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import LineString
+
+from np4d.spatial import segment_lines
+
+
+@pytest.fixture
+def lines():
+
+    return [
+        LineString([(0, 0), (300, 0), (300, 400)]),
+        LineString([(1000, 1000), (1100, 1000)]),
+        LineString([(0, 5000), (130, 5000), (130, 5130), (600, 5600)]),
+        LineString([(2000, 0), (2000, 249.9)]),
+    ]
+
+
+def cut(lines, segment_length):
+
+    coordinates, line_index = shapely.get_coordinates(lines,
+        return_index=True)
+
+    return segment_lines(coordinates, line_index, segment_length)
+
+
+@pytest.mark.parametrize('segment_length', [50, 100, 250, 333.3])
+def test_segment_lengths_sum_to_line_length(lines, segment_length):
+
+    segments = cut(lines, segment_length)
+
+    totals = np.bincount(segments['line'], weights=segments['length'],
+        minlength=len(lines))
+
+    assert np.allclose(totals, [line.length for line in lines])
+    assert np.allclose(segments['length'], segments['end'] - segments['start'])
+
+
+def test_short_road_kept_whole(lines):
+
+    segments = cut(lines, 250)
+
+    short = np.flatnonzero(np.isin(segments['line'], [1, 3]))
+
+    assert segments['line'][short].tolist() == [1, 3]
+    assert segments['segment'][short].tolist() == [0, 0]
+    assert segments['start'][short].tolist() == [0, 0]
+    assert np.allclose(segments['length'][short],
+        [lines[1].length, lines[3].length])
+    assert np.allclose(segments['midpoints'][short],
+        [[1050, 1000], [2000, 124.95]])
+
+
+def test_long_road_numbered_from_one(lines):
+
+    segments = cut(lines, 250)
+
+    first = segments['line'] == 0
+
+    #700 m at 250 m gives round(2.8) = 3 pieces, the last running to
+    #the end of the line
+    assert segments['segment'][first].tolist() == [1, 2, 3]
+    assert np.allclose(segments['length'][first], [250, 250, 200])
+
+
+def test_segment_vertices_follow_the_line(lines):
+
+    segments = cut(lines, 250)
+
+    offsets = segments['vertex_offsets']
+    for i in range(len(segments['line'])):
+        piece = LineString(segments['vertices'][offsets[i]:offsets[i + 1]])
+        assert np.isclose(piece.length, segments['length'][i])
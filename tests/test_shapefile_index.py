@@ -0,0 +1,95 @@
+"""
+Test the shapefile bounding box index
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import os
+
+import fiona
+import numpy as np
+import pytest
+from shapely.geometry import LineString, Point, mapping, shape
+
+from np4d.spatial import ShapefileIndex
+
+
+def write_shapefile(path, geometry_type, geometries, ids):
+
+    schema = {'geometry': geometry_type, 'properties': {'id': 'int'}}
+
+    with fiona.open(path, 'w', 'ESRI Shapefile', schema) as sink:
+        for geometry, link_id in zip(geometries, ids):
+            sink.write({
+                'geometry': mapping(geometry),
+                'properties': {'id': link_id},
+            })
+
+
+@pytest.fixture
+def roads(tmp_path):
+
+    path = str(tmp_path / 'roads.shp')
+    write_shapefile(path, 'LineString', [
+        LineString([(450000, 206000), (450300.5, 206400.25)]),
+        LineString([(451000, 205000), (450900, 205100), (451200, 205050)]),
+        LineString([(449000.125, 207000), (449010, 207000.75)]),
+    ], [60574, 12, 7])
+
+    return path
+
+
+def fiona_bounds(path):
+
+    with fiona.open(path) as source:
+        return (np.array([shape(item['geometry']).bounds for item in source]),
+            source.bounds)
+
+
+def test_line_bounds_match_fiona(roads):
+
+    index = ShapefileIndex(roads, 'id')
+    bounds, total = fiona_bounds(roads)
+
+    assert np.array_equal(index.bounds, bounds)
+    assert np.array_equal(np.r_[index.bounds[:, :2].min(axis=0),
+        index.bounds[:, 2:].max(axis=0)], total)
+    assert index.ids.tolist() == [60574, 12, 7]
+
+
+def test_point_bounds_match_fiona(tmp_path):
+
+    path = str(tmp_path / 'sites.shp')
+    write_shapefile(path, 'Point', [Point(450630.0803, 206189.3377),
+        Point(451353.1219, 206099.3154)], [1, 2])
+
+    index = ShapefileIndex(path, 'id')
+    bounds, _ = fiona_bounds(path)
+
+    assert np.array_equal(index.bounds, bounds)
+
+
+def test_query(roads):
+
+    index = ShapefileIndex(roads, 'id')
+
+    assert index.query().tolist() == [0, 1, 2]
+    assert index.query(bounds=(450000, 205000, 451000, 206000)).tolist() == [
+        0, 1]
+    assert index.query(ids=[7, 60574]).tolist() == [0, 2]
+
+
+def test_index_saved_and_rebuilt(roads):
+
+    index = ShapefileIndex(roads, 'id')
+    assert os.path.exists(index.index_path)
+
+    #a changed shapefile invalidates the saved index
+    write_shapefile(roads, 'LineString',
+        [LineString([(0, 0), (10, 20)])], [3])
+    index = ShapefileIndex(roads, 'id')
+
+    assert index.bounds.tolist() == [[0, 0, 10, 20]]
+    assert index.ids.tolist() == [3]
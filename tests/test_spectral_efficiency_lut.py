@@ -0,0 +1,79 @@
+"""
+Test the compiled spectral efficiency lookup table
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import numpy as np
+import pytest
+
+from np4d.np4d import SpectralEfficiencyLUT, compile_lut
+
+
+@pytest.fixture
+def lut():
+
+    #rows out of order, to check they are sorted by sinr threshold
+    return SpectralEfficiencyLUT([
+        ('4G', 3, 'QPSK', 0.1885, 0.377, -2.3),
+        ('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+        ('4G', 15, '64QAM', 0.9258, 5.5547, 22.7),
+        ('4G', 9, '16QAM', 0.6016, 2.4063, 10.3),
+        ('5G', 1, 'QPSK', 0.0762, 0.1523, -6.7),
+        ('5G', 15, '256QAM', 0.9258, 7.4063, 22.7),
+    ])
+
+
+@pytest.mark.parametrize('sinr, expected', [
+    (-6.7, 0.1523),
+    (-2.3, 0.377),
+    (10.3, 2.4063),
+    (22.7, 5.5547),
+])
+def test_sinr_on_threshold(lut, sinr, expected):
+
+    assert lut.lookup(sinr, '4G') == expected
+
+
+def test_sinr_between_thresholds(lut):
+
+    assert lut.lookup(0, '4G') == 0.377
+    assert lut.lookup(22.6999, '4G') == 2.4063
+
+
+def test_sinr_below_first_row(lut):
+
+    assert lut.lookup(-6.71, '4G') == 0
+    assert lut.lookup(-np.inf, '4G') == 0
+
+
+def test_sinr_above_last_row(lut):
+
+    assert lut.lookup(40, '4G') == 5.5547
+    assert lut.lookup(40, '5G') == 7.4063
+
+
+def test_unknown_generation(lut):
+
+    with pytest.raises(ValueError, match='3G'):
+        lut.lookup(10, '3G')
+
+
+def test_array_lookup(lut):
+
+    sinr = np.array([[-10, -6.7, np.nan], [0, 22.7, 30]])
+
+    spectral_efficiency = lut.lookup(sinr, '4G')
+
+    assert spectral_efficiency.shape == sinr.shape
+    assert np.array_equal(spectral_efficiency,
+        [[0, 0.1523, np.nan], [0.377, 5.5547, 5.5547]], equal_nan=True)
+
+
+def test_compile_lut_passes_compiled_table_through(lut):
+
+    assert compile_lut(lut) is lut
+    assert compile_lut([('4G', 1, 'QPSK', 0.0762, 0.1523, -6.7)]).lookup(
+        0, '4G') == 0.1523
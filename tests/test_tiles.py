@@ -0,0 +1,173 @@
+"""
+Test tiled evaluation of the study area
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import csv
+import os
+
+import numpy as np
+
+import run
+from np4d.time_axis import TimeAxis
+
+
+def read_results(path):
+
+    with open(path, 'r') as source:
+        return sorted(csv.DictReader(source),
+            key=lambda row: (row['road_id_segment'], row['hour']))
+
+
+def run_tiles(tmp_path, args, settings, sites, flows_path):
+
+    return run.run_tiles(args, settings, None, sites, flows_path,
+        str(tmp_path / 'tiles'), str(tmp_path / 'tiled'),
+        str(tmp_path / 'tiled_shapes'))
+
+
+def test_offsets_within():
+
+    assert run.offsets_within([2, 3]).tolist() == [0, 1, 0, 1, 2]
+    assert run.offsets_within([0, 1, 0, 2]).tolist() == [0, 0, 1]
+
+
+def test_roads_assigned_to_every_tile_they_meet(road_path):
+
+    tiles, edge_ids, tile_numbers = run.road_tiles(road_path, 500)
+
+    #road 11 crosses x = 500, and road 12 starts on y = 500
+    assert tiles.tolist() == [[0, 0], [0, 1], [1, 0], [3, 2]]
+    assert sorted(zip(edge_ids.tolist(),
+        tiles[tile_numbers].tolist())) == [
+        (11, [0, 0]), (11, [1, 0]), (12, [0, 1]), (13, [3, 2])]
+
+
+def test_flows_partitioned_to_active_tiles(tmp_path, road_path, flows_path):
+
+    time_axis = TimeAxis.profile(60)
+    tiles, edge_ids, tile_numbers = run.road_tiles(road_path, 500)
+
+    #a road without flows, alone in its tile
+    edge_ids = np.append(edge_ids, 99)
+    tile_numbers = np.append(tile_numbers, len(tiles))
+    paths = [str(tmp_path / 'tile_{}'.format(number) / 'flows.bin')
+        for number in range(len(tiles) + 1)]
+
+    n_rows, written, off_axis = run.partition_road_flows(flows_path,
+        edge_ids, tile_numbers, paths, time_axis, chunk_size=2)
+
+    assert (n_rows, off_axis) == (4, 0)
+    assert written.tolist() == [0, 1, 2, 3]
+    assert not os.path.exists(os.path.dirname(paths[4]))
+
+    #road 11 is in two tiles, so both hold its flows
+    for number, expected in [(0, [(11, 0, 100), (11, 9, 2400)]),
+        (1, [(12, 9, 730)]), (2, [(11, 0, 100), (11, 9, 2400)]),
+        (3, [(13, 17, 1250)])]:
+        flows = run.load_tile_flows(paths[number], time_axis)
+        assert flows['edge_id'].dtype == np.int32
+        assert list(zip(flows['edge_id'].tolist(), flows['time'].tolist(),
+            flows['vehicles'].tolist())) == expected
+
+
+def test_repartition_replaces_tile_flows(tmp_path, road_path, flows_path):
+
+    time_axis = TimeAxis.profile(60)
+    tiles, edge_ids, tile_numbers = run.road_tiles(road_path, 1000)
+    paths = [str(tmp_path / 'tile_{}'.format(number) / 'flows.bin')
+        for number in range(len(tiles))]
+
+    for _ in range(2):
+        run.partition_road_flows(flows_path, edge_ids, tile_numbers, paths,
+            time_axis)
+
+    assert len(run.load_tile_flows(paths[0], time_axis)['edge_id']) == 3
+
+
+def test_tiled_run_matches_untiled(tmp_path, options, settings, area_sites,
+    flows_path, run_area):
+
+    run_area(options())
+    summaries = run_tiles(tmp_path, options(tile_size=1000), settings,
+        area_sites, flows_path)
+
+    assert [summary['tile'] for summary in summaries] == ['tile_0_0',
+        'tile_1_1']
+    assert [summary['segments'] for summary in summaries] == [3, 1]
+
+    #every segment is evaluated in one tile, with the same draws
+    assert read_results(str(tmp_path / 'tiled' / 'results.csv')) == \
+        read_results(str(tmp_path / 'results' / 'results.csv'))
+    assert os.path.exists(str(tmp_path / 'tiled_shapes' / 'chopped_roads.shp'))
+
+
+def test_segments_split_at_tile_edges(tmp_path, options, settings, area_sites,
+    flows_path, run_area):
+
+    run_area(options())
+    summaries = run_tiles(tmp_path, options(tile_size=400), settings,
+        area_sites, flows_path)
+
+    #road 11 meets two tiles, but each of its segments is evaluated once
+    assert sum(summary['segments'] for summary in summaries) == 4
+    assert read_results(str(tmp_path / 'tiled' / 'results.csv')) == \
+        read_results(str(tmp_path / 'results' / 'results.csv'))
+
+
+def test_sites_outside_halo_not_loaded(tmp_path, options, settings,
+    area_sites, flows_path):
+
+    summaries = run_tiles(tmp_path, options(tile_size=1000, tile_halo=50),
+        settings, area_sites, flows_path)
+
+    #sites B and C are more than 50 m from the tile of road 13
+    assert [(summary['tile'], summary['sites'], summary['results'])
+        for summary in summaries] == [('tile_0_0', 3, 5), ('tile_1_1', 0, 0)]
+    assert [row['road_id'] for row in read_results(
+        str(tmp_path / 'tiled' / 'results.csv'))] == ['11'] * 4 + ['12']
+
+
+def test_completed_tiles_skipped(tmp_path, options, settings, area_sites,
+    flows_path):
+
+    args = options(tile_size=1000, target_capacity=[2, 4])
+    run_tiles(tmp_path, args, settings, area_sites, flows_path)
+    merged = tmp_path / 'tiled' / 'scenarios'
+    first = {path: read_results(str(merged / path)) for path in [
+        os.path.join('frequency=800', 'bandwidth=10', 'target_capacity=2',
+            'obf=50', 'results.csv'),
+        os.path.join('frequency=800', 'bandwidth=10', 'target_capacity=4',
+            'obf=50', 'results.csv')]}
+
+    assert run_tiles(tmp_path, args, settings, area_sites, flows_path) == []
+
+    #a tile whose results were lost is evaluated again
+    os.remove(str(tmp_path / 'tiles' / 'tile_1_1' / 'scenarios' /
+        'frequency=800' / 'bandwidth=10' / 'target_capacity=4' / 'obf=50' /
+        'results.csv'))
+    summaries = run_tiles(tmp_path, args, settings, area_sites, flows_path)
+
+    assert [summary['tile'] for summary in summaries] == ['tile_1_1']
+    for path, rows in first.items():
+        assert read_results(str(merged / path)) == rows
+    assert os.path.exists(str(merged / 'scenarios.csv'))
+
+
+def test_merge_csv_keeps_one_header(tmp_path):
+
+    paths = []
+    for number, rows in enumerate([['1,a', '2,b'], [], ['3,c']]):
+        path = str(tmp_path / 'part_{}.csv'.format(number))
+        with open(path, 'w') as sink:
+            sink.write('id,name\n' + ''.join(row + '\n' for row in rows))
+        paths.append(path)
+
+    run.merge_csv(paths, str(tmp_path / 'merged'), 'results.csv')
+
+    with open(str(tmp_path / 'merged' / 'results.csv'), 'r') as source:
+        assert source.read() == 'id,name\n1,a\n2,b\n3,c\n'
+    assert os.listdir(str(tmp_path / 'merged')) == ['results.csv']
@@ -0,0 +1,155 @@
+"""
+Test the time axis of flows and results
+
+Written by Edward Oughton
+November 2019
+Oxford, UK
+
+"""
+import configparser
+
+import numpy as np
+import pytest
+
+import run
+from np4d.time_axis import HOUR_NAMES, TimeAxis
+
+
+def config_section(**settings):
+
+    config = configparser.ConfigParser()
+    config['run'] = settings
+
+    return config['run']
+
+
+def test_hourly_profile_uses_named_hours():
+
+    axis = TimeAxis.profile(60)
+
+    assert len(axis) == 24
+    assert axis.labels == HOUR_NAMES
+    assert axis.dtype == np.uint8
+    assert axis.index(['MIDNIGHT', 'NINEAM', '09:30', '23:59']).tolist() == [
+        0, 9, 9, 23]
+
+
+def test_finer_profile_labelled_by_time_of_day():
+
+    axis = TimeAxis.profile(15)
+
+    assert len(axis) == 96
+    assert axis.labels[:3] == ('00:00', '00:15', '00:30')
+    assert axis.labels[-1] == '23:45'
+    #named hours and timestamps are placed by their time of day
+    assert axis.index(['ONEAM', '01:14:59', '01:15',
+        '2019-11-05 23:50']).tolist() == [4, 4, 5, 95]
+    assert axis.index(np.array(['2019-11-06T00:20'],
+        dtype='datetime64[m]')).tolist() == [1]
+
+
+def test_profile_must_divide_a_day():
+
+    with pytest.raises(ValueError):
+        TimeAxis.profile(7)
+
+
+def test_series_spans_days():
+
+    axis = TimeAxis.series('2019-11-05 22:00', '2019-11-06 02:00', 30)
+
+    assert len(axis) == 8
+    assert axis.labels[0] == '2019-11-05T22:00'
+    assert axis.labels[-1] == '2019-11-06T01:30'
+    assert axis.index(['2019-11-05T22:00', '2019-11-06 00:45',
+        '2019-11-06 01:59']).tolist() == [0, 5, 7]
+
+
+def test_values_off_the_axis_missing():
+
+    axis = TimeAxis.series('2019-11-05 22:00', '2019-11-06 02:00', 30)
+    missing = axis.missing
+
+    assert missing == np.iinfo(axis.dtype).max
+    #before, at the end, times of day without a date and unparsed values
+    assert axis.index(['2019-11-05 21:59', '2019-11-06 02:00', 'NINEAM',
+        '12:00', 'not a time', '']).tolist() == [missing] * 6
+    assert TimeAxis.profile(60).index(['NOT_AN_HOUR']).tolist() == [
+        np.iinfo(np.uint8).max]
+
+
+def test_index_keeps_shape():
+
+    axis = TimeAxis.profile(60)
+
+    assert axis.index(np.array([['ONEAM', 'TWOAM'], ['NOON', 'ONEAM']])
+        ).tolist() == [[1, 2], [12, 1]]
+    assert axis.index([]).dtype == axis.dtype
+
+
+def test_dtype_grows_with_length():
+
+    assert TimeAxis(1, 254).dtype == np.uint8
+    assert TimeAxis(1, 255).dtype == np.uint16
+    assert TimeAxis.series('2019-01-01', '2020-01-01', 5).dtype == np.uint32
+
+
+def test_labels_must_match_length():
+
+    with pytest.raises(ValueError):
+        TimeAxis(60, 3, labels=['a', 'b'])
+
+
+def test_from_config_arguments_override_section():
+
+    section = config_section(time_resolution='30', time_start='', time_end='')
+
+    assert TimeAxis.from_config(section).length == 48
+    assert TimeAxis.from_config(section, 60).labels == HOUR_NAMES
+
+    series = TimeAxis.from_config(section, time_start='2019-11-05 08:00',
+        time_end='2019-11-05 10:00')
+    assert series.minutes == 30
+    assert series.labels == ('2019-11-05T08:00', '2019-11-05T08:30',
+        '2019-11-05T09:00', '2019-11-05T09:30')
+
+    assert TimeAxis.from_config(config_section()).labels == HOUR_NAMES
+
+
+def test_save_and_load_round_trip(tmp_path):
+
+    path = str(tmp_path / 'time_axis.json')
+
+    for axis in (TimeAxis.profile(60), TimeAxis.profile(20),
+        TimeAxis.series('2019-11-05 08:00', '2019-11-05 10:00', 15)):
+        axis.save(path)
+        loaded = TimeAxis.load(path)
+
+        assert (loaded.minutes, loaded.length, loaded.labels) == (
+            axis.minutes, axis.length, axis.labels)
+        assert loaded.start == axis.start
+        assert str(loaded) == str(axis)
+
+
+def test_description():
+
+    assert str(TimeAxis.profile(60)) == \
+        'daily profile of 24 slices of 60 minutes'
+    assert str(TimeAxis.series('2019-11-05 08:00', '2019-11-05 10:00', 15)) \
+        == 'series of 8 slices of 15 minutes from 2019-11-05T08:00'
+
+
+def test_flows_placed_on_the_axis(flows_path):
+
+    flows, n_rows, off_axis = run.load_road_flows(flows_path,
+        time_axis=TimeAxis.profile(15))
+
+    assert (n_rows, off_axis) == (4, 0)
+    assert flows['time'].tolist() == [0, 36, 36, 68]
+
+    #named hours have no date, so none fall on a series
+    flows, n_rows, off_axis = run.load_road_flows(flows_path,
+        time_axis=TimeAxis.series('2019-11-05', '2019-11-06'))
+
+    assert (n_rows, off_axis) == (4, 4)
+    assert len(flows['edge_id']) == 0
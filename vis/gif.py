@@ -19,13 +19,15 @@ import pandas as pd
 import pygifsicle
 import seaborn as sns
 
+from np4d.time_axis import TimeAxis
+
 CONFIG = configparser.ConfigParser()
 CONFIG.read(os.path.join(os.path.dirname(__file__),'..','scripts','script_config.ini'))
 BASE_PATH = CONFIG['file_locations']['base_path']
 
 
-def plot_map(metric, legend_label, title, hour, roads, flow_min, flow_max, sites,
-    output_filename, metric_min, metric_max):
+def plot_map(metric, legend_label, title, time_label, roads, flow_min, flow_max,
+    sites, output_filename, metric_min, metric_max):
 
     fig, ax = plt.subplots(figsize=(8, 10))
 
@@ -54,25 +56,30 @@ def plot_map(metric, legend_label, title, hour, roads, flow_min, flow_max, sites
         )
 
     # plt.legend(, bbox_transform=ax.transAxes)
-    plt.title('{:02d}:00 {}'.format(hour, title), fontsize=16)
+    plt.title('{} {}'.format(time_label, title), fontsize=16)
     ctx.add_basemap(ax, crs=roads.crs)
     plt.savefig(output_filename, pad_inches=0, bbox_inches='tight')
     plt.close()
 
-    return print('Completed {:02d}.png'.format(hour))
+    return print('Completed {}'.format(os.path.basename(output_filename)))
 
 
-def plot_maps(metric, legend_label, title, flows, flow_min, flow_max, roads, sites, hours):
+def plot_maps(metric, legend_label, title, flows, flow_min, flow_max, roads, sites,
+    time_axis):
 
     metric_max = flows[metric].max()
     metric_min = flows[metric].min()
 
-    for hour, hour_key in enumerate(hours):
-        hour_flows = flows[flows.hour == hour_key].copy()
-        hour_flows = roads.merge(hour_flows, on='road_id_segment')
-        plot_name = os.path.join('vis', 'images', '{:02d}_{}.png'.format(hour, metric))
-        plot_map(metric, legend_label, title, hour, hour_flows, flow_min, flow_max, sites,
-            plot_name, metric_min, metric_max)
+    #results are labelled with the time axis labels, so one group per slice
+    flows = flows.assign(time=time_axis.index(flows.hour.astype(str).values))
+
+    for time, time_flows in flows.groupby('time'):
+        if time == time_axis.missing:
+            continue
+        time_flows = roads.merge(time_flows, on='road_id_segment')
+        plot_name = os.path.join('vis', 'images', '{:05d}_{}.png'.format(time, metric))
+        plot_map(metric, legend_label, title, time_axis.labels[time], time_flows,
+            flow_min, flow_max, sites, plot_name, metric_min, metric_max)
 
     return print('Plotted all maps')
 
@@ -81,9 +88,9 @@ def generate_gif(metric, gif_path):
 
     images = []
 
-    filenames = glob.glob(
+    filenames = sorted(glob.glob(
         os.path.join(BASE_PATH, '..', 'vis', 'images','*{}.png'.format(metric))
-    )
+    ))
 
     for filename in filenames:
         images.append(imageio.imread(filename))
@@ -93,7 +100,8 @@ def generate_gif(metric, gif_path):
     return print('Generated .gif')
 
 
-def make_gif(metric, legend_label, title, path_flows, path_roads, path_sites, hours, gif_path):
+def make_gif(metric, legend_label, title, path_flows, path_roads, path_sites, time_axis,
+    gif_path):
 
     flows = pd.read_csv(path_flows)
 
@@ -104,7 +112,8 @@ def make_gif(metric, legend_label, title, path_flows, path_roads, path_sites, ho
 
     sites = gpd.read_file(path_sites)
 
-    plot_maps(metric, legend_label, title, flows, flow_min, flow_max, roads, sites, hours)
+    plot_maps(metric, legend_label, title, flows, flow_min, flow_max, roads, sites,
+        time_axis)
 
     generate_gif(metric, gif_path)
 
@@ -113,35 +122,16 @@ def make_gif(metric, legend_label, title, path_flows, path_roads, path_sites, ho
 
 if __name__ == '__main__':
 
-    hours = [
-        'MIDNIGHT',
-        'ONEAM',
-        'TWOAM',
-        'THREEAM',
-        'FOURAM',
-        'FIVEAM',
-        'SIXAM',
-        'SEVENAM',
-        'EIGHTAM',
-        'NINEAM',
-        'TENAM',
-        'ELEVENAM',
-        'NOON',
-        'ONEPM',
-        'TWOPM',
-        'THREEPM',
-        'FOURPM',
-        'FIVEPM',
-        'SIXPM',
-        'SEVENPM',
-        'EIGHTPM',
-        'NINEPM',
-        'TENPM',
-        'ELEVENPM',
-    ]
-
     path_flows = os.path.join(BASE_PATH, '..', 'results', 'results.csv')
 
+    #the same time axis the results were produced with, including any
+    #command line overrides
+    path_time_axis = os.path.join(BASE_PATH, '..', 'results', 'time_axis.json')
+    if os.path.exists(path_time_axis):
+        time_axis = TimeAxis.load(path_time_axis)
+    else:
+        time_axis = TimeAxis.from_config(CONFIG['run'])
+
     path_roads = os.path.join('data', 'processed', 'chopped_roads.shp')
 
     path_sites = os.path.join('data', 'processed', 'sites.shp')
@@ -163,6 +153,7 @@ if __name__ == '__main__':
             BASE_PATH, '..', 'vis', 'movies', 'movie_{}.gif'.format(metric)
         )
 
-        make_gif(metric, legend_label, title, path_flows, path_roads, path_sites, hours, gif_path)
+        make_gif(metric, legend_label, title, path_flows, path_roads, path_sites, time_axis,
+            gif_path)
 
         pygifsicle.optimize(gif_path)